@@ -0,0 +1,120 @@
+# animation_registry.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# The registry of LED ring animations running as clients of the kano-boards-daemon.
+#
+# Animations register themselves with the ServiceManager by name, e.g. cpu-monitor,
+# when they lock a board. Stopping them is then a matter of signalling the owning
+# processes rather than matching their command lines in the process table.
+
+
+import os
+import signal
+
+from kano.logging import logger
+
+
+class AnimationRegistry(object):
+    """
+    Running animations, by the unique bus name of the client which registered them.
+    """
+
+    def __init__(self, kill=None):
+        """
+        Constructor for the AnimationRegistry.
+
+        Args:
+            kill - callable as os.kill used to signal the animations, used by default
+        """
+        super(AnimationRegistry, self).__init__()
+
+        self.kill = kill or os.kill
+        self.animations = dict()
+
+    def register(self, sender_id, name, pid, watch=None):
+        """
+        Add an animation, replacing any previously registered by the same client.
+
+        Args:
+            sender_id - str unique bus name of the client, e.g. ':1.42'
+            name      - str name of the animation, e.g. 'cpu-monitor'
+            pid       - int process ID of the client
+            watch     - object with a cancel() method, e.g. the match returned
+                        by watch_name_owner, cancelled when the entry is removed
+        """
+        self.unregister(sender_id)
+
+        self.animations[sender_id] = {
+            'name': name,
+            'pid': pid,
+            'watch': watch
+        }
+
+    def unregister(self, sender_id):
+        """
+        Remove the animation of a client, if any.
+
+        Args:
+            sender_id - str unique bus name of the client
+
+        Returns:
+            True or False if an animation was registered by the client.
+        """
+        animation = self.animations.pop(sender_id, None)
+        if animation is None:
+            return False
+
+        if animation['watch'] is not None:
+            animation['watch'].cancel()
+
+        return True
+
+    def stop(self, name=''):
+        """
+        Send SIGINT to the processes running an animation for them to turn off
+        the LEDs, release their lock and exit.
+
+        Args:
+            name - str name of the animation or empty str for all of them
+
+        Returns:
+            count - int number of processes signalled
+        """
+        count = 0
+
+        for sender_id, animation in self.animations.items():
+            if name and animation['name'] != name:
+                continue
+
+            try:
+                self.kill(animation['pid'], signal.SIGINT)
+                count += 1
+            except OSError as e:
+                logger.warn(
+                    'AnimationRegistry: stop: Could not signal {} ({}) - [{}]'
+                    .format(animation['name'], animation['pid'], e)
+                )
+                self.unregister(sender_id)
+
+        return count
+
+    def get_animations(self):
+        """
+        Get all the animations registered.
+
+        Returns:
+            animations - list of (str name, int pid) tuples
+        """
+        return [
+            (animation['name'], animation['pid'])
+            for animation in self.animations.itervalues()
+        ]
+
+    def clear(self):
+        """
+        Remove all animations, e.g. when the daemon shuts down.
+        """
+        for sender_id in self.animations.keys():
+            self.unregister(sender_id)
@@ -11,6 +11,7 @@ import dbus
 from kano.logging import logger
 
 from kano_peripherals.base_dbus_service import BaseDBusService
+from kano_peripherals.poll_scheduler import get_poll_scheduler
 from kano_peripherals.paths import SERVICE_API_IFACE
 
 
@@ -19,6 +20,13 @@ class BaseDeviceService(BaseDBusService):
     The base class for all D-Bus services for devices supported in this project.
     """
 
+    # Delay before checking the detection after a hotplug event, lets pins settle.
+    DETECT_DEBOUNCE_DELAY = 50  # milliseconds
+
+    # The ceiling for the detection polling interval while the device is stable,
+    # only backed off to when a hotplug event fd signals the changes.
+    DETECT_THREAD_MAX_POLL_RATE = 60 * 1000  # milliseconds
+
     def __init__(self, bus_name, object_path):
         """
         Constructor for the BaseDeviceService.
@@ -29,6 +37,11 @@ class BaseDeviceService(BaseDBusService):
         """
         super(BaseDeviceService, self).__init__(bus_name, object_path)
 
+        # GObject source id of the pending detection check.
+        self.detect_check_id = None
+        self.detect_event_fd = None
+        self.is_disconnected = False
+
     # --- Device Detection --------------------------------------------------------------
 
     @classmethod
@@ -61,6 +74,103 @@ class BaseDeviceService(BaseDBusService):
         )
         return False
 
+    # --- Hotplug Monitoring ------------------------------------------------------------
+
+    def start_detect_watch(self, event_fd=None, poll_rate=None):
+        """
+        Start monitoring the device to know when it is unplugged.
+
+        The polling is registered with the shared PollScheduler under the object
+        path of the service. It only backs off, up to DETECT_THREAD_MAX_POLL_RATE,
+        alongside a hotplug event fd. Without one, the polling is the only way to
+        notice the device was unplugged and is kept at the fixed poll_rate.
+
+        Args:
+            event_fd  - int file descriptor which becomes readable on a hotplug event,
+                        None or negative if the device has none
+            poll_rate - int minimum milliseconds between detection checks, None to
+                        only rely on the hotplug events
+        """
+        # Lazy import to avoid issue of importing from this module externally.
+        from gi.repository import GObject
+
+        GObject.threads_init()
+
+        if event_fd is not None and event_fd >= 0:
+            self.detect_event_fd = event_fd
+            get_poll_scheduler().add_fd_listener(event_fd, self.request_detect)
+
+        if poll_rate:
+            max_poll_rate = poll_rate
+            if self.detect_event_fd is not None:
+                max_poll_rate = self.DETECT_THREAD_MAX_POLL_RATE
+
+            get_poll_scheduler().register(
+                self.get_object_path(), self._detect_thread,
+                poll_rate, max_poll_rate
+            )
+
+    def stop_detect_watch(self):
+        """
+        Stop monitoring the device started with start_detect_watch.
+        """
+        # Lazy import to avoid issue of importing from this module externally.
+        from gi.repository import GObject
+
+        if self.detect_event_fd is not None:
+            get_poll_scheduler().remove_fd_listener(
+                self.detect_event_fd, self.request_detect
+            )
+            self.detect_event_fd = None
+
+        get_poll_scheduler().unregister(self.get_object_path())
+
+        if self.detect_check_id is not None:
+            GObject.source_remove(self.detect_check_id)
+            self.detect_check_id = None
+
+    def request_detect(self):
+        """
+        Check the detection shortly, e.g. after a hotplug event or a failed write.
+        Requests made before the check runs are coalesced.
+        """
+        if self.detect_check_id is not None:
+            return
+
+        # Lazy import to avoid issue of importing from this module externally.
+        from gi.repository import GObject
+
+        self.detect_check_id = GObject.timeout_add(
+            self.DETECT_DEBOUNCE_DELAY, self._deferred_detect
+        )
+
+    def _deferred_detect(self):
+        """
+        Timeout callback for request_detect, runs only once.
+        """
+        self.detect_check_id = None
+        self._detect_thread()
+        return False
+
+    def _detect_thread(self):
+        """
+        Check the detection for the device to know when it is unplugged.
+
+        When the device is unplugged, the 'device_disconnected' DBus signal is
+        emitted once. This method is run in a separate thread with GObject.
+
+        Returns:
+            detected - bool whether the device is still plugged in, stops polling
+                       when it is not
+        """
+        detected = self.detect()
+
+        if not detected and not self.is_disconnected:
+            self.is_disconnected = True
+            self.device_disconnected(self.get_object_path())
+
+        return detected
+
     # --- Signals -----------------------------------------------------------------------
 
     @dbus.service.signal(SERVICE_API_IFACE, signature='s')
@@ -0,0 +1,20 @@
+# probe.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# A long-lived detection context for the CK2 Pro Hat used by the device discovery.
+
+
+from kano_pi_hat.ck2_pro_hat import CK2ProHat
+
+from kano_peripherals.hat_probe import HatProbe
+
+
+class CK2ProHatProbe(HatProbe):
+    """
+    Detects the CK2 Pro Hat, see HatProbe.
+    """
+
+    def __init__(self):
+        super(CK2ProHatProbe, self).__init__(CK2ProHat, 'CK2ProHatProbe')
@@ -34,7 +34,8 @@ class CK2ProHatService(BaseDeviceService):
     Requires sudo.
     """
 
-    # The poll rate for checking if the board is still plugged in.
+    # The poll rate for checking if the board is still plugged in, only used when
+    # the detection interrupts are not available.
     DETECT_THREAD_POLL_RATE = 5 * 1000  # milliseconds
 
     def __init__(self, bus_name):
@@ -71,14 +72,16 @@ class CK2ProHatService(BaseDeviceService):
         )
         self.battery_notif_thread.start()
 
-        # Lazy import to avoid issue of importing from this module externally.
-        from gi.repository import GObject
-
-        # Start the detection polling routine.
-        GObject.threads_init()
-        self.detect_thread_id = GObject.timeout_add(
-            self.DETECT_THREAD_POLL_RATE, self._detect_thread
-        )
+        # Get notified by the detection pin interrupts when the board is unplugged,
+        # fall back to polling if they could not be set up.
+        event_fd = self.ck2_pro_hat.get_detection_event_fd()
+        if event_fd < 0:
+            logger.warn(
+                'CK2ProHatService: Could not set up detection interrupts, polling instead'
+            )
+            self.start_detect_watch(poll_rate=self.DETECT_THREAD_POLL_RATE)
+        else:
+            self.start_detect_watch(event_fd=event_fd)
 
         self.device_connected(self.get_object_path())
 
@@ -87,14 +90,14 @@ class CK2ProHatService(BaseDeviceService):
         Stop all running (sub)processes and clean up before process termination.
         """
 
-        # Lazy import to avoid issue of importing from this module externally.
-        from gi.repository import GObject
-
-        GObject.source_remove(self.detect_thread_id)
+        self.stop_detect_watch()
 
         self.interrupt_thread.terminate()
         self.battery_notif_thread.join(1.5)
 
+        # Release the library lock for other libkano_hat users.
+        self.ck2_pro_hat.clean_up()
+
     # --- Board Detection ---------------------------------------------------------------
 
     @staticmethod
@@ -136,23 +139,6 @@ class CK2ProHatService(BaseDeviceService):
         """
         return self.ck2_pro_hat.is_connected()
 
-    def _detect_thread(self):
-        """
-        Poll the detection for PowerHat to know when it is unplugged.
-
-        When the PowerHat is unplugged, the 'device_disconnected' DBus signal is emitted.
-        This method is run in a separate thread with GObject.
-
-        TODO: The library for this board uses WiringPi which can do hardware interrupts.
-              We could remove this polling thread by having the hardware notify us.
-        """
-        detected = self.detect()
-
-        if not detected:
-            self.device_disconnected(self.get_object_path())
-
-        return detected
-
     # --- Battery Level -----------------------------------------------------------------
 
     @dbus.service.method(SERVICE_API_IFACE, in_signature='', out_signature='b')
@@ -0,0 +1,72 @@
+# clock.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# The monotonic clock used for timeouts, backoffs and frame deadlines.
+#
+# A Pi has no RTC, so the system time steps at boot when it is set by NTP or
+# fake-hwclock. Python 2 has no time.monotonic, clock_gettime is called through
+# ctypes, which is only imported on the first call.
+
+
+import time
+
+
+CLOCK_MONOTONIC = 1
+
+# The clock_gettime function and its timespec buffer, loaded on the first call.
+_clock_gettime = None
+_timespec = None
+_is_loaded = False
+
+
+def _load_clock_gettime():
+    """
+    Get clock_gettime from the C library and a timespec to call it with, None
+    for both if it is not available.
+    """
+    import ctypes
+    import ctypes.util
+
+    class Timespec(ctypes.Structure):
+        _fields_ = [
+            ('tv_sec', ctypes.c_long),
+            ('tv_nsec', ctypes.c_long)
+        ]
+
+    for name in ['c', 'rt']:
+        path = ctypes.util.find_library(name)
+        if not path:
+            continue
+
+        try:
+            clock_gettime = ctypes.CDLL(path, use_errno=True).clock_gettime
+        except (OSError, AttributeError):
+            continue
+
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(Timespec)]
+        clock_gettime.restype = ctypes.c_int
+        return clock_gettime, Timespec()
+
+    return None, None
+
+
+def monotonic():
+    """
+    Get the time of the monotonic clock, which is not affected by changes of
+    the system time, e.g. by NTP. Falls back to time.time() if unavailable.
+
+    Returns:
+        seconds - float
+    """
+    global _clock_gettime, _timespec, _is_loaded
+
+    if not _is_loaded:
+        _clock_gettime, _timespec = _load_clock_gettime()
+        _is_loaded = True
+
+    if _clock_gettime is None or _clock_gettime(CLOCK_MONOTONIC, _timespec) != 0:
+        return time.time()
+
+    return _timespec.tv_sec + _timespec.tv_nsec * 1e-9
@@ -5,20 +5,39 @@
 #
 # A DBus service responsible for detecting devices being plugged in.
 #
-# To check for peripherals, it makes use of the 'quick_detect' static methods
-# provided by the device services.
+# To check for peripherals, it makes use of long-lived probe contexts for each
+# device type, which load their library and set up their pins once, see
+# <device>/driver/probe.py.
+# They are declared in the service_registry and imported on the first probe.
+# Devices whose service is running are not probed until their detection is
+# resumed, i.e. when they were unplugged.
+#
+# The probes may load libraries and initialise hardware, so they are run off the main
+# loop in a ProbePool to keep the daemon responsive. Probes sharing libkano_hat
+# are run one after another, the I2C probe runs alongside them.
+#
+# The discovery routine is registered with the shared PollScheduler. It backs off
+# while no device comes or goes and bursts on GPIO edges of the hat detection pins
+# or a rescan requested by the user.
+#
+# The devices found are saved to disk and are probed first at the next startup,
+# ahead of the other device types, as the hardware rarely changes between boots.
 
 
+import os
+import json
 import dbus
+import functools
 
 from kano.logging import logger
 
 from kano_peripherals.base_dbus_service import BaseDBusService
-from kano_peripherals.speaker_leds.driver.service import SpeakerLEDsService
-from kano_peripherals.pi_hat.driver.service import PiHatService
-from kano_peripherals.ck2_pro_hat.driver.service import CK2ProHatService
+from kano_peripherals.probe_pool import ProbePool
+from kano_peripherals.poll_scheduler import get_poll_scheduler
+from kano_peripherals.service_registry import DEVICE_PROBES, get_probe_class
 from kano_peripherals.paths import DEVICE_DISCOVERY_OBJECT_PATH, SERVICE_API_IFACE, \
-    PI_HAT_OBJECT_PATH, CK2_PRO_HAT_OBJECT_PATH, SPEAKER_LEDS_OBJECT_PATH
+    PI_HAT_OBJECT_PATH, CK2_PRO_HAT_OBJECT_PATH, SPEAKER_LEDS_OBJECT_PATH, \
+    LAST_DEVICES_CACHE_PATH
 
 
 class DeviceDiscoveryService(BaseDBusService):
@@ -31,7 +50,16 @@ class DeviceDiscoveryService(BaseDBusService):
     Does not require sudo.
     """
 
+    # The range of intervals between discovery passes, see PollScheduler.
     DISCOVERY_ROUTINE_RATE = 5 * 1000  # milliseconds
+    DISCOVERY_ROUTINE_MAX_RATE = 60 * 1000  # milliseconds
+
+    # Probes in the same group share a hardware resource and never overlap.
+    PROBE_GROUPS = {
+        PI_HAT_OBJECT_PATH: 'libkano_hat',
+        CK2_PRO_HAT_OBJECT_PATH: 'libkano_hat',
+        SPEAKER_LEDS_OBJECT_PATH: 'i2c'
+    }
 
     def __init__(self, bus_name):
         """
@@ -42,49 +70,274 @@ class DeviceDiscoveryService(BaseDBusService):
         """
         super(DeviceDiscoveryService, self).__init__(bus_name, DEVICE_DISCOVERY_OBJECT_PATH)
 
-        self.detection_routines = {
-            PI_HAT_OBJECT_PATH: PiHatService.quick_detect,
-            CK2_PRO_HAT_OBJECT_PATH: CK2ProHatService.quick_detect,
-            SPEAKER_LEDS_OBJECT_PATH: SpeakerLEDsService.quick_detect
-        }
+        # Probe contexts are created, and their modules imported, on first use.
+        self.probe_contexts = dict()
+        self.detection_routines = dict(
+            (path, functools.partial(self._probe, path)) for path in DEVICE_PROBES
+        )
+
+        # Devices that were discovered and are not being probed for.
+        self.paused_devices = set()
+
+        # Devices found previously, possibly during the last boot.
+        self.last_devices = self._load_last_devices()
+
+        # Devices probed at least once since startup, whether found or not, and
+        # the callbacks waiting for all of them to be.
+        self.probed_devices = set()
+        self.probed_callbacks = list()
+
+        # The detection pin interrupts file descriptor, once watched.
+        self.detection_event_fd = None
 
         # Lazy import to avoid issue of importing from this module externally.
         from gi.repository import GObject
 
         GObject.threads_init()
-        self.discovery_thread_id = GObject.idle_add(self._discovery_thread)
+        self.probe_pool = ProbePool()
+        self._start_discovery()
 
     def clean_up(self):
         """
         Stop all running (sub)processes and clean up before process termination.
         """
 
-        # Lazy import to avoid issue of importing from this module externally.
-        from gi.repository import GObject
+        get_poll_scheduler().unregister(self.get_object_path())
+
+        if self.detection_event_fd is not None:
+            get_poll_scheduler().remove_fd_listener(
+                self.detection_event_fd, self.trigger_discovery
+            )
+            self.detection_event_fd = None
+
+        self.probe_pool.stop()
+
+    def get_discovered_devices(self):
+        """
+        Get the devices which were discovered and are still plugged in.
+
+        Returns:
+            service_object_paths - sorted list of str object paths
+        """
+        return sorted(self.paused_devices)
+
+    def is_first_pass_done(self):
+        """
+        Check whether every device type was probed at least once since startup.
+
+        Returns:
+            True or False if the discovered devices are the full set attached.
+        """
+        return self.probed_devices.issuperset(self.detection_routines)
+
+    def when_first_pass_done(self, callback):
+        """
+        Run a callback once every device type was probed at least once, straight
+        away if that is already the case.
+
+        Args:
+            callback - callable without arguments, run on the main loop
+        """
+        if self.is_first_pass_done():
+            callback()
+        else:
+            self.probed_callbacks.append(callback)
+
+    def trigger_discovery(self):
+        """
+        Run a discovery pass straight away and keep probing at the fastest rate
+        for a while, e.g. after a hotplug event or a user action.
+        """
+        if get_poll_scheduler().is_registered(self.get_object_path()):
+            get_poll_scheduler().trigger_burst([self.get_object_path()])
+
+    def pause_detection(self, service_object_path):
+        """
+        Stop probing for a device, e.g. while its service is running.
+
+        Args:
+            service_object_path - str object path of the device service
+        """
+        self.paused_devices.add(service_object_path)
+
+    def resume_detection(self, service_object_path):
+        """
+        Start probing for a device again, e.g. after it was unplugged.
+
+        Args:
+            service_object_path - str object path of the device service
+        """
+        self.paused_devices.discard(service_object_path)
 
-        GObject.source_remove(self.discovery_thread_id)
+        # The device is gone, do not prioritise it at the next startup.
+        if service_object_path in self.last_devices:
+            self.last_devices.remove(service_object_path)
+            self._save_last_devices()
+
+        # Restart the routine if it had nothing left to probe, and look around
+        # straight away as the hardware just changed.
+        if not get_poll_scheduler().is_registered(self.get_object_path()):
+            self._start_discovery()
+        else:
+            self.trigger_discovery()
+
+    def _start_discovery(self):
+        """
+        Register the discovery routine with the PollScheduler and run a first pass.
+        """
+        get_poll_scheduler().register(
+            self.get_object_path(), self._discovery_thread,
+            self.DISCOVERY_ROUTINE_RATE, self.DISCOVERY_ROUTINE_MAX_RATE
+        )
+        self.trigger_discovery()
 
     def _discovery_thread(self):
         """
         Device discovery routine to look for devices being plugged in.
 
+        The probes are handed to the ProbePool and their results are handled
+        in _on_probe_done. The routine ends once all device types are present.
+        This method is run in a separate thread with GObject.
+
+        Returns:
+            True or False if there are devices left to probe for.
+        """
+        self.probe_pool.check_timeouts()
+
+        # Probes of a group run in the order submitted, so previously found
+        # devices are confirmed first.
+        service_object_paths = sorted(
+            self.detection_routines.iterkeys(),
+            key=lambda path: path not in self.last_devices
+        )
+
+        for service_object_path in service_object_paths:
+            if service_object_path in self.paused_devices:
+                continue
+
+            self.probe_pool.submit(
+                service_object_path, self.PROBE_GROUPS[service_object_path],
+                self.detection_routines[service_object_path], self._on_probe_done
+            )
+
+        # Keep looking for the remaining devices.
+        return len(self.paused_devices) < len(self.detection_routines)
+
+    def _probe(self, service_object_path):
+        """
+        Detection routine for a device type, run on a ProbePool worker.
+
+        Returns:
+            connected - bool whether or not the device is plugged in
+        """
+        probe_context = self.probe_contexts.get(service_object_path)
+
+        if probe_context is None:
+            probe_context = get_probe_class(service_object_path)()
+            self.probe_contexts[service_object_path] = probe_context
+
+        return probe_context.probe()
+
+    def _on_probe_done(self, service_object_path, detected):
+        """
+        Callback for a finished probe, run on the main loop by the ProbePool.
+
         When a device is discovered, the 'device_discovered' DBus signal is emitted and
-        the routine ends. This method is run in a separate thread with GObject.
+        the device is no longer probed for. Failed probes count as not detected.
         """
+        if self.PROBE_GROUPS[service_object_path] == 'libkano_hat':
+            self._watch_detection_pins(service_object_path)
 
-        for service_object_path, detection_routine in self.detection_routines.iteritems():
-            if detection_routine():
-                self.device_discovered(service_object_path)
-                return False
+        if not detected or service_object_path in self.paused_devices:
+            self._mark_probed(service_object_path)
+            return
 
-        # Lazy import to avoid issue of importing from this module externally.
-        from gi.repository import GObject
+        self.pause_detection(service_object_path)
+        self.device_discovered(service_object_path)
 
-        # Did not detect anything, keep calling this method.
-        self.discovery_thread_id = GObject.timeout_add(
-            self.DISCOVERY_ROUTINE_RATE, self._discovery_thread
-        )
-        return False
+        if service_object_path not in self.last_devices:
+            self.last_devices.append(service_object_path)
+            self._save_last_devices()
+
+        self._mark_probed(service_object_path)
+
+    def _watch_detection_pins(self, service_object_path):
+        """
+        Trigger a discovery pass on the GPIO edges of the hat detection pins, once
+        the probe context for a hat initialised the library.
+        """
+        if self.detection_event_fd is not None:
+            return
+
+        probe_context = self.probe_contexts.get(service_object_path)
+        if probe_context is None:
+            return
+
+        event_fd = probe_context.get_event_fd()
+
+        if event_fd < 0:
+            return
+
+        self.detection_event_fd = event_fd
+        get_poll_scheduler().add_fd_listener(event_fd, self.trigger_discovery)
+
+    def _mark_probed(self, service_object_path):
+        """
+        Record a finished probe and run the callbacks waiting for the first pass.
+        """
+        self.probed_devices.add(service_object_path)
+
+        if not self.is_first_pass_done():
+            return
+
+        callbacks = self.probed_callbacks
+        self.probed_callbacks = list()
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(
+                    'DeviceDiscoveryService: _mark_probed: Callback failed - [{}]'
+                    .format(e)
+                )
+
+    def _load_last_devices(self):
+        """
+        Read the devices found previously from LAST_DEVICES_CACHE_PATH.
+
+        Returns:
+            devices - list of str object paths of the device services
+        """
+        try:
+            with open(LAST_DEVICES_CACHE_PATH, 'r') as cache_file:
+                devices = json.load(cache_file)['devices']
+        except (IOError, ValueError, KeyError, TypeError):
+            return list()
+
+        return [
+            str(path) for path in devices if path in self.detection_routines
+        ]
+
+    def _save_last_devices(self):
+        """
+        Write the devices found to LAST_DEVICES_CACHE_PATH for the next startup.
+        """
+        try:
+            cache_dir = os.path.dirname(LAST_DEVICES_CACHE_PATH)
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+
+            tmp_path = LAST_DEVICES_CACHE_PATH + '.tmp'
+            with open(tmp_path, 'w') as cache_file:
+                json.dump({'devices': self.last_devices}, cache_file)
+            os.rename(tmp_path, LAST_DEVICES_CACHE_PATH)
+
+        except (IOError, OSError) as e:
+            logger.warn(
+                'DeviceDiscoveryService: _save_last_devices: Could not write'
+                ' cache - [{}]'.format(e)
+            )
 
     # --- Signals -----------------------------------------------------------------------
 
@@ -0,0 +1,199 @@
+# hardware_profile.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# A per boot cache for the hardware profile, i.e. the kit type and version, the
+# EDID name and the hats attached.
+#
+# The profile is a file under /run keyed by the boot ID. Only the root
+# kano-boards-daemon writes it, in a directory only root can write to, with the
+# hats it discovered and the EDID name. It is removed whenever a device is
+# connected or disconnected and written again once the device services are up
+# to date. Other processes only read it, queries are a memory lookup as long as
+# the file did not change, and a file read otherwise. Values missing from the
+# file are computed and kept in memory for the process.
+#
+# When the boot ID cannot be read, nothing is cached and values are always computed.
+
+
+import os
+import json
+
+from kano.logging import logger
+
+from kano_peripherals.paths import HARDWARE_PROFILE_PATH
+
+
+BOOT_ID_PATH = '/proc/sys/kernel/random/boot_id'
+
+# The profile is readable by all users, its directory only writable by root.
+PROFILE_MODE = 0644
+PROFILE_DIR_MODE = 0755
+
+# In-memory copy of the profile and the modification time of the file it
+# was read from, None if the file does not exist.
+_profile = None
+_profile_mtime = None
+
+
+def get_boot_id():
+    """Get the unique identifier of the current boot.
+
+    Returns:
+        str: The boot ID or None if it could not be read
+    """
+    try:
+        with open(BOOT_ID_PATH, 'r') as boot_id_file:
+            return boot_id_file.read().strip() or None
+    except (IOError, OSError):
+        return None
+
+
+def load_profile():
+    """Get the hardware profile for the current boot.
+
+    Returns:
+        dict: The values cached so far, or None if caching is not possible
+    """
+    global _profile, _profile_mtime
+
+    boot_id = get_boot_id()
+    if not boot_id:
+        return None
+
+    mtime = _get_mtime()
+
+    if _profile is not None and _profile['boot_id'] == boot_id and \
+            mtime == _profile_mtime:
+        return _profile
+
+    profile = {'boot_id': boot_id}
+
+    if mtime is not None:
+        try:
+            with open(HARDWARE_PROFILE_PATH, 'r') as profile_file:
+                data = json.load(profile_file)
+
+            if isinstance(data, dict) and data.get('boot_id') == boot_id:
+                profile = data
+        except (IOError, OSError, ValueError):
+            pass
+
+    _profile = profile
+    _profile_mtime = mtime
+
+    return profile
+
+
+def get_value(key, compute):
+    """Get a value from the hardware profile, computing it if missing.
+
+    A computed value is only kept in memory, the file is written by the daemon.
+
+    Args:
+        key (str): The name of the value in the profile
+        compute (callable): Returns the value, which must be JSON serialisable,
+            or None if it is unknown for now, which is not stored
+
+    Returns:
+        The cached or freshly computed value
+    """
+    profile = load_profile()
+
+    if profile is None:
+        return compute()
+
+    if key in profile:
+        return profile[key]
+
+    value = compute()
+    if value is None:
+        return value
+
+    profile[key] = value
+
+    return value
+
+
+def save_profile(values):
+    """Write the hardware profile for the current boot, readable by all users.
+
+    Called by the kano-boards-daemon which runs with elevated permissions.
+
+    Args:
+        values (dict): The values of the profile, which must be JSON serialisable
+    """
+    boot_id = get_boot_id()
+    if not boot_id:
+        return
+
+    profile = dict(values)
+    profile['boot_id'] = boot_id
+
+    tmp_path = '{}.{}'.format(HARDWARE_PROFILE_PATH, os.getpid())
+
+    try:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, PROFILE_MODE)
+        os.fchmod(fd, PROFILE_MODE)
+
+        with os.fdopen(fd, 'w') as profile_file:
+            json.dump(profile, profile_file)
+        os.rename(tmp_path, HARDWARE_PROFILE_PATH)
+
+    except (IOError, OSError) as e:
+        logger.debug('hardware_profile: Could not save profile - [{}]'.format(e))
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def invalidate_profile():
+    """Drop the hardware profile so that all values are computed again."""
+    global _profile, _profile_mtime
+
+    _profile = None
+    _profile_mtime = None
+
+    try:
+        os.remove(HARDWARE_PROFILE_PATH)
+    except OSError:
+        pass
+
+
+def ensure_profile_dir():
+    """Create the directory for the profile, only writable by its owner.
+
+    Called by the kano-boards-daemon which runs with elevated permissions. The
+    mode of an existing directory is reset, e.g. one left writable by all users.
+    """
+    profile_dir = os.path.dirname(HARDWARE_PROFILE_PATH)
+
+    try:
+        if not os.path.isdir(profile_dir):
+            os.makedirs(profile_dir)
+        os.chmod(profile_dir, PROFILE_DIR_MODE)
+    except OSError as e:
+        logger.warn(
+            'hardware_profile: Could not create {} - [{}]'.format(profile_dir, e)
+        )
+
+
+def read_edid_name():
+    """Read the model name from the EDID of the screen.
+
+    kano_settings is imported here as it is slow to load and only needed when
+    the EDID is not in the hardware profile yet.
+    """
+    from kano_settings.system.display import get_edid_name
+
+    return get_edid_name()
+
+
+def _get_mtime():
+    """Get the modification time of the profile file, None if it does not exist."""
+    try:
+        return os.stat(HARDWARE_PROFILE_PATH).st_mtime
+    except OSError:
+        return None
@@ -0,0 +1,76 @@
+# hat_probe.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# A long-lived detection context for the hats driven by libkano_hat, used by the
+# device discovery through the probe contexts of the service_registry.
+
+
+from kano.logging import logger
+
+from kano_pi_hat.lib import SUCCESS, E_HAT_NOT_ATTACHED
+
+
+class HatProbe(object):
+    """
+    Detects a hat with the library loaded only once.
+
+    Unlike the quick_detect of the hat services, the library is not loaded,
+    initialised and cleaned up on every call. It is loaded, and the detection pins
+    set up, on the first probe. Each probe then only takes the library lock, reads
+    the pins and releases the lock again, so other libkano_hat users, e.g.
+    battery-status, can take it while no hat service runs, see begin_probe in
+    setup.c.
+    """
+
+    def __init__(self, library_class, name):
+        """
+        Constructor for the HatProbe.
+
+        Args:
+            library_class - class of the kano_pi_hat interface to the hat, e.g.
+                            KanoHat, with probe and get_detection_event_fd methods
+            name          - str name of the probe for the logs
+        """
+        super(HatProbe, self).__init__()
+
+        self.hat = library_class()
+        self.name = name
+        # Whether the detection pins were set up by a probe, which the event
+        # fd needs.
+        self.is_set_up = False
+
+    def probe(self):
+        """
+        Check whether the hat is plugged in.
+
+        Returns:
+            connected - bool whether or not the device is plugged in
+        """
+        rc = self.hat.probe()
+
+        if rc not in (SUCCESS, E_HAT_NOT_ATTACHED):
+            # E.g. E_LIBRARY_INITIALISED_ELSEWHERE, probed again on the next pass.
+            logger.debug(
+                '{}: probe: Could not take the library lock, rc {}'
+                .format(self.name, rc)
+            )
+            return False
+
+        self.is_set_up = True
+
+        return rc == SUCCESS
+
+    def get_event_fd(self):
+        """
+        Get the file descriptor signalling changes on the detection pins.
+
+        Returns:
+            event_fd - int file descriptor or -1 if the library was never
+                       probed or the interrupts could not be set up
+        """
+        if not self.is_set_up:
+            return -1
+
+        return self.hat.get_detection_event_fd()
@@ -0,0 +1,134 @@
+# led_calibration.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Colour calibration profiles for the LED ring boards.
+#
+# A profile is a JSON file per board type holding the red, green and blue
+# correction factors found with tools/calibrate-pihat-leds and an optional gamma:
+#
+#     {"red": 1.0, "green": 0.8, "blue": 0.9, "gamma": 1.0}
+#
+# The drivers fold the profile into per-channel lookup tables from the values sent
+# by clients to the values written to the hardware, so clients send uncorrected
+# colours and correcting them costs nothing per frame.
+
+
+import os
+import json
+
+from kano.logging import logger
+
+
+CHANNELS = ('red', 'green', 'blue')
+
+DEFAULT_CALIBRATION = {
+    'red': 1.0,
+    'green': 1.0,
+    'blue': 1.0,
+    'gamma': 1.0
+}
+
+
+def load_calibration(path):
+    """
+    Get the calibration profile of a board.
+
+    Args:
+        path - str path to the profile, e.g. PI_HAT_CALIBRATION_PATH
+
+    Returns:
+        calibration - dict as DEFAULT_CALIBRATION, the defaults are used for
+                      anything missing or invalid in the file
+    """
+    calibration = dict(DEFAULT_CALIBRATION)
+
+    try:
+        with open(path, 'r') as calibration_file:
+            data = json.load(calibration_file)
+    except IOError:
+        return calibration
+    except ValueError as e:
+        logger.warn('led_calibration: Invalid profile {} - [{}]'.format(path, e))
+        return calibration
+
+    if not isinstance(data, dict):
+        logger.warn('led_calibration: Invalid profile {}'.format(path))
+        return calibration
+
+    for key in calibration:
+        try:
+            value = float(data.get(key, calibration[key]))
+        except (TypeError, ValueError):
+            logger.warn(
+                'led_calibration: Invalid {} in profile {}'.format(key, path)
+            )
+            continue
+
+        if key in CHANNELS:
+            calibration[key] = min(max(value, 0.0), 1.0)
+        elif value > 0:
+            calibration[key] = value
+
+    return calibration
+
+
+def save_calibration(path, calibration):
+    """
+    Write the calibration profile of a board.
+
+    Args:
+        path        - str path to the profile, e.g. PI_HAT_CALIBRATION_PATH
+        calibration - dict as DEFAULT_CALIBRATION
+
+    Returns:
+        successful - bool whether or not the operation was successful
+    """
+    tmp_path = '{}.{}'.format(path, os.getpid())
+
+    try:
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+
+        with open(tmp_path, 'w') as calibration_file:
+            json.dump(
+                dict((key, calibration[key]) for key in DEFAULT_CALIBRATION),
+                calibration_file, indent=4, sort_keys=True
+            )
+        os.rename(tmp_path, path)
+
+    except (IOError, OSError) as e:
+        logger.error('led_calibration: Could not save {} - [{}]'.format(path, e))
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return False
+
+    return True
+
+
+def get_factors(calibration):
+    """
+    Get the correction factors of a profile.
+
+    Returns:
+        factors - tuple of float red, green and blue factors
+    """
+    return tuple(calibration[channel] for channel in CHANNELS)
+
+
+def calibrate(value, factor, gamma=1.0):
+    """
+    Correct an intensity value, as done when building the lookup tables.
+
+    Args:
+        value  - float intensity from 0.0 to 1.0
+        factor - float correction factor of the channel
+        gamma  - float exponent applied after the factor
+
+    Returns:
+        value - float corrected intensity from 0.0 to 1.0
+    """
+    return min(max(value * factor, 0.0), 1.0) ** gamma
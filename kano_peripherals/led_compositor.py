@@ -0,0 +1,394 @@
+# led_compositor.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# A layered framebuffer compositor for LED ring boards.
+#
+# Each lock priority level owns a framebuffer layer. Clients write their frames
+# into the layer of the priority they hold and the compositor commits the topmost
+# non-empty layer to the hardware, blended over the layers below when it is not
+# fully opaque. When a layer is cleared, the one below shows again straight away.
+#
+# A layer may only own a region of the ring when its lock was taken with an LED
+# mask. Regions from different layers are merged per LED and the writes of all
+# clients within one main loop iteration are coalesced into a single commit.
+# As that commit happens later, a failed write is reported to the service through
+# a callback and to the clients by the result of their next write.
+#
+# The layers and the composed frame are Frames, updated in place. Composing starts
+# from the topmost opaque layer covering the whole ring, which is a plain copy of
+# its levels, and only blends the layers above it.
+
+
+from array import array
+
+from kano.logging import logger
+
+from kano_peripherals.led_frame import Frame, CHANNELS
+
+
+class LEDCompositor(object):
+    """
+    A stack of framebuffer layers, one for each lock priority level.
+
+    Layer 0 belongs to clients which do not hold a lock. A layer is empty until
+    a frame is written into it and is emptied again when its lock is released.
+    Each layer covers the LEDs set in its mask, all of them by default.
+    """
+
+    # The fixed point scale of the layer opacities used for blending.
+    ALPHA_SCALE = 256
+
+    def __init__(self, num_leds, write_levels, max_priority=10, on_commit_failed=None):
+        """
+        Constructor for the LEDCompositor.
+
+        Args:
+            num_leds         - int number of LEDs on the ring
+            write_levels     - callable taking the array('H') levels of a Frame
+                               which writes them to the hardware and returns
+                               whether it was successful
+            max_priority     - int top priority level as used by the PriorityLock
+            on_commit_failed - callable without arguments run when a commit
+                               scheduled with schedule_commit could not be
+                               written, e.g. to check whether the board is gone
+        """
+        super(LEDCompositor, self).__init__()
+
+        self.num_leds = num_leds
+        self.write_levels = write_levels
+
+        self.layers = [None for i in xrange(max_priority + 1)]
+        self.alphas = [1.0 for i in xrange(max_priority + 1)]
+        self.masks = [None for i in xrange(max_priority + 1)]
+        # The levels covered by each masked layer, None for all of them.
+        self.mask_levels = [None for i in xrange(max_priority + 1)]
+
+        # The composed frame, reused for every commit, and all LEDs off.
+        self.output = Frame(num_leds)
+        self.blank_levels = array('H', [0]) * (num_leds * CHANNELS)
+
+        self.on_commit_failed = on_commit_failed
+
+        self.commit_id = None
+        self.is_commit_failing = False
+
+    def __len__(self):
+        """ Length of the object is given by the number of layers. """
+        return len(self.layers)
+
+    # --- Layer Management --------------------------------------------------------------
+
+    def set_frame(self, priority, values):
+        """
+        Write a full frame into a layer.
+
+        Values past the number of LEDs are ignored, LEDs without a value keep
+        their previous one in the layer (off for a new layer).
+
+        Args:
+            priority - int layer index
+            values   - Frame for num_leds LEDs, whose levels are copied, or list
+                       of (r,g,b) tuples where r,g,b are between 0.0 and 1.0
+        """
+        layer = self._get_layer(priority)
+
+        if isinstance(values, Frame):
+            layer.copy_from(values)
+        else:
+            layer.set_values(values)
+
+    def set_led(self, priority, led_idx, rgb):
+        """
+        Write a single LED value into a layer.
+
+        Args:
+            priority - int layer index
+            led_idx  - int led index from 0 to num_leds - 1
+            rgb      - tuple of red, green, blue intensity from 0.0 to 1.0
+        """
+        if led_idx < 0 or led_idx >= self.num_leds:
+            logger.warn(
+                'LEDCompositor: set_led: LED index {} out of range'.format(led_idx)
+            )
+            return
+
+        self._get_layer(priority)[led_idx] = rgb
+
+    def clear(self, priority):
+        """
+        Empty a layer and reset its opacity and region.
+
+        Args:
+            priority - int layer index
+        """
+        self.layers[priority] = None
+        self.alphas[priority] = 1.0
+        self.masks[priority] = None
+        self.mask_levels[priority] = None
+
+    def set_mask(self, priority, led_mask):
+        """
+        Restrict a layer to a region of the ring.
+
+        Args:
+            priority - int layer index
+            led_mask - int bitmask where bit i is LED i, None or 0 for all LEDs
+        """
+        if not led_mask:
+            self.masks[priority] = None
+            self.mask_levels[priority] = None
+            return
+
+        self.masks[priority] = [
+            bool(led_mask & (1 << idx)) for idx in xrange(self.num_leds)
+        ]
+        self.mask_levels[priority] = [
+            idx * CHANNELS + channel
+            for idx in xrange(self.num_leds) if self.masks[priority][idx]
+            for channel in xrange(CHANNELS)
+        ]
+
+    def sync_locks(self, locks):
+        """
+        Match the layers to the current locks. Layers of priority levels which are
+        no longer locked are emptied to show the frame underneath them and the
+        regions of the held locks are applied.
+
+        Args:
+            locks - PriorityLock object holding the current locks
+
+        Returns:
+            True or False if any layer was released.
+        """
+        released = False
+
+        for priority in xrange(1, len(self.layers)):
+            lock_data = locks.get(priority)
+
+            if lock_data is not None:
+                self.set_mask(priority, lock_data.get('led_mask'))
+            elif self.layers[priority] is not None:
+                self.clear(priority)
+                released = True
+
+        if released:
+            self.schedule_commit()
+
+        return released
+
+    def set_alpha(self, priority, alpha):
+        """
+        Set the opacity used to blend a layer over the ones below it.
+
+        Args:
+            priority - int layer index
+            alpha    - float opacity between 0.0 (transparent) and 1.0 (opaque)
+        """
+        self.alphas[priority] = min(max(float(alpha), 0.0), 1.0)
+
+    def get_top_layer(self):
+        """
+        Get the index of the topmost non-empty layer.
+
+        Returns:
+            priority - int layer index or None if all layers are empty
+        """
+        for priority in xrange(len(self.layers) - 1, -1, -1):
+            if self.layers[priority] is not None:
+                return priority
+
+        return None
+
+    def is_visible(self, priority):
+        """
+        Check whether a layer contributes to the composed frame.
+
+        Returns:
+            True or False if the layer is non-empty and at least one of its LEDs
+            is not covered by an opaque layer above.
+        """
+        if self.layers[priority] is None:
+            return False
+
+        uncovered = self._get_region(priority)
+
+        for above in xrange(priority + 1, len(self.layers)):
+            if self.layers[above] is None or self.alphas[above] < 1.0:
+                continue
+
+            region = self._get_region(above)
+            uncovered = [mine and not theirs for mine, theirs in zip(uncovered, region)]
+
+            if not any(uncovered):
+                return False
+
+        return True
+
+    # --- Composition -------------------------------------------------------------------
+
+    def compose(self):
+        """
+        Compose the frame to be shown from the visible layers, in place.
+
+        Returns:
+            frame - Frame reused for every call, or None if all layers are empty
+        """
+        top = self.get_top_layer()
+        if top is None:
+            return None
+
+        output = self.output.levels
+
+        # Opaque layers simply replace what is underneath in their region, so
+        # nothing below the topmost one covering the whole ring shows.
+        start = 0
+        for priority in xrange(top, -1, -1):
+            if self._is_covering(priority):
+                start = priority
+                break
+
+        if self._is_covering(start):
+            output[:] = self.layers[start].levels
+            start += 1
+        else:
+            output[:] = self.blank_levels
+
+        # Blend the layers above it from the bottom up.
+        for priority in xrange(start, top + 1):
+            if self.layers[priority] is not None:
+                self._blend(priority, output)
+
+        return self.output
+
+    def commit(self, priority=None):
+        """
+        Write the composed frame to the hardware.
+
+        Args:
+            priority - int index of the layer which changed, nothing is written if
+                       it is not visible. If None, the frame is always written.
+
+        Returns:
+            True or False if the layer is visible and the write was successful.
+        """
+        if priority is not None and not self.is_visible(priority):
+            return False
+
+        frame = self.compose()
+        if frame is None:
+            self.output.levels[:] = self.blank_levels
+            frame = self.output
+
+        return self.write_levels(frame.levels)
+
+    def schedule_commit(self, priority=None):
+        """
+        Commit the composed frame once the main loop is idle.
+
+        All the writes received by the service before the main loop becomes idle,
+        possibly from several clients owning different regions, end up in a
+        single hardware commit.
+
+        Args:
+            priority - int index of the layer which changed, nothing is scheduled
+                       if it is not visible. If None, a commit is always scheduled.
+
+        Returns:
+            True or False if the layer is visible and the last scheduled commit,
+            if any, was written successfully. A failure of the commit scheduled
+            now is only known once it runs, see on_commit_failed.
+        """
+        if priority is not None and not self.is_visible(priority):
+            return False
+
+        if self.commit_id is None:
+            # Lazy import to avoid issue of importing from this module externally.
+            from gi.repository import GObject
+
+            self.commit_id = GObject.idle_add(self._deferred_commit)
+
+        return not self.is_commit_failing
+
+    def cancel_commit(self):
+        """
+        Drop a commit scheduled with schedule_commit, if any.
+        """
+        if self.commit_id is None:
+            return
+
+        # Lazy import to avoid issue of importing from this module externally.
+        from gi.repository import GObject
+
+        GObject.source_remove(self.commit_id)
+        self.commit_id = None
+
+    # --- Private Helpers ---------------------------------------------------------------
+
+    def _get_layer(self, priority):
+        """
+        Get a layer for writing, creating it if it is empty.
+        """
+        if self.layers[priority] is None:
+            self.layers[priority] = Frame(self.num_leds)
+
+        return self.layers[priority]
+
+    def _get_region(self, priority):
+        """
+        Get the per LED list of booleans for the region a layer covers.
+        """
+        if self.masks[priority] is None:
+            return [True] * self.num_leds
+
+        return self.masks[priority]
+
+    def _is_covering(self, priority):
+        """
+        Check whether a layer is non-empty, opaque and covers the whole ring.
+        """
+        return self.layers[priority] is not None and \
+            self.alphas[priority] >= 1.0 and self.masks[priority] is None
+
+    def _blend(self, priority, output):
+        """
+        Blend a layer over the levels composed so far, in its region, in place.
+        """
+        levels = self.layers[priority].levels
+        region = self.mask_levels[priority]
+
+        if self.alphas[priority] >= 1.0:
+            if region is None:
+                output[:] = levels
+                return
+
+            for idx in region:
+                output[idx] = levels[idx]
+            return
+
+        if region is None:
+            region = xrange(len(output))
+
+        # Fixed point blending, rounded to the nearest level.
+        weight = int(self.alphas[priority] * self.ALPHA_SCALE + 0.5)
+        rest = self.ALPHA_SCALE - weight
+        half = self.ALPHA_SCALE / 2
+
+        for idx in region:
+            output[idx] = (levels[idx] * weight + output[idx] * rest + half) / self.ALPHA_SCALE
+
+    def _deferred_commit(self):
+        """
+        Idle callback for schedule_commit, runs only once.
+        """
+        self.commit_id = None
+        self.is_commit_failing = not self.commit()
+
+        if self.is_commit_failing:
+            logger.warn('LEDCompositor: Could not write the composed frame')
+
+            if self.on_commit_failed is not None:
+                self.on_commit_failed()
+
+        return False
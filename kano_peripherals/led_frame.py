@@ -0,0 +1,187 @@
+# led_frame.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Compact LED frames passed between the animations, the board services and the
+# drivers.
+#
+# A Frame holds the red, green and blue levels of each LED as 16 bit unsigned ints
+# in a flat array('H'), from 0 for off to MAX_LEVEL for full intensity. Rather than
+# building a list of float 3-tuples for every frame, a Frame is kept and updated
+# in place. Its buffer is sent over D-Bus as a byte array, see the
+# set_all_leds_packed methods of the board services, and is given as is to the
+# drivers, which index their lookup tables with the levels.
+
+
+import sys
+from array import array
+
+
+MAX_LEVEL = 0xFFFF
+CHANNELS = 3
+
+
+def to_level(value):
+    """
+    Convert an intensity value to a Frame level.
+
+    Args:
+        value - float intensity from 0.0 to 1.0, clamped
+
+    Returns:
+        level - int from 0 to MAX_LEVEL
+    """
+    return int(min(max(value, 0.0), 1.0) * MAX_LEVEL + 0.5)
+
+
+def to_lut_index(level, lut_size):
+    """
+    Get the entry of a lookup table over intensities from 0.0 to 1.0 closest to
+    a Frame level, using integer operations only.
+
+    Args:
+        level    - int from 0 to MAX_LEVEL
+        lut_size - int number of entries of the table
+
+    Returns:
+        index - int from 0 to lut_size - 1
+    """
+    return ((lut_size - 1) * level + MAX_LEVEL / 2) / MAX_LEVEL
+
+
+class Frame(object):
+    """
+    The red, green and blue levels of a ring of LEDs.
+    """
+
+    __slots__ = ('num_leds', 'levels')
+
+    def __init__(self, num_leds, levels=None):
+        """
+        Constructor for the Frame, all LEDs are off by default.
+
+        Args:
+            num_leds - int number of LEDs
+            levels   - array('H') of num_leds * CHANNELS levels to use, not copied
+
+        Raises:
+            ValueError - if the levels are not for num_leds LEDs
+        """
+        if levels is None:
+            levels = array('H', [0]) * (num_leds * CHANNELS)
+        elif len(levels) != num_leds * CHANNELS:
+            raise ValueError(
+                'Frame: {} levels given for {} LEDs'.format(len(levels), num_leds)
+            )
+
+        self.num_leds = num_leds
+        self.levels = levels
+
+    @classmethod
+    def from_values(cls, values):
+        """
+        Create a Frame from a list of (r,g,b) tuples where r,g,b are between 0.0
+        and 1.0.
+        """
+        frame = cls(len(values))
+        frame.set_values(values)
+
+        return frame
+
+    @classmethod
+    def from_bytes(cls, data, num_leds=None):
+        """
+        Create a Frame from its packed form, see to_bytes().
+
+        Args:
+            data     - str or bytearray of little endian 16 bit levels
+            num_leds - int number of LEDs expected, any if None
+
+        Raises:
+            ValueError - if the data is not a whole number of LEDs or not for
+                         num_leds LEDs
+        """
+        levels = array('H')
+        try:
+            levels.fromstring(bytes(data))
+        except ValueError:
+            raise ValueError('Frame: {} bytes are not whole levels'.format(len(data)))
+
+        if sys.byteorder == 'big':
+            levels.byteswap()
+
+        if len(levels) % CHANNELS:
+            raise ValueError('Frame: {} levels are not whole LEDs'.format(len(levels)))
+
+        if num_leds is None:
+            num_leds = len(levels) / CHANNELS
+
+        return cls(num_leds, levels)
+
+    def to_bytes(self):
+        """
+        Get the packed form of the Frame, the levels in little endian order.
+
+        Returns:
+            data - str of num_leds * CHANNELS * 2 bytes
+        """
+        if sys.byteorder == 'big':
+            levels = array('H', self.levels)
+            levels.byteswap()
+            return levels.tostring()
+
+        return self.levels.tostring()
+
+    def set_values(self, values):
+        """
+        Set the LEDs from a list of (r,g,b) tuples where r,g,b are between 0.0
+        and 1.0, in place. LEDs without a value are left as they are.
+        """
+        levels = self.levels
+        idx = 0
+
+        for rgb in values[:self.num_leds]:
+            levels[idx] = to_level(rgb[0])
+            levels[idx + 1] = to_level(rgb[1])
+            levels[idx + 2] = to_level(rgb[2])
+            idx += CHANNELS
+
+    def to_values(self):
+        """
+        Get the LEDs as a list of (r,g,b) tuples where r,g,b are between 0.0
+        and 1.0, e.g. for the a(ddd) D-Bus methods.
+        """
+        return [self[idx] for idx in xrange(self.num_leds)]
+
+    def copy_from(self, other):
+        """
+        Set the levels from another Frame with the same number of LEDs, in place.
+        """
+        self.levels[:] = other.levels
+
+    def __len__(self):
+        return self.num_leds
+
+    def __getitem__(self, idx):
+        base = idx * CHANNELS
+        levels = self.levels
+        scale = 1.0 / MAX_LEVEL
+
+        return (levels[base] * scale, levels[base + 1] * scale, levels[base + 2] * scale)
+
+    def __setitem__(self, idx, rgb):
+        base = idx * CHANNELS
+        levels = self.levels
+
+        levels[base] = to_level(rgb[0])
+        levels[base + 1] = to_level(rgb[1])
+        levels[base + 2] = to_level(rgb[2])
+
+    def __eq__(self, other):
+        return isinstance(other, Frame) and self.levels == other.levels
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
@@ -0,0 +1,80 @@
+# led_resampler.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Mapping of frames drawn on the logical LED ring onto the ring of each board.
+#
+# LED i of a ring with N LEDs sits at i / N of a turn. A board LED is given the
+# colour found at its own position on the logical ring, interpolating linearly
+# between the two closest logical LEDs and wrapping around the end of the ring.
+
+
+def resample_frame(values, num_leds):
+    """
+    Resample a frame to a ring with a different number of LEDs.
+
+    Args:
+        values   - list of (r,g,b) tuples where r,g,b are between 0.0 and 1.0
+        num_leds - int number of LEDs of the ring to resample to
+
+    Returns:
+        values - list of num_leds (r,g,b) tuples, the same list if the ring sizes
+                 match
+    """
+    num_values = len(values)
+    if num_values == num_leds or not num_values:
+        return values
+
+    frame = list()
+    scale = float(num_values) / num_leds
+
+    for idx in xrange(num_leds):
+        position = idx * scale
+        low = int(position)
+        weight = position - low
+        high = (low + 1) % num_values
+
+        if not weight:
+            frame.append(tuple(values[low]))
+            continue
+
+        frame.append(tuple(
+            a + (b - a) * weight for a, b in zip(values[low], values[high])
+        ))
+
+    return frame
+
+
+def resample_mask(led_mask, num_values, num_leds):
+    """
+    Resample an LED bitmask to a ring with a different number of LEDs. A board
+    LED is in the mask when the logical LED closest to it is.
+
+    Args:
+        led_mask   - int bitmask where bit i is LED i of the logical ring, 0 for
+                     all LEDs
+        num_values - int number of LEDs of the logical ring
+        num_leds   - int number of LEDs of the ring to resample to
+
+    Returns:
+        led_mask - int bitmask of the LEDs of the board, 0 for all LEDs
+    """
+    if not led_mask or num_values == num_leds:
+        return led_mask
+
+    board_mask = 0
+    scale = float(num_values) / num_leds
+
+    for idx in xrange(num_leds):
+        nearest = int(round(idx * scale)) % num_values
+        if led_mask & (1 << nearest):
+            board_mask |= 1 << idx
+
+    # Each logical LED keeps at least its closest board LED, a board with fewer
+    # LEDs would otherwise be left with an empty mask, i.e. the whole ring.
+    for idx in xrange(num_values):
+        if led_mask & (1 << idx):
+            board_mask |= 1 << (int(round(idx / scale)) % num_leds)
+
+    return board_mask
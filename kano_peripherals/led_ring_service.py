@@ -0,0 +1,432 @@
+# led_ring_service.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# A DBus service driving all the LED ring boards attached as one logical ring.
+#
+# Clients lock and draw on the logical ring as they would on a single board. The
+# calls are forwarded in-process to the PiHat and LED Speaker services which are
+# running, on behalf of the calling client, so each board keeps its own locks and
+# framebuffer layers. Frames are rendered once by the client, resampled to the
+# number of LEDs of each board, see led_resampler, and the boards correct the
+# colours with their own calibration profile when writing them.
+#
+# Boards which come up while a client holds a ring lock are locked for it the next
+# time it draws.
+
+
+import dbus
+import functools
+import dbus.service
+
+from kano.logging import logger
+
+from kano_peripherals.base_dbus_service import BaseDBusService
+from kano_peripherals.led_frame import Frame
+from kano_peripherals.led_resampler import resample_frame, resample_mask
+from kano_peripherals.paths import LED_RING_OBJECT_PATH, SERVICE_API_IFACE, \
+    PI_HAT_OBJECT_PATH, SPEAKER_LEDS_OBJECT_PATH, BUS_NAME
+
+
+class LEDRingService(BaseDBusService):
+    """
+    This is a DBus Service provided by kano-boards-daemon.
+
+    It exports an object to /me/kano/boards/LEDRing and
+    its interface to me.kano.boards.LEDRing
+
+    Does not require sudo.
+    """
+
+    # The device services with an LED ring, in the order they are drawn to.
+    RING_BOARDS = (PI_HAT_OBJECT_PATH, SPEAKER_LEDS_OBJECT_PATH)
+
+    def __init__(self, bus_name, running_services):
+        """
+        Constructor for the LEDRingService.
+
+        Args:
+            bus_name         - A dbus.service.BusName object to configure the base
+                               address.
+            running_services - dict of the running service instances by object path,
+                               as kept by the ServiceManager
+        """
+        super(LEDRingService, self).__init__(bus_name, LED_RING_OBJECT_PATH)
+
+        self.running_services = running_services
+
+        # The ring locks held by the clients, by their unique bus name, as
+        # (priority, led_mask) to lock the boards which come up later.
+        self.locks = dict()
+        self.lock_watches = dict()
+
+        self.connection.add_signal_receiver(
+            self._on_board_lock_changed, 'lock_changed',
+            SERVICE_API_IFACE, BUS_NAME, path_keyword='path'
+        )
+
+    def clean_up(self):
+        """
+        Stop listening to the boards and watching the clients.
+        """
+        self.connection.remove_signal_receiver(
+            self._on_board_lock_changed, 'lock_changed',
+            SERVICE_API_IFACE, BUS_NAME, path_keyword='path'
+        )
+
+        for watch in self.lock_watches.itervalues():
+            watch.cancel()
+        self.lock_watches.clear()
+        self.locks.clear()
+
+    # --- Board Detection ---------------------------------------------------------------
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='', out_signature='b')
+    def detect(self):
+        """
+        Detect whether any LED ring board is connected.
+
+        Returns:
+            connected - bool whether a board is plugged in or not.
+        """
+        return bool(self._get_boards())
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='', out_signature='as')
+    def get_boards(self):
+        """
+        Get the LED ring boards the frames are written to.
+
+        Returns:
+            service_object_paths - list of str object paths of the board services
+        """
+        return dbus.Array(
+            [board.get_object_path() for board in self._get_boards()], signature='s'
+        )
+
+    # --- API Locking -------------------------------------------------------------------
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='i', out_signature='s',
+                         sender_keyword='sender_id')
+    def lock(self, priority, sender_id=None):
+        """
+        Block all other API calls with a lower priority on all the boards.
+
+        The lock is taken on every board or none of them, see the lock() method
+        of the board services.
+
+        Args:
+            priority - number representing the priority level (default is 1 to 10).
+
+        Returns:
+            token - str with an API token for identification or empty str if unsuccessful
+        """
+        return self.lock_region(priority, 0, sender_id=sender_id)
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='iu', out_signature='s',
+                         sender_keyword='sender_id')
+    def lock_region(self, priority, led_mask, sender_id=None):
+        """
+        Block all other API calls with a lower priority on some of the LEDs of
+        all the boards.
+
+        The mask is given over the LEDs of the logical ring, see get_num_leds, and
+        is resampled to each board.
+
+        Args:
+            priority - number representing the priority level (default is 1 to 10).
+            led_mask - unsigned int bitmask where bit i is LED i, 0 for all LEDs
+
+        Returns:
+            token - str with an API token for identification or empty str if unsuccessful
+        """
+        boards = self._get_boards()
+        if not boards or not sender_id:
+            return ''
+
+        locked = list()
+        for board in boards:
+            if not self._lock_board(board, priority, led_mask, sender_id):
+                logger.warn(
+                    'LEDRingService: lock_region: Could not lock {} for {}'
+                    .format(board.get_object_path(), sender_id)
+                )
+                for locked_board in locked:
+                    locked_board.unlock(sender_id=sender_id)
+                return ''
+
+            locked.append(board)
+
+        self.locks[sender_id] = (priority, led_mask)
+
+        if sender_id not in self.lock_watches:
+            self.lock_watches[sender_id] = self.connection.watch_name_owner(
+                sender_id, functools.partial(self._on_lock_owner_changed, sender_id)
+            )
+
+        return sender_id
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='', out_signature='b',
+                         sender_keyword='sender_id')
+    def is_preempted(self, sender_id=None):
+        """
+        Check whether the caller is preempted on all the boards, i.e. nothing
+        it draws would be shown.
+
+        Returns:
+            True or False if the caller is preempted.
+        """
+        boards = self._get_boards()
+        if not boards:
+            return False
+
+        return all(board.is_preempted(sender_id=sender_id) for board in boards)
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='', out_signature='b',
+                         sender_keyword='sender_id')
+    def unlock(self, sender_id=None):
+        """
+        Unlock the API from the calling sender on all the boards.
+
+        Returns:
+            True or False if the operation was successful.
+        """
+        self._forget_lock(sender_id)
+
+        successful = True
+        for board in self._get_boards():
+            if board.lockable_service.get_priority(sender_id):
+                successful = board.unlock(sender_id=sender_id) and successful
+
+        return successful
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='i', out_signature='b')
+    def is_locked(self, priority):
+        """
+        Check if the given priority level or any above are locked on any board.
+
+        Args:
+            priority - number representing the priority level (default is 1 to 10).
+
+        Returns:
+            True or False if the API is locked on the given priority level.
+        """
+        return any(board.is_locked(priority) for board in self._get_boards())
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='', out_signature='i')
+    def get_max_lock_priority(self):
+        """
+        Get the maximum priority level to lock with, the lowest of all the boards.
+
+        Returns:
+            MAX_PRIORITY_LEVEL - unsigned integer number of priority levels
+        """
+        priorities = [board.get_max_lock_priority() for board in self._get_boards()]
+        return min(priorities) if priorities else 0
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='d', out_signature='b',
+                         sender_keyword='sender_id')
+    def set_layer_alpha(self, alpha, sender_id=None):
+        """
+        Set the opacity of the framebuffer layers owned by the calling sender on
+        all the boards.
+
+        Args:
+            alpha - float opacity between 0.0 (transparent) and 1.0 (opaque)
+
+        Returns:
+            True or False if the sender holds a lock and the operation was successful.
+        """
+        results = [
+            board.set_layer_alpha(alpha, sender_id=sender_id)
+            for board in self._get_boards()
+        ]
+        return bool(results) and all(results)
+
+    @dbus.service.signal(SERVICE_API_IFACE, signature='is')
+    def lock_changed(self, top_priority, owner):
+        """
+        DBus signal to be emitted when an API lock was added or removed on any
+        of the boards.
+
+        Args:
+            top_priority - int priority of the top lock over all the boards, 0 when
+                           they are all unlocked
+            owner        - str unique bus name of the top lock holder, empty if none
+        """
+        pass
+
+    def _on_board_lock_changed(self, top_priority, owner, path=None):
+        """
+        Signal handler for the lock_changed signal of the boards.
+        """
+        if path not in self.RING_BOARDS:
+            return
+
+        top_owners = [
+            board.lockable_service.get_top_owner() for board in self._get_boards()
+        ]
+        top_priority, owner = max(top_owners) if top_owners else (0, '')
+        self.lock_changed(top_priority, owner)
+
+    def _on_lock_owner_changed(self, sender_id, new_owner):
+        """
+        Callback for watch_name_owner on the client of a ring lock.
+        """
+        if not new_owner:
+            self._forget_lock(sender_id)
+
+    # --- LED Programming API -----------------------------------------------------------
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='', out_signature='b',
+                         sender_keyword='sender_id')
+    def set_leds_off(self, sender_id=None):
+        """
+        Set all LEDs off on all the boards.
+        This method can be locked by other processes.
+
+        Returns:
+            True or False if the operation was successful.
+        """
+        return self.set_all_leds(
+            [(0, 0, 0)] * self.get_num_leds(), sender_id=sender_id
+        )
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='a(ddd)', out_signature='b',
+                         sender_keyword='sender_id')
+    def set_all_leds(self, values, sender_id=None):
+        """
+        Set all LED values of the logical ring, on all the boards.
+        This method can be locked by other processes.
+
+        The frame is resampled to the number of LEDs of each board.
+
+        Args:
+            values - list of (r,g,b) tuples where r,g,b are between 0.0 and 1.0
+
+        Returns:
+            True or False if the values are visible on any board and the operation
+            was successful.
+        """
+        visible = False
+
+        for board in self._get_boards():
+            self._relock_board(board, sender_id)
+            frame = resample_frame(values, board.get_num_leds())
+            visible = board.set_all_leds(frame, sender_id=sender_id) or visible
+
+        return visible
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='ay', out_signature='b',
+                         sender_keyword='sender_id', byte_arrays=True)
+    def set_all_leds_packed(self, data, sender_id=None):
+        """
+        Set all LED values of the logical ring from a packed frame, as
+        set_all_leds. Boards with as many LEDs as the frame are given it as is.
+
+        Args:
+            data - bytes of a frame in its packed form, see led_frame.Frame
+
+        Returns:
+            True or False if the values are visible on any board and the operation
+            was successful.
+        """
+        try:
+            frame = Frame.from_bytes(data)
+        except ValueError as e:
+            logger.warn('LEDRingService: set_all_leds_packed: {}'.format(e))
+            return False
+
+        values = None
+        visible = False
+
+        for board in self._get_boards():
+            self._relock_board(board, sender_id)
+
+            if board.get_num_leds() == len(frame):
+                visible = board.set_all_leds_packed(data, sender_id=sender_id) or visible
+                continue
+
+            if values is None:
+                values = frame.to_values()
+            frame_values = resample_frame(values, board.get_num_leds())
+            visible = board.set_all_leds(frame_values, sender_id=sender_id) or visible
+
+        return visible
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='', out_signature='i')
+    def get_num_leds(self):
+        """
+        Get the number of LEDs of the logical ring, the most of all the boards.
+
+        Returns:
+            num_leds - integer number of LEDs, 0 if no board is attached
+        """
+        num_leds = [board.get_num_leds() for board in self._get_boards()]
+        return max(num_leds) if num_leds else 0
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='', out_signature='i')
+    def get_resolution(self):
+        """
+        Get the number of output levels of each colour channel, the most of all
+        the boards so that no board is drawn coarser than it could be.
+
+        Returns:
+            resolution - integer number of levels, 0 if no board is attached
+        """
+        resolutions = [board.get_resolution() for board in self._get_boards()]
+        return max(resolutions) if resolutions else 0
+
+    # --- Private Helpers ---------------------------------------------------------------
+
+    def _get_boards(self):
+        """
+        Get the running services of the LED ring boards.
+
+        Returns:
+            boards - list of service instances, in RING_BOARDS order
+        """
+        return [
+            self.running_services[path] for path in self.RING_BOARDS
+            if path in self.running_services
+        ]
+
+    def _lock_board(self, board, priority, led_mask, sender_id):
+        """
+        Lock a board for a client, the logical ring mask being resampled to it.
+
+        Returns:
+            token - str with an API token for identification or empty str if unsuccessful
+        """
+        if not led_mask:
+            return board.lock(priority, sender_id=sender_id)
+
+        board_mask = resample_mask(led_mask, self.get_num_leds(), board.get_num_leds())
+        return board.lock_region(priority, board_mask, sender_id=sender_id)
+
+    def _relock_board(self, board, sender_id):
+        """
+        Lock a board which came up after the client locked the ring.
+        """
+        if sender_id not in self.locks:
+            return
+
+        if board.lockable_service.get_priority(sender_id):
+            return
+
+        priority, led_mask = self.locks[sender_id]
+        if not self._lock_board(board, priority, led_mask, sender_id):
+            logger.warn(
+                'LEDRingService: _relock_board: Could not lock {} for {}'
+                .format(board.get_object_path(), sender_id)
+            )
+
+    def _forget_lock(self, sender_id):
+        """
+        Drop the ring lock of a client and stop watching it.
+        """
+        self.locks.pop(sender_id, None)
+
+        watch = self.lock_watches.pop(sender_id, None)
+        if watch is not None:
+            watch.cancel()
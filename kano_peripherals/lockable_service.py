@@ -26,17 +26,28 @@ class LockableService(object):
 
     LOCKING_THREAD_POLL_RATE = 1000 * 10   # ms
 
-    def __init__(self, max_priority=10):
+    def __init__(self, max_priority=10, on_change=None):
+        """
+        Constructor for the LockableService.
+
+        Args:
+            max_priority - int top priority level for a lock
+            on_change    - callable run without arguments after a lock is added
+                           or removed
+        """
         super(LockableService, self).__init__()
 
         self.locks = PriorityLock(max_priority=max_priority)
+        self.on_change = on_change
 
-    def lock(self, priority, sender_id=None):
+    def lock(self, priority, sender_id=None, led_mask=None):
         """
         Block all other API calls with a lower priority.
 
         Args:
             priority - number representing the priority level (default is 1 to 10).
+            led_mask - int bitmask of the LEDs to lock where bit i is LED i,
+                       None or 0 to lock all of them.
 
         Returns:
             True or False if the operation was successful.
@@ -45,6 +56,7 @@ class LockableService(object):
 
         if self.locks.get(priority) is None and sender_id:
             lock_data = self._get_sender_data(sender_id)
+            lock_data['led_mask'] = int(led_mask) if led_mask else None
 
             if self.locks.is_empty():
                 # Lazy import to avoid issue of importing from this module externally.
@@ -58,6 +70,8 @@ class LockableService(object):
             logger.info('LED Speaker locked with priority [{}] by [{}]'
                         .format(priority, lock_data))
 
+            self._notify_change()
+
         return token
 
     def unlock(self, sender_id=None):
@@ -70,12 +84,19 @@ class LockableService(object):
         successful = False
 
         if sender_id:
-            lock_data = self._get_sender_data(sender_id)
-            successful = self.locks.remove(lock_data)
+            for priority in xrange(self.locks.top_priority, 0, -1):
+                lock_data = self.locks.get(priority)
+
+                if lock_data is None or lock_data['sender_id'] != sender_id:
+                    continue
+
+                if self.locks.remove_priority(priority):
+                    successful = True
+                    logger.info('LED Speaker unlocked from [{}] with PID [{}]'
+                                .format(lock_data['cmd'], lock_data['PID']))
 
             if successful:
-                logger.info('LED Speaker unlocked from [{}] with PID [{}]'
-                            .format(lock_data['cmd'], lock_data['PID']))
+                self._notify_change()
 
         return successful
 
@@ -91,6 +112,72 @@ class LockableService(object):
         """
         return self.locks.contains_above(priority)
 
+    def get_priority(self, sender_id):
+        """
+        Get the priority level locked by the given sender.
+
+        Args:
+            sender_id - str unique bus name of the API caller
+
+        Returns:
+            priority - int highest priority level held by the sender or 0 if none
+        """
+        if not sender_id:
+            return 0
+
+        for priority in xrange(self.locks.top_priority, 0, -1):
+            lock_data = self.locks.get(priority)
+
+            if lock_data is not None and lock_data['sender_id'] == sender_id:
+                return priority
+
+        return 0
+
+    def is_covered(self, sender_id):
+        """
+        Check whether all the LEDs locked by the sender are also locked by
+        someone else with a higher priority.
+
+        Args:
+            sender_id - str unique bus name of the API caller
+
+        Returns:
+            True or False if the sender is preempted on all of its LEDs.
+        """
+        priority = self.get_priority(sender_id)
+        mask = self.locks.get(priority)['led_mask'] if priority else None
+        covering = 0
+
+        for above in xrange(priority + 1, self.locks.top_priority + 1):
+            lock_data = self.locks.get(above)
+
+            if lock_data is None or lock_data['sender_id'] == sender_id:
+                continue
+
+            if not lock_data['led_mask']:
+                return True
+
+            covering |= lock_data['led_mask']
+
+        if not mask:
+            return False
+
+        return mask & covering == mask
+
+    def get_top_owner(self):
+        """
+        Get the top priority lock and the sender holding it.
+
+        Returns:
+            (top_priority, sender_id) - tuple of int and str, (0, '') if unlocked
+        """
+        lock_data = self.locks.get()
+
+        if lock_data is None:
+            return (0, '')
+
+        return (self.locks.top_priority, lock_data['sender_id'])
+
     def get_max_lock_priority(self):
         """
         Get the maximum priority level to lock with.
@@ -131,6 +218,7 @@ class LockableService(object):
                                 ' to unlock the LED Speaker API. Unlocking.'
                                 .format(lock_data['cmd'], lock_data['PID'], priority))
                     self.locks.remove_priority(priority)
+                    self._notify_change()
 
                 except Exception as e:
                     logger.warn('Something unexpected occurred in _locking_thread'
@@ -139,6 +227,18 @@ class LockableService(object):
         # while there are still locks active, keep calling this function indefinitely
         return not self.locks.is_empty()
 
+    def _notify_change(self):
+        """
+        Run the on_change callback, if any, after the locks were modified.
+        """
+        if self.on_change is None:
+            return
+
+        try:
+            self.on_change()
+        except Exception as e:
+            logger.error('LockableService: on_change callback failed - [{}]'.format(e))
+
     def _get_sender_data(self, sender_id):
         """
         Get sender_id, cmd, and PID from the API caller.
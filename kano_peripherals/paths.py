@@ -26,6 +26,10 @@ SERVICE_MANAGER_OBJECT_PATH = join(OBJECT_BASE_PATH, SERVICE_MANAGER_OBJECT_NAME
 DEVICE_DISCOVERY_OBJECT_NAME = 'DeviceDiscovery'
 DEVICE_DISCOVERY_OBJECT_PATH = join(OBJECT_BASE_PATH, DEVICE_DISCOVERY_OBJECT_NAME)
 
+# The LED Ring Service, driving all the LED ring boards as one
+LED_RING_OBJECT_NAME = 'LEDRing'
+LED_RING_OBJECT_PATH = join(OBJECT_BASE_PATH, LED_RING_OBJECT_NAME)
+
 # Kano LED Speaker
 SPEAKER_LEDS_OBJECT_NAME = 'SpeakerLED'
 SPEAKER_LEDS_OBJECT_PATH = join(OBJECT_BASE_PATH, SPEAKER_LEDS_OBJECT_NAME)
@@ -37,3 +41,14 @@ PI_HAT_OBJECT_PATH = join(OBJECT_BASE_PATH, PI_HAT_OBJECT_NAME)
 # CK2 Pro Hat
 CK2_PRO_HAT_OBJECT_NAME = 'CK2ProHat'
 CK2_PRO_HAT_OBJECT_PATH = join(OBJECT_BASE_PATH, CK2_PRO_HAT_OBJECT_NAME)
+
+# Devices found by the last device discovery, probed first at startup
+LAST_DEVICES_CACHE_PATH = '/var/cache/kano-peripherals/last-devices.json'
+
+# Hardware profile of the kit, cached for the current boot
+HARDWARE_PROFILE_PATH = '/run/kano-peripherals/hardware-profile.json'
+
+# Colour calibration profiles of the LED ring boards
+LED_CALIBRATION_DIR = '/etc/kano-peripherals/led-calibration'
+PI_HAT_CALIBRATION_PATH = join(LED_CALIBRATION_DIR, 'pi-hat.json')
+SPEAKER_LEDS_CALIBRATION_PATH = join(LED_CALIBRATION_DIR, 'speaker-leds.json')
@@ -0,0 +1,20 @@
+# probe.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# A long-lived detection context for the Pi Hat used by the device discovery.
+
+
+from kano_pi_hat.kano_hat import KanoHat
+
+from kano_peripherals.hat_probe import HatProbe
+
+
+class PiHatProbe(HatProbe):
+    """
+    Detects the Pi Hat, see HatProbe.
+    """
+
+    def __init__(self):
+        super(PiHatProbe, self).__init__(KanoHat, 'PiHatProbe')
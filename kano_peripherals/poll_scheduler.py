@@ -0,0 +1,267 @@
+# poll_scheduler.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# A scheduler for all the periodic polling routines of the kano-boards-daemon.
+#
+# Every polling site registers its routine here with a minimum and a maximum
+# interval. While nothing happens, the interval doubles after each run up to the
+# maximum. When something relevant happens, e.g. a udev event, a GPIO edge or a
+# user request, a burst is triggered: the routine runs straight away and then a
+# few more times at the minimum interval before backing off again.
+#
+# Event file descriptors, e.g. the hat detection pin interrupts, are also watched
+# here so that several listeners can share one.
+
+
+import os
+import errno
+
+from kano.logging import logger
+
+
+class PollScheduler(object):
+    """
+    Registry of named polling routines run on the GLib main loop.
+
+    The routines follow the GObject convention of returning True to keep being
+    called and False to stop, in which case they are unregistered.
+    """
+
+    BACKOFF_FACTOR = 2
+
+    # The number of runs at the minimum interval after a burst was triggered.
+    BURST_RUNS = 3
+
+    def __init__(self, timeout_add=None, source_remove=None):
+        """
+        Constructor for the PollScheduler.
+
+        Args:
+            timeout_add   - callable as GObject.timeout_add, used by default
+            source_remove - callable as GObject.source_remove, used by default
+        """
+        super(PollScheduler, self).__init__()
+
+        if timeout_add is None or source_remove is None:
+            # Lazy import to avoid issue of importing from this module externally.
+            from gi.repository import GObject
+
+            timeout_add = timeout_add or GObject.timeout_add
+            source_remove = source_remove or GObject.source_remove
+
+        self.timeout_add = timeout_add
+        self.source_remove = source_remove
+
+        self.tasks = dict()
+        self.fd_watches = dict()
+
+    def register(self, name, routine, min_interval, max_interval=None):
+        """
+        Start calling a routine periodically, replacing any with the same name.
+
+        Args:
+            name         - str unique name for the polling site
+            routine      - callable without arguments returning True to keep polling
+            min_interval - int milliseconds between runs after a burst
+            max_interval - int ceiling in milliseconds for the backoff, defaults to
+                           min_interval for a fixed rate
+        """
+        self.unregister(name)
+
+        task = {
+            'routine': routine,
+            'min_interval': min_interval,
+            'max_interval': max(min_interval, max_interval or min_interval),
+            'interval': min_interval,
+            'burst_left': 0,
+            'source_id': None
+        }
+        self.tasks[name] = task
+        self._schedule(name, task, min_interval)
+
+    def unregister(self, name):
+        """
+        Stop calling a routine.
+
+        Args:
+            name - str name the routine was registered with
+        """
+        task = self.tasks.pop(name, None)
+
+        if task is not None and task['source_id'] is not None:
+            self.source_remove(task['source_id'])
+
+    def is_registered(self, name):
+        """
+        Check whether a routine is currently being polled.
+
+        Returns:
+            True or False if the routine is registered.
+        """
+        return name in self.tasks
+
+    def trigger_burst(self, names=None):
+        """
+        Run routines straight away and keep them at their minimum interval for
+        a few runs, e.g. after a hotplug event or a user action.
+
+        Args:
+            names - list of str names of the routines, all of them if None
+        """
+        if names is None:
+            names = self.tasks.keys()
+
+        for name in names:
+            task = self.tasks.get(name)
+            if task is None:
+                continue
+
+            if task['source_id'] is not None:
+                self.source_remove(task['source_id'])
+
+            task['burst_left'] = self.BURST_RUNS
+            task['interval'] = task['min_interval']
+            self._schedule(name, task, 0)
+
+    def get_intervals(self):
+        """
+        Get the current interval of every registered routine.
+
+        Returns:
+            intervals - dict of str names to int milliseconds
+        """
+        return dict(
+            (name, task['interval']) for name, task in self.tasks.iteritems()
+        )
+
+    def add_fd_listener(self, event_fd, callback):
+        """
+        Run a callback whenever a file descriptor becomes readable. The pending
+        data is read and discarded before the listeners are run.
+
+        Args:
+            event_fd - int non-blocking file descriptor, e.g. a pipe
+            callback - callable without arguments
+        """
+        watch = self.fd_watches.get(event_fd)
+
+        if watch is None:
+            # Lazy import to avoid issue of importing from this module externally.
+            from gi.repository import GObject
+
+            self._drain_fd(event_fd)
+            watch = {'listeners': list()}
+            watch['source_id'] = GObject.io_add_watch(
+                event_fd, GObject.IO_IN | GObject.IO_PRI, self._on_fd_event
+            )
+            self.fd_watches[event_fd] = watch
+
+        if callback not in watch['listeners']:
+            watch['listeners'].append(callback)
+
+    def remove_fd_listener(self, event_fd, callback):
+        """
+        Stop running a callback added with add_fd_listener.
+
+        Args:
+            event_fd - int file descriptor the callback was added for
+            callback - callable as given to add_fd_listener
+        """
+        watch = self.fd_watches.get(event_fd)
+        if watch is None or callback not in watch['listeners']:
+            return
+
+        watch['listeners'].remove(callback)
+
+        if not watch['listeners']:
+            self.source_remove(watch['source_id'])
+            del self.fd_watches[event_fd]
+
+    # --- Private Helpers ---------------------------------------------------------------
+
+    def _on_fd_event(self, event_fd, condition):
+        """
+        GObject IO watch callback for the file descriptors of add_fd_listener.
+        """
+        self._drain_fd(event_fd)
+
+        watch = self.fd_watches.get(event_fd)
+        if watch is None:
+            return False
+
+        for callback in list(watch['listeners']):
+            try:
+                callback()
+            except Exception as e:
+                logger.error('PollScheduler: Listener failed - [{}]'.format(e))
+
+        return True
+
+    @staticmethod
+    def _drain_fd(event_fd):
+        """
+        Read all pending bytes from a non-blocking file descriptor.
+        """
+        try:
+            while os.read(event_fd, 64):
+                pass
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                logger.warn('PollScheduler: _drain_fd: {}'.format(e))
+
+    def _schedule(self, name, task, delay):
+        """
+        Schedule the next run of a routine.
+        """
+        task['source_id'] = self.timeout_add(delay, self._run, name, task)
+
+    def _run(self, name, task):
+        """
+        Timeout callback running a routine and scheduling its next run.
+        """
+        task['source_id'] = None
+
+        try:
+            keep_polling = task['routine']()
+        except Exception as e:
+            logger.error('PollScheduler: Routine {} failed - [{}]'.format(name, e))
+            keep_polling = True
+
+        # The routine may have unregistered or replaced itself.
+        if self.tasks.get(name) is not task or task['source_id'] is not None:
+            return False
+
+        if not keep_polling:
+            del self.tasks[name]
+            return False
+
+        if task['burst_left'] > 0:
+            task['burst_left'] -= 1
+            task['interval'] = task['min_interval']
+        else:
+            task['interval'] = min(
+                task['interval'] * self.BACKOFF_FACTOR, task['max_interval']
+            )
+
+        self._schedule(name, task, task['interval'])
+        return False
+
+
+_scheduler = None
+
+
+def get_poll_scheduler():
+    """
+    Get the PollScheduler shared by all the services in the process.
+
+    Returns:
+        scheduler - PollScheduler object
+    """
+    global _scheduler
+
+    if _scheduler is None:
+        _scheduler = PollScheduler()
+
+    return _scheduler
@@ -0,0 +1,207 @@
+# probe_pool.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# A small pool of worker threads to run device probes off the main loop.
+#
+# Probes which share a hardware resource, e.g. the libkano_hat global state, are
+# given the same group and are run one after another on the group's worker.
+# Probes from different groups run concurrently. Results are posted back to the
+# main loop. A probe which raises or does not finish in time is quarantined and
+# is not run again until its backoff expires, doubling each time it fails.
+
+
+import threading
+from Queue import Queue
+
+from kano.logging import logger
+
+from kano_peripherals.clock import monotonic
+
+
+class ProbePool(object):
+    """
+    Runs probe routines on one worker thread for each resource group.
+    """
+
+    # The time a probe is given to return before it is quarantined.
+    PROBE_TIMEOUT = 3  # seconds
+
+    # The range of time a failing probe is not run for.
+    MIN_BACKOFF = 10  # seconds
+    MAX_BACKOFF = 5 * 60  # seconds
+
+    def __init__(self, post=None, clock=monotonic):
+        """
+        Constructor for the ProbePool.
+
+        Args:
+            post  - callable taking a function and its args which runs it on the
+                    main loop, GObject.idle_add by default
+            clock - callable returning the current time in seconds for the
+                    timeouts and backoffs, the monotonic clock by default as the
+                    system time can jump when it is set at boot
+        """
+        super(ProbePool, self).__init__()
+
+        if post is None:
+            # Lazy import to avoid issue of importing from this module externally.
+            from gi.repository import GObject
+
+            post = GObject.idle_add
+
+        self.post = post
+        self.clock = clock
+
+        self.queues = dict()
+        self.in_flight = dict()
+        self.start_times = dict()
+        self.quarantine = dict()
+        self.backoff = dict()
+
+    def submit(self, key, group, routine, callback):
+        """
+        Run a probe on the worker of its group.
+
+        Args:
+            key      - hashable probe identifier
+            group    - hashable resource group, probes of a group never overlap
+            routine  - callable without arguments returning the probe result
+            callback - callable taking the key and the result, run on the main loop.
+                       The result is None when the probe failed or timed out.
+
+        Returns:
+            True or False if the probe was queued, i.e. it is neither running
+            nor quarantined.
+        """
+        if not self.is_available(key):
+            return False
+
+        if group not in self.queues:
+            self._start_worker(group)
+
+        token = object()
+        self.in_flight[key] = (token, callback)
+        self.queues[group].put((key, token, routine, callback))
+
+        return True
+
+    def is_available(self, key):
+        """
+        Check whether a probe can be submitted.
+
+        Returns:
+            True or False if the probe is neither running nor quarantined.
+        """
+        if key in self.in_flight:
+            return False
+
+        return self.clock() >= self.quarantine.get(key, 0)
+
+    def check_timeouts(self):
+        """
+        Quarantine the probes which have been running for longer than PROBE_TIMEOUT.
+        Their results are discarded when they eventually return. Probes still
+        waiting behind a hung one in their group are not timed out.
+
+        Returns:
+            keys - list of the probes which were quarantined
+        """
+        now = self.clock()
+        timed_out = [
+            key for key, (token, callback) in self.in_flight.iteritems()
+            if now - self.start_times.get(token, now) > self.PROBE_TIMEOUT
+        ]
+
+        for key in timed_out:
+            logger.warn('ProbePool: Probe {} timed out'.format(key))
+            callback = self.in_flight[key][1]
+            self._quarantine(key)
+            callback(key, None)
+
+        return timed_out
+
+    def stop(self):
+        """
+        Stop the workers once they are done with their current probe.
+        """
+        for queue in self.queues.itervalues():
+            queue.put(None)
+
+        self.queues.clear()
+        self.in_flight.clear()
+        self.start_times.clear()
+
+    # --- Private Helpers ---------------------------------------------------------------
+
+    def _start_worker(self, group):
+        """
+        Start the worker thread for a resource group.
+        """
+        queue = Queue()
+        worker = threading.Thread(target=self._worker_thread, args=(queue,))
+        worker.daemon = True
+        worker.start()
+
+        self.queues[group] = queue
+
+    def _worker_thread(self, queue):
+        """
+        Run the probes from the queue until the stop sentinel is received.
+        This method is run in a separate thread with threading.
+        """
+        while True:
+            job = queue.get()
+            if job is None:
+                return
+
+            key, token, routine, callback = job
+            self.start_times[token] = self.clock()
+
+            try:
+                result = routine()
+                error = None
+            except Exception as e:
+                result = None
+                error = e
+
+            self.post(self._on_probe_done, key, token, result, error, callback)
+
+    def _on_probe_done(self, key, token, result, error, callback):
+        """
+        Main loop callback for a finished probe, runs only once.
+        """
+        self.start_times.pop(token, None)
+
+        if self.in_flight.get(key, (None, None))[0] is not token:
+            # The probe timed out or the pool was stopped, drop the result.
+            return False
+
+        del self.in_flight[key]
+
+        if error is not None:
+            logger.warn('ProbePool: Probe {} failed - [{}]'.format(key, error))
+            self._quarantine(key)
+            callback(key, None)
+            return False
+
+        self.backoff.pop(key, None)
+        callback(key, result)
+
+        return False
+
+    def _quarantine(self, key):
+        """
+        Stop running a probe for a backoff period, doubling on every failure.
+        """
+        token, callback = self.in_flight.pop(key, (None, None))
+        self.start_times.pop(token, None)
+
+        backoff = min(self.backoff.get(key, self.MIN_BACKOFF / 2.0) * 2, self.MAX_BACKOFF)
+        self.backoff[key] = backoff
+        self.quarantine[key] = self.clock() + backoff
+
+        logger.warn(
+            'ProbePool: Quarantined probe {} for {} seconds'.format(key, backoff)
+        )
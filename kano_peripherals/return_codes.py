@@ -18,6 +18,7 @@ RC_FAILED_LOCKING_API = 21
 RC_FAILED_ANIM_GET_DBUS = 22
 RC_FAILED_CPU_MONIT_FETCH = 23
 RC_FAILED_UNLOCKING_API = 24
+RC_FAILED_LOADING_TIMELINE = 25
 
 RC_KANO_LED_SPEAKER_DETECTED = 51
 RC_KANO_PI_HAT_DETECTED = 52
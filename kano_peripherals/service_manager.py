@@ -6,11 +6,16 @@
 # A DBus service manager responsible for bringing up and taking down other services.
 #
 # The current design specifies that at startup the service will instantiate the
-# ServiceManager to look for peripherals. Once a device was found, device
-# discovery is stopped and the corresponding service for the device is started.
+# ServiceManager to look for peripherals. Once a device was found, the corresponding
+# service for the device is started and device discovery keeps looking for the
+# remaining device types only, e.g. a PiHat or LED Speaker next to a CK2 Pro hat.
 #
-# These are mutually exclusive simply because we do not currently have peripherals
-# that can be connected at the same time as others. This should change when we do.
+# Each device service is started and stopped independently of the others. When a
+# device is unplugged, its service is stopped and discovery probes for it again.
+#
+# LED ring animations, e.g. kano-speakerleds cpu-monitor, register with the manager
+# when they lock a board and are removed once their client leaves the bus. Stopping
+# one is a single call which signals the owning process.
 #
 # Once the quit() method is called the service will ask all running services to clean
 # up and finally quit the daemon main loop, shutting down completely.
@@ -18,20 +23,24 @@
 
 import os
 import dbus
+import functools
+import threading
 import traceback
 import dbus.service
 
 from kano.logging import logger
 
+from kano_peripherals import hardware_profile
 from kano_peripherals.base_dbus_service import BaseDBusService
-from kano_peripherals.speaker_leds.driver.service import SpeakerLEDsService
-from kano_peripherals.pi_hat.driver.service import PiHatService
-from kano_pi_hat.kano_hat_leds import KanoHatLeds
-from kano_peripherals.ck2_pro_hat.driver.service import CK2ProHatService
+from kano_peripherals.animation_registry import AnimationRegistry
+from kano_peripherals.led_calibration import load_calibration
+from kano_peripherals.poll_scheduler import get_poll_scheduler
+from kano_peripherals.service_registry import DEVICE_SERVICES, load_class
 from kano_peripherals.device_discovery_service import DeviceDiscoveryService
+from kano_peripherals.led_ring_service import LEDRingService
 from kano_peripherals.paths import SERVICE_MANAGER_OBJECT_PATH, SERVICE_API_IFACE, \
-    DEVICE_DISCOVERY_OBJECT_PATH, SPEAKER_LEDS_OBJECT_PATH, PI_HAT_OBJECT_PATH, \
-    CK2_PRO_HAT_OBJECT_PATH, BUS_NAME
+    DEVICE_DISCOVERY_OBJECT_PATH, PI_HAT_OBJECT_PATH, PI_HAT_CALIBRATION_PATH, \
+    LED_RING_OBJECT_PATH, CK2_PRO_HAT_OBJECT_PATH, BUS_NAME
 
 
 class ServiceManager(BaseDBusService):
@@ -44,6 +53,9 @@ class ServiceManager(BaseDBusService):
     Does not require sudo.
     """
 
+    # The longest get_hardware_summary waits for the first device discovery pass.
+    HARDWARE_SUMMARY_TIMEOUT = 10 * 1000  # milliseconds
+
     def __init__(self, bus_name, mainloop):
         """
         Constructor for the ServiceManager.
@@ -59,25 +71,44 @@ class ServiceManager(BaseDBusService):
 
         # The KanoHatLeds object cannot be created when the audio module is loaded
         # otherwise the neopixel lib gets mad. The audio module is blacklisted so we
-        # load it after the object creation.
+        # load it after the object creation. It is the only driver imported eagerly.
+        # The colours are corrected with the calibration profile of the board.
         try:
-            self.pi_hat_lib = KanoHatLeds()
+            from kano_pi_hat.kano_hat_leds import KanoHatLeds
+            self.pi_hat_lib = KanoHatLeds(
+                calibration=load_calibration(PI_HAT_CALIBRATION_PATH)
+            )
         except:
             logger.error("ServiceManager: Unexpected error when instantiating"
                          "KanoHatLeds: {}".format(traceback.format_exc()))
         os.system('modprobe -i snd_bcm2835')
 
-        # All services that need to be started and stopped by this daemon.
-        # Add more here as needed.
+        # All services that need to be started and stopped by this daemon. Device
+        # services are given by import path and imported when first started.
+        # Add more in the service_registry as needed.
         self.services = {
             DEVICE_DISCOVERY_OBJECT_PATH: DeviceDiscoveryService,
-            SPEAKER_LEDS_OBJECT_PATH: SpeakerLEDsService,
-            PI_HAT_OBJECT_PATH: PiHatService,
-            CK2_PRO_HAT_OBJECT_PATH: CK2ProHatService
+            LED_RING_OBJECT_PATH: LEDRingService
         }
+        self.services.update(DEVICE_SERVICES)
         self.running_services = dict()
 
-        # Start the DeviceDiscoveryService to look for devices.
+        self.animations = AnimationRegistry()
+
+        # The hardware profile read by the detection wrappers is written again
+        # whenever a device comes or goes. The EDID name is read once, off the
+        # main loop as kano_settings is slow to load.
+        self.edid_name = None
+        hardware_profile.ensure_profile_dir()
+        hardware_profile.invalidate_profile()
+
+        for signal_name in ['device_connected', 'device_disconnected']:
+            self.connection.add_signal_receiver(
+                self._on_hardware_changed, signal_name, SERVICE_API_IFACE, BUS_NAME
+            )
+
+        # Start the DeviceDiscoveryService to look for devices. It keeps running
+        # for as long as the daemon does.
         if not self._start_service(DEVICE_DISCOVERY_OBJECT_PATH):
             return
 
@@ -86,26 +117,30 @@ class ServiceManager(BaseDBusService):
             SERVICE_API_IFACE, BUS_NAME, DEVICE_DISCOVERY_OBJECT_PATH
         )
 
+        # Start the LEDRingService to drive the LED ring boards as one. It writes
+        # to the board services which are running at the time of each call.
+        self._start_service(LED_RING_OBJECT_PATH)
+
+        self._update_hardware_profile()
+        self._read_edid_name()
+
     def _on_device_discovered(self, service_object_path):
         """
         Signal handler for DeviceDiscoveryService's device_discovered signal.
 
-        Stops the DeviceDiscoveryService and brings up the service for the device
-        just found. Mutually exclusive only because we don't have devices that can
-        be plugged simultaneously currently - change as needed.
+        Brings up the service for the device just found. The DeviceDiscoveryService
+        no longer probes for it while its service is running.
         """
-
-        # Stop the DeviceDiscoveryService.
-        if not self._stop_service(DEVICE_DISCOVERY_OBJECT_PATH):
+        if service_object_path in self.running_services:
+            logger.warn(
+                'ServiceManager: _on_device_discovered: {} is already running'
+                .format(service_object_path)
+            )
             return
 
-        self.connection.remove_signal_receiver(
-            self._on_device_discovered, 'device_discovered',
-            SERVICE_API_IFACE, BUS_NAME, DEVICE_DISCOVERY_OBJECT_PATH
-        )
-
         # Start the service for the board that was just detected.
         if not self._start_service(service_object_path):
+            self._get_discovery_service().resume_detection(service_object_path)
             return
 
         self.connection.add_signal_receiver(
@@ -113,11 +148,81 @@ class ServiceManager(BaseDBusService):
             SERVICE_API_IFACE, BUS_NAME, service_object_path
         )
 
+    def _on_hardware_changed(self, service_object_path):
+        """
+        Signal handler for the device_connected and device_disconnected signals of
+        all device services.
+
+        Drops the hardware profile read by the detection wrappers and writes it
+        again once the services of the device were started or stopped.
+        """
+        # Lazy import to avoid issue of importing from this module externally.
+        from gi.repository import GObject
+
+        hardware_profile.invalidate_profile()
+        GObject.idle_add(self._update_hardware_profile)
+
+    def _update_hardware_profile(self):
+        """
+        Write the hardware profile read by the detection wrappers once every device
+        type was probed.
+        This method is run on idle with GObject.
+
+        Returns:
+            False to run only once.
+        """
+        discovery_service = self._get_discovery_service()
+        if discovery_service is None:
+            return False
+
+        def _save():
+            devices = discovery_service.get_discovered_devices()
+            profile = {
+                'pi_hat': PI_HAT_OBJECT_PATH in devices,
+                'power_hat': CK2_PRO_HAT_OBJECT_PATH in devices
+            }
+            if self.edid_name is not None:
+                profile['edid'] = self.edid_name
+
+            hardware_profile.save_profile(profile)
+
+        discovery_service.when_first_pass_done(_save)
+        return False
+
+    def _read_edid_name(self):
+        """
+        Read the EDID name for the hardware profile on a worker thread.
+        """
+        # Lazy import to avoid issue of importing from this module externally.
+        from gi.repository import GObject
+
+        def _on_read(edid_name):
+            self.edid_name = edid_name
+            self._update_hardware_profile()
+            return False
+
+        def _read():
+            try:
+                edid_name = hardware_profile.read_edid_name()
+            except Exception as e:
+                logger.warn(
+                    'ServiceManager: _read_edid_name: Could not read EDID - [{}]'
+                    .format(e)
+                )
+                return
+
+            GObject.idle_add(_on_read, edid_name)
+
+        worker = threading.Thread(target=_read)
+        worker.daemon = True
+        worker.start()
+
     def _on_device_disconnected(self, service_object_path):
         """
-        Signal handler for the device currently plugged device_disconnected signal.
+        Signal handler for a plugged device's device_disconnected signal.
 
-        Stops the service for the device and starts the DeviceDiscoveryService.
+        Stops the service for the device and lets the DeviceDiscoveryService
+        look for it again. Other device services are left untouched.
         """
 
         # Stop the service for the device that was just disconnected.
@@ -129,16 +234,161 @@ class ServiceManager(BaseDBusService):
             SERVICE_API_IFACE, BUS_NAME, service_object_path
         )
 
-        # Start the DeviceDiscoveryService to look for devices again.
-        if not self._start_service(DEVICE_DISCOVERY_OBJECT_PATH):
+        # Look for the device again.
+        discovery_service = self._get_discovery_service()
+        if discovery_service:
+            discovery_service.resume_detection(service_object_path)
+
+    # --- Service Management Methods ----------------------------------------------------
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='', out_signature='as',
+                         async_callbacks=('reply_cb', 'error_cb'))
+    def get_hardware_summary(self, reply_cb, error_cb):
+        """
+        Get all the devices attached, in a single call.
+
+        The reply is delayed until every device type was probed at least once
+        since the daemon started, after which it is authoritative: a device
+        missing from it is not plugged in. The delay is capped by
+        HARDWARE_SUMMARY_TIMEOUT.
+
+        Returns:
+            service_object_paths - list of str object paths of the device services
+        """
+        discovery_service = self._get_discovery_service()
+
+        if discovery_service is None:
+            error_cb(dbus.exceptions.DBusException(
+                'ServiceManager: get_hardware_summary: Device discovery is not running'
+            ))
             return
 
-        self.connection.add_signal_receiver(
-            self._on_device_discovered, 'device_discovered',
-            SERVICE_API_IFACE, BUS_NAME, DEVICE_DISCOVERY_OBJECT_PATH
+        replied = list()
+
+        def _reply():
+            if not replied:
+                replied.append(True)
+                reply_cb(dbus.Array(
+                    discovery_service.get_discovered_devices(), signature='s'
+                ))
+            return False
+
+        discovery_service.when_first_pass_done(_reply)
+
+        if not replied:
+            # Lazy import to avoid issue of importing from this module externally.
+            from gi.repository import GObject
+
+            # Do not wait behind a hung probe, reply with what is known so far.
+            GObject.timeout_add(self.HARDWARE_SUMMARY_TIMEOUT, _reply)
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='', out_signature='a{su}')
+    def get_poll_intervals(self):
+        """
+        Get the current interval of every polling routine in the daemon.
+
+        Returns:
+            intervals - dict of str routine names, usually object paths, to int
+                        milliseconds
+        """
+        return dbus.Dictionary(
+            get_poll_scheduler().get_intervals(), signature='su'
         )
 
-    # --- Service Management Methods ----------------------------------------------------
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='', out_signature='')
+    def rescan(self):
+        """
+        Look for devices and check the plugged ones straight away, e.g. when the
+        user asks for it. All polling routines go back to their fastest rate
+        for a while.
+        """
+        get_poll_scheduler().trigger_burst()
+
+        for service_instance in self.running_services.itervalues():
+            if hasattr(service_instance, 'request_detect'):
+                service_instance.request_detect()
+
+    # --- Animation Management Methods --------------------------------------------------
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='s', out_signature='b',
+                         sender_keyword='sender_id')
+    def register_animation(self, name, sender_id=None):
+        """
+        Register the calling process as running an LED ring animation, replacing
+        any animation it registered before. It is removed when the process
+        leaves the bus.
+
+        Args:
+            name - str name of the animation, e.g. 'cpu-monitor'
+
+        Returns:
+            True or False if the operation was successful.
+        """
+        if not sender_id:
+            return False
+
+        try:
+            dbi = dbus.Interface(
+                self.connection.get_object('org.freedesktop.DBus', '/'),
+                'org.freedesktop.DBus'
+            )
+            pid = int(dbi.GetConnectionUnixProcessID(sender_id))
+
+            watch = self.connection.watch_name_owner(
+                sender_id, functools.partial(self._on_animation_owner_changed, sender_id)
+            )
+        except dbus.exceptions.DBusException as e:
+            logger.error(
+                'ServiceManager: register_animation: Could not register {} for {}'
+                ' - [{}]'.format(name, sender_id, e)
+            )
+            return False
+
+        self.animations.register(sender_id, str(name), pid, watch)
+        return True
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='', out_signature='b',
+                         sender_keyword='sender_id')
+    def unregister_animation(self, sender_id=None):
+        """
+        Remove the animation registered by the calling process.
+
+        Returns:
+            True or False if the process had registered an animation.
+        """
+        return self.animations.unregister(sender_id)
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='s', out_signature='u')
+    def stop_animation(self, name):
+        """
+        Stop running animations by sending SIGINT to their processes.
+
+        Args:
+            name - str name of the animation, or empty str to stop all of them
+
+        Returns:
+            count - int number of animations signalled
+        """
+        return self.animations.stop(name)
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='', out_signature='a(su)')
+    def get_animations(self):
+        """
+        Get the animations currently registered.
+
+        Returns:
+            animations - list of (str name, int pid) structs
+        """
+        return dbus.Array(self.animations.get_animations(), signature='(su)')
+
+    def _on_animation_owner_changed(self, sender_id, new_owner):
+        """
+        Callback for watch_name_owner on the client of a registered animation.
+        """
+        if not new_owner:
+            self.animations.unregister(sender_id)
+
+    # --- Daemon Life Cycle Methods -----------------------------------------------------
 
     @dbus.service.method(SERVICE_API_IFACE, out_signature='')
     def quit(self):
@@ -159,8 +409,23 @@ class ServiceManager(BaseDBusService):
         GObject.idle_add(self.mainloop.quit)
         self.stop()
 
+    def clean_up(self):
+        """
+        Stop watching the clients of the registered animations.
+        """
+        self.animations.clear()
+
     # --- Private Helpers ---------------------------------------------------------------
 
+    def _get_discovery_service(self):
+        """
+        Getter for the running DeviceDiscoveryService instance.
+
+        Returns:
+            service_instance - DeviceDiscoveryService or None if it is not running
+        """
+        return self.running_services.get(DEVICE_DISCOVERY_OBJECT_PATH)
+
     def _start_service(self, service_object_path):
         """
         Helper to start a D-Bus service based on its object_path.
@@ -178,10 +443,17 @@ class ServiceManager(BaseDBusService):
 
         try:
             Service = self.services[service_object_path]
+            if isinstance(Service, basestring):
+                Service = load_class(Service)
+                self.services[service_object_path] = Service
+
             # Pass the KanoHatLeds object to the PiHatService since reinstantiating the
             # object clashes with the audio module.
             if service_object_path == PI_HAT_OBJECT_PATH:
                 service_instance = Service(self.bus_name, self.pi_hat_lib)
+            # The LEDRingService forwards calls to the board services running.
+            elif service_object_path == LED_RING_OBJECT_PATH:
+                service_instance = Service(self.bus_name, self.running_services)
             else:
                 service_instance = Service(self.bus_name)
             self.running_services[service_object_path] = service_instance
@@ -0,0 +1,75 @@
+# service_registry.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# The registry of all device services and their probe contexts.
+#
+# Entries are declared by object path and import path only. The driver modules,
+# which pull in smbus, ctypes and libkano_hat, neopixel, multiprocessing, etc, are
+# imported the first time a board is probed or its service is started. Add more
+# devices here as needed.
+
+
+import importlib
+
+from kano_peripherals.paths import PI_HAT_OBJECT_PATH, CK2_PRO_HAT_OBJECT_PATH, \
+    SPEAKER_LEDS_OBJECT_PATH
+
+
+# Device services started by the ServiceManager, by object path.
+DEVICE_SERVICES = {
+    PI_HAT_OBJECT_PATH: 'kano_peripherals.pi_hat.driver.service.PiHatService',
+    CK2_PRO_HAT_OBJECT_PATH: 'kano_peripherals.ck2_pro_hat.driver.service.CK2ProHatService',
+    SPEAKER_LEDS_OBJECT_PATH: 'kano_peripherals.speaker_leds.driver.service.SpeakerLEDsService'
+}
+
+# Probe contexts used by the DeviceDiscoveryService, by object path.
+DEVICE_PROBES = {
+    PI_HAT_OBJECT_PATH: 'kano_peripherals.pi_hat.driver.probe.PiHatProbe',
+    CK2_PRO_HAT_OBJECT_PATH: 'kano_peripherals.ck2_pro_hat.driver.probe.CK2ProHatProbe',
+    SPEAKER_LEDS_OBJECT_PATH: 'kano_peripherals.speaker_leds.driver.probe.SpeakerLEDsProbe'
+}
+
+
+def load_class(import_path):
+    """Import a class from its full import path.
+
+    Args:
+        import_path (str): Path to the class, e.g. ``package.module.Class``
+
+    Returns:
+        type: The class object
+    """
+    module_name, class_name = import_path.rsplit('.', 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def get_service_class(service_object_path):
+    """Get the device service class for an object path, importing its module.
+
+    Args:
+        service_object_path (str): Object path of the device service
+
+    Returns:
+        type: The BaseDeviceService subclass, None if the path is not registered
+    """
+    if service_object_path not in DEVICE_SERVICES:
+        return None
+
+    return load_class(DEVICE_SERVICES[service_object_path])
+
+
+def get_probe_class(service_object_path):
+    """Get the probe context class for an object path, importing its module.
+
+    Args:
+        service_object_path (str): Object path of the device service
+
+    Returns:
+        type: The probe context class, None if the path is not registered
+    """
+    if service_object_path not in DEVICE_PROBES:
+        return None
+
+    return load_class(DEVICE_PROBES[service_object_path])
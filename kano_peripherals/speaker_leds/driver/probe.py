@@ -0,0 +1,35 @@
+# probe.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# A long-lived detection context for the LED Speaker used by the device discovery.
+
+
+from kano_peripherals.speaker_leds.speaker_led import SpeakerLed
+
+
+class SpeakerLEDsProbe(object):
+    """
+    Detects the LED Speaker with the I2C bus opened only once.
+
+    Unlike SpeakerLEDsService.quick_detect, the bus is not reopened on every call,
+    a probe only does the quick writes to the chip addresses.
+    """
+
+    def __init__(self):
+        super(SpeakerLEDsProbe, self).__init__()
+
+        self.speaker_led = SpeakerLed()
+
+    def probe(self):
+        """
+        Check whether the LED Speaker is plugged in.
+
+        Returns:
+            connected - bool whether or not the device is plugged in
+        """
+        if not self.speaker_led.initialise():
+            return False
+
+        return self.speaker_led.is_connected(with_setup=False)
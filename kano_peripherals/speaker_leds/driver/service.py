@@ -11,17 +11,26 @@
 # The locking mechanism is a binary semaphore with priority levels and REQUIRES one to
 # unlock() it afterwards.
 # However, there is a safety mechanism in place in case that fails.
+#
+# Each priority level owns a framebuffer layer in the LEDCompositor. Frames from
+# lower priority clients are kept in their layer and shown again as soon as the
+# higher priority lock is released.
 
 
 import dbus
+import functools
 import dbus.service
 
 from kano.logging import logger
 
 from kano_peripherals.base_device_service import BaseDeviceService
 from kano_peripherals.lockable_service import LockableService
+from kano_peripherals.led_compositor import LEDCompositor
+from kano_peripherals.led_frame import Frame
 from kano_peripherals.speaker_leds.speaker_led import SpeakerLed
-from kano_peripherals.paths import SPEAKER_LEDS_OBJECT_PATH, SERVICE_API_IFACE
+from kano_peripherals import led_calibration
+from kano_peripherals.paths import SPEAKER_LEDS_OBJECT_PATH, SERVICE_API_IFACE, \
+    SPEAKER_LEDS_CALIBRATION_PATH
 
 
 class SpeakerLEDsService(BaseDeviceService):
@@ -37,7 +46,12 @@ class SpeakerLEDsService(BaseDeviceService):
     # The number of LEDs on the PiHat ring. This value has a getter.
     NUM_LEDS = SpeakerLed.NUM_LEDS
 
-    # The poll rate for checking if the board is still plugged in.
+    # The number of output levels of each colour channel, 12 bit PWM. This value
+    # has a getter.
+    RESOLUTION = 4096
+
+    # The poll rate for checking if the board is still plugged in. The I2C bus has
+    # no presence events, a failed write triggers an immediate check in between.
     DETECT_THREAD_POLL_RATE = 5 * 1000  # milliseconds
 
     # The top priority level for an API lock. This value has a getter.
@@ -57,22 +71,44 @@ class SpeakerLEDsService(BaseDeviceService):
         """
         super(SpeakerLEDsService, self).__init__(bus_name, SPEAKER_LEDS_OBJECT_PATH)
 
-        # The high level 'library' object controlling the hardware.
-        self.speaker_led = SpeakerLed()
+        # The high level 'library' object controlling the hardware, correcting the
+        # colours with the calibration profile of the board.
+        self.speaker_led = SpeakerLed(
+            calibration=led_calibration.load_calibration(
+                SPEAKER_LEDS_CALIBRATION_PATH
+            )
+        )
         self.speaker_led.initialise()
 
         # Locking with priority levels for exclusive access.
-        self.lockable_service = LockableService(max_priority=self.MAX_PRIORITY_LEVEL)
-
-        # Lazy import to avoid issue of importing from this module externally.
-        from gi.repository import GObject
+        self.lockable_service = LockableService(
+            max_priority=self.MAX_PRIORITY_LEVEL,
+            on_change=self._on_lock_change
+        )
 
-        # Start the detection polling routine.
-        GObject.threads_init()
-        self.detect_thread_id = GObject.timeout_add(
-            self.DETECT_THREAD_POLL_RATE, self._detect_thread
+        # Framebuffer layers for each lock priority level.
+        self.compositor = LEDCompositor(
+            self.NUM_LEDS, self._write_levels, max_priority=self.MAX_PRIORITY_LEVEL,
+            on_commit_failed=self.request_detect
         )
 
+        # Timelines played in the daemon, by the unique bus name of their client,
+        # and the ones being loaded with a token to tell a cancelled load apart.
+        self.timeline_players = dict()
+        self.timeline_loads = dict()
+
+        # The frame being written and its register image, reused for every frame.
+        self.frame = Frame(self.NUM_LEDS)
+        self.output_image = bytearray(self.NUM_LEDS * SpeakerLed.REGISTERS_PER_LED)
+
+        # The register settings last written for each LED, None if unknown, to
+        # only write the LEDs which change. The counters have a getter.
+        self.last_output = [None] * self.NUM_LEDS
+        self.frame_counters = {'commits': 0, 'writes': 0, 'skipped_writes': 0}
+
+        # Start the detection routines.
+        self.start_detect_watch(poll_rate=self.DETECT_THREAD_POLL_RATE)
+
         # The first time we detect the device we must turn off the LEDs, because they
         # have been manufactured (not designed!) with the LEDs ON by default...
         self.speaker_led._setup()
@@ -85,10 +121,11 @@ class SpeakerLEDsService(BaseDeviceService):
         Stop all running (sub)processes and clean up before process termination.
         """
 
-        # Lazy import to avoid issue of importing from this module externally.
-        from gi.repository import GObject
-
-        GObject.source_remove(self.detect_thread_id)
+        self.stop_detect_watch()
+        self.timeline_loads.clear()
+        for sender_id in self.timeline_players.keys():
+            self._end_timeline(sender_id)
+        self.compositor.cancel_commit()
 
         if not self.set_leds_off():
             logger.error('SpeakerLEDsService: stop: Could not turn off leds!')
@@ -131,21 +168,6 @@ class SpeakerLEDsService(BaseDeviceService):
         """
         return self.speaker_led.is_connected()
 
-    def _detect_thread(self):
-        """
-        Poll the detection for LED Speaker to know when it is unplugged.
-
-        When the LED Speaker is unplugged, the 'device_disconnected' DBus signal is
-        emitted. This method is run in a separate thread with GObject.
-        """
-        detected = self.detect()
-
-        if not detected:
-            self.device_disconnected(self.get_object_path())
-
-        # Keep calling this method indefinitely.
-        return True
-
     # --- API Locking -------------------------------------------------------------------
 
     @dbus.service.method(SERVICE_API_IFACE, in_signature='i', out_signature='s',
@@ -172,6 +194,37 @@ class SpeakerLEDsService(BaseDeviceService):
         """
         return self.lockable_service.lock(priority, sender_id)
 
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='iu', out_signature='s',
+                         sender_keyword='sender_id')
+    def lock_region(self, priority, led_mask, sender_id=None):
+        """
+        Block all other API calls with a lower priority on some of the LEDs.
+
+        Works as lock() but only the LEDs set in the mask are taken from lower
+        priority clients. Frames from clients holding non-overlapping regions are
+        merged and committed together.
+
+        Args:
+            priority - number representing the priority level (default is 1 to 10).
+            led_mask - unsigned int bitmask where bit i is LED i, 0 for all LEDs
+
+        Returns:
+            token - str with an API token for identification or empty str if unsuccessful
+        """
+        return self.lockable_service.lock(priority, sender_id, led_mask=led_mask)
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='', out_signature='b',
+                         sender_keyword='sender_id')
+    def is_preempted(self, sender_id=None):
+        """
+        Check whether all the LEDs locked by the caller are locked by someone
+        else with a higher priority, i.e. nothing it draws would be shown.
+
+        Returns:
+            True or False if the caller is preempted.
+        """
+        return self.lockable_service.is_covered(sender_id)
+
     @dbus.service.method(SERVICE_API_IFACE, in_signature='', out_signature='b',
                          sender_keyword='sender_id')
     def unlock(self, sender_id=None):
@@ -213,6 +266,54 @@ class SpeakerLEDsService(BaseDeviceService):
         """
         return self.lockable_service.get_max_lock_priority()
 
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='d', out_signature='b',
+                         sender_keyword='sender_id')
+    def set_layer_alpha(self, alpha, sender_id=None):
+        """
+        Set the opacity of the framebuffer layer owned by the calling sender.
+
+        A layer which is not fully opaque is blended over the layers below it,
+        i.e. over the frames of clients with a lower lock priority.
+
+        Args:
+            alpha - float opacity between 0.0 (transparent) and 1.0 (opaque)
+
+        Returns:
+            True or False if the sender holds a lock and the operation was successful.
+        """
+        priority = self.lockable_service.get_priority(sender_id)
+        if not priority:
+            return False
+
+        self.compositor.set_alpha(priority, alpha)
+        self.compositor.schedule_commit()
+        return True
+
+    def _on_lock_change(self):
+        """
+        Drop the framebuffer layers of released locks, show what lies below and
+        let the clients know who holds the LEDs now.
+        """
+        self.compositor.sync_locks(self.lockable_service.get_lock())
+        self._stop_unlocked_timelines()
+
+        top_priority, owner = self.lockable_service.get_top_owner()
+        self.lock_changed(top_priority, owner)
+
+    @dbus.service.signal(SERVICE_API_IFACE, signature='is')
+    def lock_changed(self, top_priority, owner):
+        """
+        DBus signal to be emitted when an API lock was added or removed.
+
+        Clients holding a lower priority lock are preempted and may stop rendering
+        until the next signal.
+
+        Args:
+            top_priority - int priority of the top lock, 0 when the API is unlocked
+            owner        - str unique bus name of the top lock holder, empty if none
+        """
+        pass
+
     # --- LED Programming with Locked API -----------------------------------------------
 
     @dbus.service.method(SERVICE_API_IFACE, in_signature='s', out_signature='b',
@@ -229,12 +330,7 @@ class SpeakerLEDsService(BaseDeviceService):
         Returns:
             True or False if the operation was successful.
         """
-        if sender_id and \
-           self.lockable_service.get_lock().get() and \
-           self.lockable_service.get_lock().get()['sender_id'] != token:
-            return False
-
-        return self.set_leds_off(sender_id=token)
+        return self.set_leds_off(sender_id=token or sender_id)
 
     @dbus.service.method(SERVICE_API_IFACE, in_signature='a(ddd)s', out_signature='b',
                          sender_keyword='sender_id')
@@ -251,12 +347,7 @@ class SpeakerLEDsService(BaseDeviceService):
         Returns:
             True or False if the operation was successful.
         """
-        if sender_id and \
-           self.lockable_service.get_lock().get() and \
-           self.lockable_service.get_lock().get()['sender_id'] != token:
-            return False
-
-        return self.set_all_leds(values, sender_id=token)
+        return self.set_all_leds(values, sender_id=token or sender_id)
 
     @dbus.service.method(SERVICE_API_IFACE, in_signature='i(ddd)s', out_signature='b',
                          sender_keyword='sender_id')
@@ -273,12 +364,7 @@ class SpeakerLEDsService(BaseDeviceService):
         Returns:
             True or False if the operation was successful.
         """
-        if sender_id and \
-           self.lockable_service.get_lock().get() and \
-           self.lockable_service.get_lock().get()['sender_id'] != token:
-            return False
-
-        return self.set_led(num, rgb, sender_id=token)
+        return self.set_led(num, rgb, sender_id=token or sender_id)
 
     # --- LED Programming API -----------------------------------------------------------
 
@@ -292,12 +378,7 @@ class SpeakerLEDsService(BaseDeviceService):
         Returns:
             True or False if the operation was successful.
         """
-        if sender_id and \
-           self.lockable_service.get_lock().get() and \
-           self.lockable_service.get_lock().get()['sender_id'] != sender_id:
-            return False
-
-        return self.set_all_leds([(0, 0, 0)] * self.NUM_LEDS)
+        return self.set_all_leds([(0, 0, 0)] * self.NUM_LEDS, sender_id=sender_id)
 
     @dbus.service.method(SERVICE_API_IFACE, in_signature='a(ddd)', out_signature='b',
                          sender_keyword='sender_id')
@@ -306,24 +387,54 @@ class SpeakerLEDsService(BaseDeviceService):
         Set all LED values.
         This method can be locked by other processes.
 
+        The values are written into the framebuffer layer of the priority locked
+        by the sender, or layer 0 if it holds no lock, and are kept there while
+        a higher priority lock covers them.
+
         Args:
             values - list of (r,g,b) tuples where r,g,b are between 0.0 and 1.0
 
         Returns:
-            True or False if the operation was successful.
+            True or False if the operation was successful. With a sender, the
+            values are only written into its layer and shown by the next commit,
+            once the main loop is idle. The result then tells whether they are
+            visible and the previous commit succeeded, a failed commit triggers
+            a detection check.
         """
-        if self.lockable_service.get_lock().get() and sender_id and \
-           self.lockable_service.get_lock().get()['sender_id'] != sender_id:
-                return False
+        if not sender_id:
+            return self._write_frame(values)
 
-        # TODO: there is potential for more efficiency because we
-        # can transfer 32 bytes at a time over the i2c bus
-        for idx, val in enumerate(values[:self.NUM_LEDS]):
-            successful = self.set_led(idx, val)
-            if not successful:
-                return False
+        priority = self.lockable_service.get_priority(sender_id)
+        self.compositor.set_frame(priority, values)
 
-        return True
+        return self.compositor.schedule_commit(priority)
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='ay', out_signature='b',
+                         sender_keyword='sender_id', byte_arrays=True)
+    def set_all_leds_packed(self, data, sender_id=None):
+        """
+        Set all LED values from a packed frame, as set_all_leds. The values are
+        sent as a plain byte array, which is far cheaper to marshal than a(ddd).
+
+        Args:
+            data - bytes of a frame in its packed form, see led_frame.Frame
+
+        Returns:
+            True or False as for set_all_leds.
+        """
+        try:
+            frame = Frame.from_bytes(data, num_leds=self.NUM_LEDS)
+        except ValueError as e:
+            logger.warn('SpeakerLEDsService: set_all_leds_packed: {}'.format(e))
+            return False
+
+        if not sender_id:
+            return self._write_levels(frame.levels)
+
+        priority = self.lockable_service.get_priority(sender_id)
+        self.compositor.set_frame(priority, frame)
+
+        return self.compositor.schedule_commit(priority)
 
     @dbus.service.method(SERVICE_API_IFACE, in_signature='i(ddd)', out_signature='b',
                          sender_keyword='sender_id')
@@ -337,13 +448,26 @@ class SpeakerLEDsService(BaseDeviceService):
             rgb     - tuple of int red, green, blue intensity from 0.0 to 1.0
 
         Returns:
-            True or False if the operation was successful.
-        """
-        if self.lockable_service.get_lock().get() and sender_id and \
-           self.lockable_service.get_lock().get()['sender_id'] != sender_id:
+            True or False as for set_all_leds.
+        """
+        if not sender_id:
+            if led_idx < 0 or led_idx >= self.NUM_LEDS:
+                logger.warn(
+                    'SpeakerLEDsService: set_led: LED index {} out of range'
+                    .format(led_idx)
+                )
                 return False
 
-        return self.speaker_led.set_led(led_idx, rgb)
+            successful = self.speaker_led.set_led(led_idx, rgb)
+            self.last_output[led_idx] = None
+            if not successful:
+                self.request_detect()
+            return successful
+
+        priority = self.lockable_service.get_priority(sender_id)
+        self.compositor.set_led(priority, led_idx, rgb)
+
+        return self.compositor.schedule_commit(priority)
 
     @dbus.service.method(SERVICE_API_IFACE, in_signature='', out_signature='i')
     def get_num_leds(self):
@@ -354,3 +478,300 @@ class SpeakerLEDsService(BaseDeviceService):
             NUM_LEDS - integer number of LEDs
         """
         return self.NUM_LEDS
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='', out_signature='i')
+    def get_resolution(self):
+        """
+        Get the number of output levels of each colour channel. Clients may
+        quantise their frames to it and not send those which do not change.
+
+        Returns:
+            RESOLUTION - integer number of levels
+        """
+        return self.RESOLUTION
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='', out_signature='a{su}')
+    def get_frame_counters(self):
+        """
+        Get how many frames were committed and how many LED writes were made or
+        skipped because they would not have changed the output.
+
+        Returns:
+            counters - dict with the keys `commits`, `writes` and `skipped_writes`
+        """
+        return dbus.Dictionary(self.frame_counters, signature='su')
+
+    def _write_frame(self, values):
+        """
+        Write a frame of LED values to the hardware. Only the LEDs whose register
+        settings change are written.
+
+        Args:
+            values - list of (r,g,b) tuples where r,g,b are between 0.0 and 1.0
+
+        Returns:
+            True or False if the operation was successful.
+        """
+        self.frame.set_values(values)
+        return self._write_levels(self.frame.levels, len(values))
+
+    def _write_levels(self, levels, num_leds=NUM_LEDS):
+        """
+        Write LED values given as Frame levels to the hardware. Only the LEDs whose
+        register settings change are written.
+
+        Args:
+            levels   - array('H') of the levels of a Frame
+            num_leds - int number of LEDs to write, from the first one
+
+        Returns:
+            True or False if the operation was successful.
+        """
+        self.frame_counters['commits'] += 1
+
+        image = self.speaker_led.quantise_levels(levels, self.output_image)
+        size = SpeakerLed.REGISTERS_PER_LED
+
+        # TODO: there is potential for more efficiency because we
+        # can transfer 32 bytes at a time over the i2c bus
+        for idx in xrange(min(num_leds, self.NUM_LEDS)):
+            output = image[idx * size:(idx + 1) * size]
+            if output == self.last_output[idx]:
+                self.frame_counters['skipped_writes'] += 1
+                continue
+
+            self.frame_counters['writes'] += 1
+            successful = self.speaker_led.set_led_registers(idx, output)
+            if not successful:
+                # The board may have been unplugged, check straight away.
+                self.last_output[idx] = None
+                self.request_detect()
+                return False
+
+            self.last_output[idx] = output
+
+        return True
+
+    # --- Colour Calibration ------------------------------------------------------------
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='', out_signature='(ddd)')
+    def get_calibration(self):
+        """
+        Get the colour calibration applied to the LED values sent by clients.
+
+        Returns:
+            factors - tuple of float red, green and blue correction factors
+        """
+        return led_calibration.get_factors(self.speaker_led.calibration)
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='ddd', out_signature='b',
+                         sender_keyword='sender_id')
+    def set_calibration(self, red, green, blue, sender_id=None):
+        """
+        Change the colour calibration until the daemon restarts or save_calibration
+        is called, e.g. to preview it. Only the holder of the top lock may do so.
+
+        Args:
+            red   - float correction factor from 0.0 to 1.0 for the red channel
+            green - float correction factor from 0.0 to 1.0 for the green channel
+            blue  - float correction factor from 0.0 to 1.0 for the blue channel
+
+        Returns:
+            True or False if the operation was successful.
+        """
+        if not sender_id or self.lockable_service.get_top_owner()[1] != sender_id:
+            return False
+
+        calibration = dict(self.speaker_led.calibration)
+        for channel, factor in zip(led_calibration.CHANNELS, [red, green, blue]):
+            calibration[channel] = min(max(float(factor), 0.0), 1.0)
+
+        self.speaker_led.set_calibration(calibration)
+        self.compositor.schedule_commit()
+
+        return True
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='', out_signature='b',
+                         sender_keyword='sender_id')
+    def save_calibration(self, sender_id=None):
+        """
+        Save the current colour calibration as the profile of the board.
+        Only the holder of the top lock may do so.
+
+        Returns:
+            True or False if the operation was successful.
+        """
+        if not sender_id or self.lockable_service.get_top_owner()[1] != sender_id:
+            return False
+
+        return led_calibration.save_calibration(
+            SPEAKER_LEDS_CALIBRATION_PATH, self.speaker_led.calibration
+        )
+
+    # --- Timeline Playback -------------------------------------------------------------
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='s', out_signature='b',
+                         sender_keyword='sender_id', async_callbacks=('reply_cb', 'error_cb'))
+    def play_timeline(self, path, reply_cb, error_cb, sender_id=None):
+        """
+        Play an LED timeline file in the daemon rather than streaming its frames.
+
+        The frames are drawn into the framebuffer layer of the lock held by the
+        sender, as set_all_leds would, until the timeline is done, stop_timeline
+        is called or the lock is released. Any timeline the sender was already
+        playing is replaced.
+
+        The file is loaded on a worker thread and the reply is sent once it is
+        playing. It must be a regular file, see load_timeline.
+
+        Args:
+            path - str absolute path to a timeline file, see
+                   kano_peripherals.wrappers.led_ring.timeline
+
+        Returns:
+            True or False if the sender holds a lock and the timeline is playing.
+            False while a timeline of the sender is still being loaded.
+        """
+        if not self.lockable_service.get_priority(sender_id) or \
+                sender_id in self.timeline_loads:
+            reply_cb(False)
+            return
+
+        self.stop_timeline(sender_id=sender_id)
+
+        # Lazy import to avoid loading numpy until a timeline is played.
+        from kano_peripherals.timeline_player import load_timeline_async
+
+        token = object()
+        self.timeline_loads[sender_id] = token
+
+        load_timeline_async(
+            path, self.NUM_LEDS,
+            functools.partial(self._on_timeline_loaded, sender_id, token, path, reply_cb)
+        )
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='', out_signature='b',
+                         sender_keyword='sender_id')
+    def stop_timeline(self, sender_id=None):
+        """
+        Stop the timeline played for the calling sender, its last frame is left
+        in the sender's layer.
+
+        Returns:
+            True or False if a timeline was playing.
+        """
+        self.timeline_loads.pop(sender_id, None)
+
+        player = self.timeline_players.pop(sender_id, None)
+        if player is None:
+            return False
+
+        player.stop()
+        return True
+
+    @dbus.service.method(SERVICE_API_IFACE, in_signature='', out_signature='d',
+                         sender_keyword='sender_id')
+    def get_timeline_fps(self, sender_id=None):
+        """
+        Get the frame rate the timeline of the calling sender is played at. It
+        is lowered from the rate of the timeline while the system is busy.
+
+        Returns:
+            fps - float frames per second, 0.0 if no timeline is playing
+        """
+        player = self.timeline_players.get(sender_id)
+        if player is None:
+            return 0.0
+
+        return player.get_effective_fps()
+
+    @dbus.service.signal(SERVICE_API_IFACE, signature='s')
+    def timeline_finished(self, owner):
+        """
+        DBus signal to be emitted when a timeline stops without its client asking,
+        i.e. its last loop was played, the lock was released or the board was
+        unplugged.
+
+        Args:
+            owner - str unique bus name of the client which played the timeline
+        """
+        pass
+
+    def _on_timeline_loaded(self, sender_id, token, path, reply_cb, timeline, error):
+        """
+        Callback for load_timeline_async, play the timeline unless the load was
+        cancelled or the sender no longer holds a lock.
+        """
+        if self.timeline_loads.get(sender_id) is not token:
+            reply_cb(False)
+            return
+
+        del self.timeline_loads[sender_id]
+
+        if timeline is None:
+            logger.error(
+                'SpeakerLEDsService: play_timeline: Could not load {} - [{}]'.format(path, error)
+            )
+            reply_cb(False)
+            return
+
+        if not self.lockable_service.get_priority(sender_id):
+            reply_cb(False)
+            return
+
+        # Lazy import to avoid loading numpy until a timeline is played.
+        from kano_peripherals.timeline_player import TimelinePlayer
+        from kano_peripherals.wrappers.led_ring.frame_rate_governor import \
+            FrameRateGovernor
+
+        player = TimelinePlayer(
+            timeline,
+            functools.partial(self._draw_timeline_frame, sender_id),
+            on_done=functools.partial(self._on_timeline_done, sender_id),
+            governor=FrameRateGovernor()
+        )
+        self.timeline_players[sender_id] = player
+        player.start()
+
+        reply_cb(True)
+
+    def _draw_timeline_frame(self, sender_id, values):
+        """
+        Draw a frame of a timeline into the layer of the sender's lock.
+
+        Returns:
+            True or False if the sender still holds a lock.
+        """
+        priority = self.lockable_service.get_priority(sender_id)
+        if not priority:
+            self._end_timeline(sender_id)
+            return False
+
+        self.compositor.set_frame(priority, values)
+        self.compositor.schedule_commit(priority)
+        return True
+
+    def _on_timeline_done(self, sender_id):
+        """
+        Callback for a TimelinePlayer which played its last loop.
+        """
+        self._end_timeline(sender_id)
+
+    def _end_timeline(self, sender_id):
+        """
+        Stop the timeline played for a sender, if any, and let the sender know.
+        """
+        player = self.timeline_players.pop(sender_id, None)
+        if player is None:
+            return
+
+        player.stop()
+        self.timeline_finished(sender_id)
+
+    def _stop_unlocked_timelines(self):
+        """
+        Stop the timelines of senders which no longer hold a lock.
+        """
+        for sender_id in self.timeline_players.keys():
+            if not self.lockable_service.get_priority(sender_id):
+                self._end_timeline(sender_id)
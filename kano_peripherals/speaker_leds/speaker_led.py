@@ -14,6 +14,9 @@ from smbus import SMBus
 from kano.logging import logger
 
 from kano_peripherals.speaker_leds.driver.pwm_driver import PWM
+from kano_peripherals.led_calibration import DEFAULT_CALIBRATION, get_factors, \
+    calibrate
+from kano_peripherals.led_frame import to_lut_index
 
 
 class SpeakerLed(object):
@@ -30,14 +33,27 @@ class SpeakerLed(object):
     NUM_LEDS = 10
     LEDS_PER_CHIP = 5
     COLOURS_PER_LED = 3
+    REGISTERS_PER_LED = COLOURS_PER_LED * 4  # 4 registers per PWM
     SPEAKER_LED_GAMMA = 0.5
 
-    def __init__(self):
+    # The number of entries of the per-channel lookup tables from intensity values
+    # to PWM register settings.
+    LUT_SIZE = 1024
+
+    def __init__(self, calibration=None):
         """
         Constructor for the SpeakerLed.
+
+        Args:
+            calibration - dict colour calibration profile, see led_calibration
         """
         super(SpeakerLed, self).__init__()
 
+        # The calibration folded into the lookup tables, built on first use.
+        self.calibration = dict(DEFAULT_CALIBRATION)
+        self.luts = None
+        self.set_calibration(calibration)
+
         # Initialisation flags.
         self.is_initialised = False
         self.is_setup = False
@@ -151,19 +167,31 @@ class SpeakerLed(object):
         Returns:
             successful - bool whether or not the operation was successful
         """
-        addr = self.CHIP0_ADDR + (led_idx / self.LEDS_PER_CHIP)
-        led_idx = led_idx % self.LEDS_PER_CHIP
+        dat = []
+        for registers in self.quantise(rgb):
+            dat.extend(registers)
 
-        base = led_idx * self.COLOURS_PER_LED * 4  # 4 registers per PWM
+        return self.set_led_registers(led_idx, dat)
 
-        dat = []
-        for idx, val in enumerate(rgb):
-            dat.extend(self._convert_val_to_pwm(val, 0))
+    def set_led_registers(self, led_idx, registers):
+        """
+        Write the PWM register settings of an LED, e.g. a slice of the register
+        image given by quantise_levels.
 
-        reg = self.LED_REG_BASE + base
+        Args:
+            led_idx   - int led index from 0 to NUM_LEDS - 1
+            registers - sequence of REGISTERS_PER_LED int register values
+
+        Returns:
+            successful - bool whether or not the operation was successful
+        """
+        addr = self.CHIP0_ADDR + (led_idx / self.LEDS_PER_CHIP)
+        led_idx = led_idx % self.LEDS_PER_CHIP
+
+        reg = self.LED_REG_BASE + led_idx * self.REGISTERS_PER_LED
 
         try:
-            self.i2cbus.write_i2c_block_data(addr, reg, dat)
+            self.i2cbus.write_i2c_block_data(addr, reg, list(registers))
         except IOError:
             # Occurs when an animation is running and the user unplugs the Speaker LED.
             return False
@@ -179,8 +207,89 @@ class SpeakerLed(object):
 
         return True
 
+    def quantise(self, rgb):
+        """
+        Get the PWM register settings written by set_led for an LED value. Values
+        giving the same settings look the same.
+
+        Args:
+            rgb - tuple of int red, green, blue intensity from 0.0 to 1.0
+
+        Returns:
+            registers - tuple of the red, green and blue (on_l, on_h, off_l, off_h)
+                        register settings
+        """
+        if self.luts is None:
+            self.luts = self._build_luts()
+
+        last = self.LUT_SIZE - 1
+
+        return tuple(
+            lut[int(min(max(val, 0.0), 1.0) * last + 0.5)]
+            for lut, val in zip(self.luts, rgb)
+        )
+
+    def quantise_levels(self, levels, image):
+        """
+        Get the PWM register settings of all LEDs for LED values given as flat 16
+        bit levels, e.g. the array('H') of a Frame, in place.
+
+        Args:
+            levels - sequence of int red, green, blue levels of each LED from 0
+                     to led_frame.MAX_LEVEL
+            image  - bytearray of NUM_LEDS * REGISTERS_PER_LED bytes which is set
+                     to the register settings of each LED in turn
+
+        Returns:
+            image - the bytearray given
+        """
+        if self.luts is None:
+            self.luts = self._build_luts()
+
+        red, green, blue = self.luts
+
+        for idx in xrange(min(self.NUM_LEDS, len(levels) / self.COLOURS_PER_LED)):
+            level = idx * self.COLOURS_PER_LED
+            base = idx * self.REGISTERS_PER_LED
+
+            image[base:base + 4] = red[to_lut_index(levels[level], self.LUT_SIZE)]
+            image[base + 4:base + 8] = \
+                green[to_lut_index(levels[level + 1], self.LUT_SIZE)]
+            image[base + 8:base + 12] = \
+                blue[to_lut_index(levels[level + 2], self.LUT_SIZE)]
+
+        return image
+
+    def set_calibration(self, calibration=None):
+        """
+        Set the colour calibration applied to the values given to set_led.
+
+        Args:
+            calibration - dict colour calibration profile, see led_calibration,
+                          None for no correction
+        """
+        self.calibration = dict(DEFAULT_CALIBRATION)
+        self.calibration.update(calibration or dict())
+        self.luts = None
+
     # --- Private Helpers ---------------------------------------------------------------
 
+    def _build_luts(self):
+        """
+        Fold the calibration and the LED response curve into a table of PWM
+        register settings for each colour channel.
+        """
+        gamma = self.calibration['gamma']
+        last = float(self.LUT_SIZE - 1)
+
+        return [
+            [
+                self._convert_val_to_pwm(calibrate(idx / last, factor, gamma), 0)
+                for idx in xrange(self.LUT_SIZE)
+            ]
+            for factor in get_factors(self.calibration)
+        ]
+
     def _convert_val_to_pwm(self, val, num):
         """
         Convert an intensity value to a PCA9685 PWM on/off register settings.
@@ -0,0 +1,228 @@
+# timeline_player.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Plays LED ring timelines inside the kano-boards-daemon.
+#
+# Clients hand a timeline file over to a board service rather than streaming its
+# frames over D-Bus. The frames are drawn from the GObject main loop into the
+# framebuffer layer of the client's lock, so the usual priorities still apply.
+# The frame shown is picked from the time elapsed on the monotonic clock, late
+# ticks skip frames rather than slowing the timeline down. With a governor, the
+# ticks are spaced out while the system is busy, see frame_rate_governor.
+#
+# Timeline files are loaded on a worker thread, parsing a large one would
+# otherwise hold up every other service of the daemon.
+
+
+import threading
+
+from kano.logging import logger
+
+from kano_peripherals.clock import monotonic
+from kano_peripherals.wrappers.led_ring.primitives import to_leds
+
+
+def load_timeline_async(path, num_leds, callback, post=None):
+    """
+    Load a timeline file on a worker thread, see load_timeline.
+
+    Args:
+        path     - str path to the timeline file
+        num_leds - int number of LEDs to check the timeline against
+        callback - callable taking the Timeline, None if it could not be loaded,
+                   and the IOError or ValueError raised, None if it was loaded
+        post     - callable taking a function and its args which runs it on the
+                   main loop, GObject.idle_add by default
+    """
+    # Lazy import to avoid loading numpy until a timeline is played.
+    from kano_peripherals.wrappers.led_ring.timeline import load_timeline
+
+    if post is None:
+        # Lazy import to avoid issue of importing from this module externally.
+        from gi.repository import GObject
+
+        post = GObject.idle_add
+
+    def _load():
+        try:
+            timeline, error = load_timeline(path, num_leds=num_leds), None
+        except (IOError, ValueError) as e:
+            timeline, error = None, e
+
+        post(_run_once, timeline, error)
+
+    def _run_once(timeline, error):
+        callback(timeline, error)
+        return False
+
+    worker = threading.Thread(target=_load)
+    worker.daemon = True
+    worker.start()
+
+
+class TimelinePlayer(object):
+    """
+    Draws the frames of a Timeline with a callback until it is done or stopped.
+    """
+
+    def __init__(self, timeline, draw, on_done=None, clock=monotonic, governor=None):
+        """
+        Constructor for the TimelinePlayer.
+
+        Args:
+            timeline - Timeline object to play
+            draw     - callable taking a list of (r,g,b) tuples, returns whether
+                       the frame could be drawn, playback stops if not
+            on_done  - callable run without arguments once the last loop ended
+            clock    - callable returning the current time in seconds
+            governor - FrameRateGovernor to lower the frame rate under load, the
+                       rate of the timeline is kept if None
+        """
+        super(TimelinePlayer, self).__init__()
+
+        self.timeline = timeline
+        self.draw = draw
+        self.on_done = on_done
+        self.clock = clock
+        self.governor = governor
+
+        self.start_time = None
+        self.last_index = None
+        self.last_tick = None
+        self.period = None
+        self.source_id = None
+
+    def start(self):
+        """
+        Draw the first frame and schedule the next ones.
+        """
+        # Lazy import to avoid issue of importing from this module externally.
+        from gi.repository import GObject
+
+        self.stop()
+
+        self.start_time = self.clock()
+        self.last_index = None
+        self.last_tick = self.start_time
+
+        if self.governor is not None:
+            self.governor.reset()
+
+        self.period = self._get_period(1)
+        self.source_id = GObject.timeout_add(self.period, self._tick)
+
+        self._tick()
+
+    def stop(self):
+        """
+        Stop drawing frames, the last one drawn is left in place.
+        """
+        if self.source_id is None:
+            return
+
+        # Lazy import to avoid issue of importing from this module externally.
+        from gi.repository import GObject
+
+        GObject.source_remove(self.source_id)
+        self.source_id = None
+
+    def is_playing(self):
+        """
+        Check whether frames are still being drawn.
+        """
+        return self.source_id is not None
+
+    def get_effective_fps(self):
+        """
+        Get the frame rate currently played at, lower than the one of the
+        timeline while the system is busy.
+
+        Returns:
+            fps - float frames per second, 0.0 if not playing
+        """
+        if not self.is_playing():
+            return 0.0
+
+        return 1000.0 / self.period
+
+    def _tick(self):
+        """
+        Draw the frame due now, if it was not drawn already.
+        This method is run periodically with GObject.
+        """
+        if self.source_id is None:
+            return False
+
+        timeline = self.timeline
+        now = self.clock()
+        index = int((now - self.start_time) * timeline.fps)
+
+        if timeline.loops and index >= timeline.loops * timeline.num_frames:
+            self.stop()
+            self._notify_done()
+            return False
+
+        if index != self.last_index:
+            self.last_index = index
+
+            if not self.draw(to_leds(timeline.get_frame(index))):
+                logger.warn('TimelinePlayer: _tick: Frame was refused, stopping playback')
+                self.stop()
+                return False
+
+        return self._adapt_rate(now)
+
+    def _adapt_rate(self, now):
+        """
+        Let the governor know how late this tick was and move to the period it
+        picks.
+
+        Returns:
+            True or False if the current timeout source is to be kept.
+        """
+        if self.governor is None:
+            return True
+
+        # Lazy import to avoid issue of importing from this module externally.
+        from gi.repository import GObject
+
+        lateness = max(0.0, now - self.last_tick - self.period / 1000.0)
+        self.last_tick = now
+
+        period = self._get_period(
+            self.governor.sample(lateness, self.period / 1000.0)
+        )
+        if period == self.period:
+            return True
+
+        logger.debug(
+            'TimelinePlayer: _adapt_rate: Ticking every {} ms'.format(period)
+        )
+        GObject.source_remove(self.source_id)
+        self.period = period
+        self.source_id = GObject.timeout_add(self.period, self._tick)
+
+        return False
+
+    def _get_period(self, divisor):
+        """
+        Get the time between ticks for a divisor of the timeline frame rate.
+
+        Returns:
+            period - int milliseconds
+        """
+        return max(1, int(1000 * divisor / self.timeline.fps))
+
+    def _notify_done(self):
+        """
+        Run the on_done callback, if any, after the last loop.
+        """
+        if self.on_done is None:
+            return
+
+        try:
+            self.on_done()
+        except Exception as e:
+            logger.error('TimelinePlayer: on_done callback failed - [{}]'.format(e))
@@ -14,7 +14,7 @@ import dbus.exceptions
 from kano.logging import logger
 
 from kano_peripherals.paths import BUS_NAME, SERVICE_MANAGER_OBJECT_PATH, \
-    SERVICE_API_IFACE
+    LED_RING_OBJECT_PATH, SERVICE_API_IFACE
 
 
 def get_service_manager_interface(retry_count=5, retry_time_sec=1):
@@ -35,6 +35,25 @@ def get_service_manager_interface(retry_count=5, retry_time_sec=1):
     )
 
 
+def get_led_ring_interface(retry_count=5, retry_time_sec=1):
+    """Helper function to obtain a DBus interface to the LEDRingService, which
+    drives all the LED ring boards attached as one.
+
+    Args:
+        retry_count: See :func:`~get_service_interface`
+        retry_time_sec: See :func:`~get_service_interface`
+
+    Returns:
+        See :func:`~get_service_interface`
+    """
+    return get_service_interface(
+        LED_RING_OBJECT_PATH,
+        SERVICE_API_IFACE,
+        retry_count=retry_count,
+        retry_time_sec=retry_time_sec
+    )
+
+
 def get_service_interface(object_path, object_iface, retry_count=5, retry_time_sec=1):
     """Helper function to obtain a DBus interface to a specified service.
 
@@ -4,6 +4,9 @@
 # License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
 #
 # A collection of helper functions to interrogate the hardware.
+#
+# The kit type, version, EDID and attached hats are cached in the hardware profile
+# for the current boot, see kano_peripherals.hardware_profile.
 
 
 import traceback
@@ -11,13 +14,10 @@ from distutils.version import LooseVersion
 
 from kano.logging import logger
 
-from kano_settings.system.display import get_edid_name
-
-from kano_peripherals.pi_hat.driver.service import PiHatService
-from kano_peripherals.pi_hat.driver.high_level import get_pihat_interface
-from kano_peripherals.ck2_pro_hat.driver.service import CK2ProHatService
-from kano_peripherals.ck2_pro_hat.driver.high_level import \
-    get_ck2_pro_hat_interface
+from kano_peripherals import hardware_profile
+from kano_peripherals.utils import get_service_manager_interface
+from kano_peripherals.service_registry import get_service_class
+from kano_peripherals.paths import PI_HAT_OBJECT_PATH, CK2_PRO_HAT_OBJECT_PATH
 
 
 CKL, CKC, CKT = xrange(3)
@@ -45,6 +45,32 @@ EDID_MAP = {
 }
 
 
+def get_hardware_summary(retry_count=5):
+    """Get all the devices attached from the kano-boards-daemon, in one call.
+
+    The daemon replies once every device type was probed, so a missing device
+    is reported straight away. Only reaching the daemon itself is retried.
+
+    Args:
+        retry_count: See
+            :func:`~kano_peripherals.utils.get_service_manager_interface`
+
+    Returns:
+        list: Object paths of the device services attached, e.g.
+            ``/me/kano/boards/PiHat``, or None if the daemon is unreachable
+    """
+    try:
+        service_manager_iface = get_service_manager_interface(retry_count=retry_count)
+        if not service_manager_iface:
+            return None
+
+        return [str(path) for path in service_manager_iface.get_hardware_summary()]
+    except:
+        logger.error('Unexpected error occured:\n{}'.format(traceback.format_exc()))
+
+    return None
+
+
 def is_pi_hat_plugged(with_dbus=True, retry_count=5):
     """Check if the Kano PiHat board is plugged in.
 
@@ -54,24 +80,13 @@ def is_pi_hat_plugged(with_dbus=True, retry_count=5):
     Args:
         with_dbus (bool): Whether to run the detection through the central dbus
             kano-boards-daemon, or bypass to use the underlyning library
-        retry_count: See
-            :func:`~kano_peripherals.pi_hat.driver.high_level.get_pihat_interface`
+        retry_count: See :func:`get_hardware_summary`
 
     Returns:
-        bool: Whether the PiHat is plugged in or not
+        bool: Whether the PiHat is plugged in or not, False if the daemon is
+            unreachable
     """
-    is_plugged = False
-
-    try:
-        if with_dbus:
-            pihat_iface = get_pihat_interface(retry_count=retry_count)
-            is_plugged = bool(pihat_iface and pihat_iface.detect())
-        else:
-            is_plugged = PiHatService.quick_detect()
-    except:
-        logger.error('Unexpected error occured:\n{}'.format(traceback.format_exc()))
-
-    return is_plugged
+    return bool(_detect_hat(PI_HAT_OBJECT_PATH, with_dbus, retry_count))
 
 
 def is_power_hat_plugged(with_dbus=True, retry_count=5):
@@ -83,24 +98,13 @@ def is_power_hat_plugged(with_dbus=True, retry_count=5):
     Args:
         with_dbus (bool): Whether to run the detection through the central dbus
             kano-boards-daemon, or bypass to use the underlying library
-        retry_count: See
-            :func:`~kano_peripherals.ck2_pro_hat.driver.high_level.get_ck2_pro_hat_interface`
+        retry_count: See :func:`get_hardware_summary`
 
     Returns:
-        bool: Whether the PowerHat is plugged in or not
+        bool: Whether the PowerHat is plugged in or not, False if the daemon is
+            unreachable
     """
-    is_plugged = False
-
-    try:
-        if with_dbus:
-            ck2prohat_iface = get_ck2_pro_hat_interface(retry_count=retry_count)
-            is_plugged = bool(ck2prohat_iface and ck2prohat_iface.detect())
-        else:
-            is_plugged = CK2ProHatService.quick_detect()
-    except:
-        logger.error('Unexpected error occured:\n{}'.format(traceback.format_exc()))
-
-    return is_plugged
+    return bool(_detect_hat(CK2_PRO_HAT_OBJECT_PATH, with_dbus, retry_count))
 
 
 def is_ck2_lite(with_dbus=True, retry_count=5):
@@ -116,7 +120,9 @@ def is_ck2_lite(with_dbus=True, retry_count=5):
     Returns:
         bool: Whether this is a CK2 Lite or not
     """
-    return is_pi_hat_plugged(with_dbus=with_dbus, retry_count=retry_count)
+    return _is_hat_plugged(
+        'pi_hat', PI_HAT_OBJECT_PATH, with_dbus=with_dbus, retry_count=retry_count
+    )
 
 
 def get_screen_version():
@@ -127,7 +133,7 @@ def get_screen_version():
                 Tuple of the kit identifier and the version associated
                 with that kit. If this fails, (None, None) is returned
     '''
-    edid_model = get_edid_name()
+    edid_model = hardware_profile.get_value('edid', hardware_profile.read_edid_name)
 
     return EDID_MAP.get(edid_model, (None, None))
 
@@ -175,8 +181,9 @@ def is_ckt(with_dbus=True, retry_count=5):
     Returns:
         bool: Whether this is a CKT or not
     """
-    hat_connected = is_power_hat_plugged(
-        with_dbus=with_dbus, retry_count=retry_count
+    hat_connected = _is_hat_plugged(
+        'power_hat', CK2_PRO_HAT_OBJECT_PATH, with_dbus=with_dbus,
+        retry_count=retry_count
     )
 
     if not hat_connected:
@@ -219,3 +226,89 @@ def get_ckt_version():
     dummy_kit, version = get_screen_version()
 
     return version
+
+
+def get_hardware_profile(with_dbus=True, retry_count=5):
+    """Get the full hardware profile of the kit.
+
+    Args:
+        with_dbus: See :func:`is_pi_hat_plugged`
+        retry_count: See :func:`is_pi_hat_plugged`
+
+    Returns:
+        dict: With the keys `kit` (CKL, CKC, CKT or None), `version`
+            (distutils.version.LooseVersion or None), `edid` (str),
+            `pi_hat` and `power_hat` (bool)
+    """
+    if is_ck2_lite(with_dbus, retry_count):
+        kit, version = CKL, get_ck2_lite_version()
+    elif is_ck2_pro(with_dbus, retry_count):
+        kit, version = CKC, get_ck2_pro_version()
+    elif is_ckt(with_dbus, retry_count):
+        kit, version = CKT, get_ckt_version()
+    else:
+        kit, version = None, None
+
+    return {
+        'kit': kit,
+        'version': version,
+        'edid': hardware_profile.get_value('edid', hardware_profile.read_edid_name),
+        'pi_hat': _is_hat_plugged(
+            'pi_hat', PI_HAT_OBJECT_PATH, with_dbus=with_dbus, retry_count=retry_count
+        ),
+        'power_hat': _is_hat_plugged(
+            'power_hat', CK2_PRO_HAT_OBJECT_PATH, with_dbus=with_dbus,
+            retry_count=retry_count
+        )
+    }
+
+
+def _detect_hat(object_path, with_dbus=True, retry_count=5):
+    """Check if a hat is plugged in, telling an unreachable daemon apart.
+
+    Args:
+        object_path (str): The object path of the service of the hat
+        with_dbus: See :func:`is_pi_hat_plugged`
+        retry_count: See :func:`is_pi_hat_plugged`
+
+    Returns:
+        bool: Whether the hat is plugged in or not, None if it could not be
+            told, e.g. the daemon is unreachable
+    """
+    is_plugged = None
+
+    try:
+        if with_dbus:
+            summary = get_hardware_summary(retry_count=retry_count)
+            if summary is not None:
+                is_plugged = object_path in summary
+        else:
+            is_plugged = get_service_class(object_path).quick_detect()
+    except:
+        logger.error('Unexpected error occured:\n{}'.format(traceback.format_exc()))
+
+    return is_plugged
+
+
+def _is_hat_plugged(key, object_path, with_dbus=True, retry_count=5):
+    """Check if a hat is plugged in, through the hardware profile cache.
+
+    Only the results from the daemon are cached, as it keeps the profile up to
+    date when devices are plugged in or unplugged. The hat is reported as not
+    plugged in, without caching it, while the daemon cannot be reached.
+
+    Args:
+        key (str): The name of the value in the hardware profile
+        object_path: See :func:`_detect_hat`
+        with_dbus: See :func:`is_pi_hat_plugged`
+        retry_count: See :func:`is_pi_hat_plugged`
+
+    Returns:
+        bool: Whether the hat is plugged in or not
+    """
+    if not with_dbus:
+        return bool(_detect_hat(object_path, with_dbus, retry_count))
+
+    return bool(hardware_profile.get_value(
+        key, lambda: _detect_hat(object_path, with_dbus, retry_count)
+    ))
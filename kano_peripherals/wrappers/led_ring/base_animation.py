@@ -5,15 +5,22 @@
 #
 # The base class for an LED ring animation.
 # Subclass this to create more animation routines.
+#
+# Animations register with the kano-boards-daemon by NAME when they lock a board,
+# which is how they are stopped.
 
 
 import math
-import time
 import signal
+import dbus
+import dbus.exceptions
 
 from kano.logging import logger
 from kano.utils import run_bg
 
+from kano_peripherals.paths import BUS_NAME, SERVICE_MANAGER_OBJECT_PATH, \
+    SERVICE_API_IFACE, PI_HAT_OBJECT_PATH
+from kano_peripherals.utils import get_led_ring_interface
 from kano_peripherals.speaker_leds.driver.high_level import get_speakerleds_interface
 from kano_peripherals.pi_hat.driver.high_level import get_pihat_interface
 from kano_peripherals.speaker_leds import colours as speaker_led_colours
@@ -25,8 +32,29 @@ class BaseAnimation(object):
     It provides a set of high level animation functions which could be
     grouped to create different effects. It also abstracts which LED
     ring board it uses, either LED Speaker or Pi Hat.
+
+    While a client with a higher lock priority holds the board, the animation
+    is preempted and its render loop pauses until the lock is released.
     """
 
+    # The name the animation is registered and stopped with, as the command used
+    # to start it, e.g. 'cpu-monitor'.
+    NAME = ''
+
+    # The longest time to block for while preempted before checking for SIGINT.
+    PREEMPTED_WAKE_RATE = 1000  # milliseconds
+
+    # Whether animate() plays pre-rendered cycles for the calls given a cache_key.
+    USE_FRAME_CACHE = True
+
+    # Whether animate() lowers its frame rate while the system is busy, see the
+    # frame_rate_governor module.
+    ADAPTIVE_FRAME_RATE = True
+
+    # The output levels per colour channel frames are quantised to when the board
+    # service does not tell its own.
+    DEFAULT_RESOLUTION = 256
+
     def __init__(self):
         super(BaseAnimation, self).__init__()
 
@@ -34,16 +62,49 @@ class BaseAnimation(object):
         self.interrupted = False
         self.colours = None
 
+        # The priority level locked by this animation and whether or not it is
+        # currently covered by a higher priority lock.
+        self.lock_priority = 0
+        self.is_preempted = False
+        self.lock_changed_match = None
+
+        # Paces animate() and records the frame rate achieved by the last call.
+        self.frame_scheduler = None
+
+        # The frames of the last animate() call sent to the board and those not
+        # sent because they would not have changed the output.
+        self.frame_counters = {'sent': 0, 'dropped': 0}
+
+        # Whether the board service takes frames in their packed form, see the
+        # led_frame module.
+        self.use_packed_frames = True
+
+        # The DBus main loop is required to receive the lock_changed signal.
+        # Lazy import to avoid issue of importing from this module externally.
+        from dbus.mainloop.glib import DBusGMainLoop
+        DBusGMainLoop(set_as_default=True)
+
         self.setup_signal_handler()
 
     def connect(self, retry_count=5):
         """
         Grab an interface to either the LED Speaker or Pi Hat
-        depending on which one is plugged in.
+        depending on which one is plugged in, or to the LED ring of the
+        daemon when both are so that each frame is rendered once for both.
 
         Returns:
             successful - bool whether was able to connect to a board
         """
+        # Register before any board is found for an animation waiting for one to
+        # be stopped by name as well, again on each retry in case the daemon was
+        # restarted meanwhile.
+        self._register()
+
+        self.use_packed_frames = True
+
+        if self._connect_led_ring(retry_count):
+            return True
+
         self.iface = get_pihat_interface(retry_count=retry_count)
         if self.iface and self.iface.detect():
             self.colours = pi_hat_colours
@@ -56,6 +117,70 @@ class BaseAnimation(object):
 
         return False
 
+    def lock(self, priority, led_mask=None):
+        """
+        Lock the board API with the given priority and start listening for
+        lock changes to know when the animation is preempted.
+
+        Args:
+            priority - number representing the priority level (default is 1 to 10)
+            led_mask - int bitmask of the LEDs to lock where bit i is LED i,
+                       None to lock the whole ring
+
+        Returns:
+            token - str with an API token for identification or empty str if unsuccessful
+        """
+        if led_mask:
+            token = self.iface.lock_region(priority, led_mask)
+        else:
+            token = self.iface.lock(priority)
+
+        if not token:
+            return token
+
+        self.lock_priority = priority
+
+        # The iface changes when reconnecting after the board was hotplugged.
+        if self.lock_changed_match is not None:
+            self.lock_changed_match.remove()
+
+        self.lock_changed_match = self.iface.connect_to_signal(
+            'lock_changed', self._on_lock_changed
+        )
+
+        # Someone might already hold a higher priority.
+        self.is_preempted = bool(self.iface.is_preempted())
+
+        self._register()
+
+        return token
+
+    def wait_while_preempted(self):
+        """
+        Block while a higher priority lock covers this animation.
+
+        Returns when the lock is released or the animation was interrupted.
+        """
+        self._process_events()
+
+        if not self.is_preempted or self.interrupted:
+            return
+
+        logger.debug('BaseAnimation: Preempted, pausing until the lock is released')
+
+        # Lazy import to avoid issue of importing from this module externally.
+        from gi.repository import GLib
+
+        # Wake up periodically to be able to act on SIGINT.
+        context = GLib.MainContext.default()
+        wake_id = GLib.timeout_add(self.PREEMPTED_WAKE_RATE, lambda: True)
+
+        try:
+            while self.is_preempted and not self.interrupted:
+                context.iteration(True)
+        finally:
+            GLib.source_remove(wake_id)
+
     def setup_signal_handler(self):
         """
         Register a signal hander to listen for SIGINT to gracefully
@@ -74,137 +199,129 @@ class BaseAnimation(object):
         """
         Stop the animation loop and terminate process.
 
+        The animations registered with the daemon are signalled in a single call.
+        The process table is only searched when the daemon cannot be reached.
+
         Args:
-            args - the animation id as expected from cmdline args
+            args - the animation id as expected from cmdline args, e.g.
+                   'cpu-monitor', or empty str for all animations
         """
+        try:
+            BaseAnimation._get_service_manager().stop_animation(args)
+            return
+        except dbus.exceptions.DBusException as e:
+            logger.warn(
+                'BaseAnimation: stop: Daemon unreachable, falling back to pkill'
+                ' - [{}]'.format(e)
+            )
+
         run_bg('pkill --signal INT -f "kano-speakerleds {}"'.format(args))
 
+    # The primitives below are adapters over the vectorised ones in
+    # kano_peripherals.wrappers.led_ring.primitives, which work on numpy arrays.
+    # They are imported lazily so that stopping an animation does not load numpy.
+
     def constant(self, values):
         """
+        Frame function always returning the same LED values.
         """
-        def result_func(phase):
-            return values
-        return result_func
+        from kano_peripherals.wrappers.led_ring import primitives
+        return primitives.constant(values)
 
     def colour_wheel(self, hue, saturation=1.0, value=1.0):
         """
         HSL Colour Wheel representation
+
+        Returns an (r, g, b) tuple for a single hue, or an array of them for
+        an array of hues.
         """
+        from kano_peripherals.wrappers.led_ring import primitives
 
-        (frac, whole) = math.modf(hue * 6)
+        colours = primitives.colour_wheel(hue, saturation, value)
+        if colours.ndim == 1:
+            return tuple(colours.tolist())
 
-        p = value * (1 - saturation)
-        q = value * (1 - saturation * frac)
-        t = value * (1 - saturation * (1 - frac))
+        return colours
 
-        if whole == 0:
-            return (value, t, p)
-        elif whole == 1:
-            return (q, value, p)
-        elif whole == 2:
-            return (p, value, t)
-        elif whole == 3:
-            return (p, q, value)
-        elif whole == 4:
-            return (t, p, value)
-        elif whole == 5:
-            return (value, p, q)
+    colour_wheel.vectorised = True
 
     def rotate(self, value_func, phase_scale=1.0):
         """
         """
-        num_leds = self.iface.get_num_leds()
-
-        def result_func(phase):
-            phase = phase * phase_scale
-            values = list()
-
-            for i in xrange(num_leds):
-                values.append(value_func(math.modf(phase + float(i) / num_leds)[0]))
-
-            return values
-        return result_func
+        from kano_peripherals.wrappers.led_ring import primitives
+        return primitives.rotate(value_func, self.iface.get_num_leds(), phase_scale)
 
     def pulse(self, value_func, value_func2=None):
         """
         """
-        num_leds = self.iface.get_num_leds()
-
-        if value_func2 is None:
-            value_func2 = self.constant([(0, 0, 0)] * num_leds)
-
-        def mix_vals(a, b, m, n):
-            (r1, g1, b1) = a
-            (r2, g2, b2) = b
-            return (r1 * m + r2 * n,
-                    g1 * m + g2 * n,
-                    b1 * m + b2 * n)
-
-        def result_func(phase):
-            values_t = value_func(phase)
-            values2_t = value_func2(phase)
-
-            # given phase in interval [0, 1)
-            t = 2.0 * phase - 1  # in interval (-1, 1)
-            m = 1.0 - t * t      # a concave function between 0 and 1 (the middle of t is 1)
-            n = 1.0 - m          # a convexe function between 0 and 1 (m flipped)
-
-            mixed_values = list()
-            for i in xrange(num_leds):
-                mixed_values.append(mix_vals(values_t[i], values2_t[i], m, n))
-
-            return mixed_values
-
-        return result_func
+        from kano_peripherals.wrappers.led_ring import primitives
+        return primitives.pulse(value_func, value_func2, self.iface.get_num_leds())
 
     def pulse_each(self, value_func, led_speeds, value_func2=None):
         """
         """
-        num_leds = self.iface.get_num_leds()
+        from kano_peripherals.wrappers.led_ring import primitives
+        return primitives.pulse_each(
+            value_func, led_speeds[:self.iface.get_num_leds()], value_func2
+        )
 
-        if value_func2 is None:
-            value_func2 = self.constant([(0, 0, 0) for i in range(num_leds)])
-
-        def mix_vals(a, b, m, n):
-            (r1, g1, b1) = a
-            (r2, g2, b2) = b
-            return (r1 * m + r2 * n,
-                    g1 * m + g2 * n,
-                    b1 * m + b2 * n)
-
-        def result_func(phase):
-            values_t = value_func(phase)
-            values2_t = value_func2(phase)
-
-            mixed_values = list()
-
-            for i in xrange(num_leds):
-                # given phase in interval [0, 1)
-                phase_each = phase * led_speeds[i] % 1  # create more cycles for this LED
-
-                t = 2.0 * phase_each - 1  # in interval (-1, 1)
-                m = 1.0 - t * t           # a concave function between 0 and 1
-                n = 1.0 - m               # a convexe function between 0 and 1
-
-                mixed_values.append(mix_vals(values_t[i], values2_t[i], m, n))
-
-            return mixed_values
+    def animate(self, value_function, duration, cycles, update_rate=(1.0 / 25.0), mask=None,
+                cache_key=None):
+        """
+        Play a value function for a duration.
 
-        return result_func
+        Frames are quantised to the output levels of the board and are only sent
+        when they change, see get_frame_stats().
 
-    def animate(self, value_function, duration, cycles, update_rate=(1.0 / 25.0), mask=None):
-        """
+        Args:
+            value_function - frame function or Expression of the animation, see
+                             the primitives and expression modules
+            cache_key      - hashable spec which fully determines value_function,
+                             e.g. the animation name and its parameters. When
+                             given, one cycle is pre-rendered and looked up by
+                             phase, see the frame_cache module. Expressions are
+                             their own key.
         """
+        # Lazy import to avoid loading numpy when only stopping animations.
+        from kano_peripherals.wrappers.led_ring.primitives import quantise
+        from kano_peripherals.wrappers.led_ring.frame_cache import get_frame_cache
+        from kano_peripherals.wrappers.led_ring.frame_scheduler import FrameScheduler
+        from kano_peripherals.wrappers.led_ring.frame_rate_governor import \
+            FrameRateGovernor
+        from kano_peripherals.wrappers.led_ring.expression import Expression, \
+            compile_expression
+
+        if isinstance(value_function, Expression):
+            if cache_key is None:
+                cache_key = value_function.to_json()
+            value_function = compile_expression(value_function, self.iface.get_num_leds())
+
         successful = True
 
-        start = time.time()
+        levels = self._get_resolution()
+        last_sent = None
+        self.frame_counters = {'sent': 0, 'dropped': 0}
+
+        governor = FrameRateGovernor() if self.ADAPTIVE_FRAME_RATE else None
+        self.frame_scheduler = FrameScheduler(update_rate, governor=governor)
+        start = self.frame_scheduler.start()
         if duration is None:
             duration = 365 * 24 * 60 * 60
 
+        if cache_key is not None and self.USE_FRAME_CACHE and cycles > 0:
+            value_function = get_frame_cache().get_table(
+                cache_key, value_function, float(duration) / cycles / update_rate
+            )
+
         end = start + duration
 
         now = start
         while now < end and successful and not self.interrupted:
+            if self.is_preempted:
+                self.wait_while_preempted()
+                now = self.frame_scheduler.resync()
+                continue
+
             # number of cycles passed of total
             phase = (now - start) * cycles / duration
 
@@ -212,12 +329,36 @@ class BaseAnimation(object):
             (frac, rest) = math.modf(phase)
 
             # frac is a float in interval [0, 1), cyclic, and monotonically increasing
-            leds = value_function(frac)
+            frame = quantise(value_function(frac), levels)
 
-            successful = self.iface.set_all_leds(leds)
+            if last_sent is None or not (frame == last_sent).all():
+                successful = self._send_frame(frame, levels)
+                self.frame_counters['sent'] += 1
+                last_sent = frame if successful else None
+            else:
+                # Nothing visible changed, the call to the daemon is saved.
+                self.frame_counters['dropped'] += 1
 
-            time.sleep(update_rate)
-            now = time.time()  # seconds since the epoch as float
+            if not successful:
+                # The frame was refused because a higher priority lock was taken.
+                # Keep the animation going, it is paused on the next iteration.
+                self._process_events()
+                successful = self.is_preempted
+            elif self.lock_priority:
+                self._process_events()
+
+            # The next frame is rendered for the time it was due, frames which
+            # are already late are skipped.
+            now = self.frame_scheduler.wait_next()
+
+        stats = self.get_frame_stats()
+        logger.info(
+            'BaseAnimation: animate: {fps:.1f}/{target_fps:.1f} fps, paced to'
+            ' {effective_fps:.1f} fps at the end, {frames} frames,'
+            ' {skipped} skipped, {sent} sent, {dropped} dropped, jitter p50'
+            ' {jitter_p50:.1f} ms, p95 {jitter_p95:.1f} ms, p99 {jitter_p99:.1f} ms'
+            .format(**stats)
+        )
 
         if self.iface:
             successful = self.iface.set_leds_off()
@@ -226,6 +367,145 @@ class BaseAnimation(object):
 
         return successful
 
+    def get_frame_stats(self):
+        """
+        Get how well the current or last animate() call kept to its frame rate,
+        and the rate it is currently lowered to, `effective_fps`.
+
+        Returns:
+            stats - dict as FrameScheduler.get_stats() with the `sent` and
+                    `dropped` frame counts, empty if nothing was animated yet
+        """
+        if self.frame_scheduler is None:
+            return dict()
+
+        stats = self.frame_scheduler.get_stats()
+        stats.update(self.frame_counters)
+
+        return stats
+
+    def _get_resolution(self):
+        """
+        Get the number of output levels of each colour channel of the board.
+        """
+        try:
+            return int(self.iface.get_resolution())
+        except dbus.exceptions.DBusException:
+            return self.DEFAULT_RESOLUTION
+
+    def _send_frame(self, frame, levels):
+        """
+        Send a quantised frame to the board, packed unless the board service
+        does not take packed frames.
+
+        Args:
+            frame  - (N, 3) array of int levels from 0 to levels - 1
+            levels - int number of output levels the frame was quantised to
+
+        Returns:
+            True or False if the frame is visible and the operation was successful.
+        """
+        # Lazy import to avoid loading numpy when only stopping animations.
+        from kano_peripherals.wrappers.led_ring.primitives import to_leds, to_packed
+
+        if self.use_packed_frames:
+            try:
+                return self.iface.set_all_leds_packed(
+                    dbus.ByteArray(to_packed(frame, levels))
+                )
+            except dbus.exceptions.DBusException as e:
+                if e.get_dbus_name() != 'org.freedesktop.DBus.Error.UnknownMethod':
+                    raise
+                logger.warn(
+                    'BaseAnimation: _send_frame: Packed frames not supported - [{}]'
+                    .format(e)
+                )
+                self.use_packed_frames = False
+
+        return self.iface.set_all_leds(to_leds(frame * (1.0 / (levels - 1))))
+
+    def _connect_led_ring(self, retry_count):
+        """
+        Grab an interface to the LED ring driving all the boards attached, if
+        there are several of them.
+
+        Returns:
+            successful - bool whether more than one board is attached
+        """
+        iface = get_led_ring_interface(retry_count=retry_count)
+        if not iface:
+            return False
+
+        try:
+            boards = iface.get_boards()
+        except dbus.exceptions.DBusException as e:
+            logger.warn('BaseAnimation: Daemon has no LED ring - [{}]'.format(e))
+            return False
+
+        if len(boards) < 2:
+            return False
+
+        # The boards correct the colours themselves, the palette of the first one
+        # is used for all of them.
+        self.iface = iface
+        if boards[0] == PI_HAT_OBJECT_PATH:
+            self.colours = pi_hat_colours
+        else:
+            self.colours = speaker_led_colours
+
+        return True
+
+    def _on_lock_changed(self, top_priority, owner):
+        """
+        Signal handler for the board service lock_changed signal.
+        """
+        if not self.lock_priority or top_priority <= self.lock_priority or \
+           owner == dbus.SystemBus().get_unique_name():
+            self.is_preempted = False
+            return
+
+        # A higher priority lock might only cover part of our LEDs.
+        self.is_preempted = bool(self.iface.is_preempted())
+
+    @staticmethod
+    def _get_service_manager():
+        """
+        Get an interface to the ServiceManager of the daemon. It is neither
+        introspected nor validated so that each call is a single round trip.
+        """
+        return dbus.Interface(
+            dbus.SystemBus().get_object(
+                BUS_NAME, SERVICE_MANAGER_OBJECT_PATH, introspect=False
+            ),
+            SERVICE_API_IFACE
+        )
+
+    def _register(self):
+        """
+        Register the animation with the daemon for it to be stopped by name.
+        """
+        if not self.NAME:
+            return
+
+        try:
+            self._get_service_manager().register_animation(self.NAME)
+        except dbus.exceptions.DBusException as e:
+            logger.warn(
+                'BaseAnimation: _register: Could not register {} - [{}]'
+                .format(self.NAME, e)
+            )
+
+    def _process_events(self):
+        """
+        Dispatch any pending DBus signals without blocking.
+        """
+        # Lazy import to avoid issue of importing from this module externally.
+        from gi.repository import GLib
+
+        context = GLib.MainContext.default()
+        while context.pending():
+            context.iteration(False)
+
     def _signal_handler(self, signum, frame):
         self.interrupted = True
         if self.iface:
@@ -33,6 +33,7 @@ class CpuMonitor(BaseAnimation):
     This is a wrapper over Pi Hat and LED Speaker.
     """
 
+    NAME = 'cpu-monitor'
     LOCK_PRIORITY = 1
     RECONNECT_RETRY_TIME = 5  # seconds
 
@@ -62,6 +63,9 @@ class CpuMonitor(BaseAnimation):
             rc - int value with return code or None if no errors occured
         """
 
+        # Lazy import to avoid loading numpy when only stopping the animation.
+        from kano_peripherals.wrappers.led_ring import expression
+
         # Check user preference about enabling the animation.
         if check_settings:
             cpu_monitor_on = self._get_cpu_monitor_setting()
@@ -75,22 +79,27 @@ class CpuMonitor(BaseAnimation):
 
         try:
             # Lock the API so anything below doesn't override our calls.
-            locked = self.iface.lock(self.LOCK_PRIORITY)
+            locked = self.lock(self.LOCK_PRIORITY)
             if not locked:
                 logger.error('LED Ring: CpuMonitor: Could not lock dbus interface!')
                 return RC_FAILED_LOCKING_API
 
             # Setup the animation parameters.
             num_leds = self.iface.get_num_leds()
-            vf = self.constant([self.colours.LED_KANO_ORANGE for i in range(num_leds)])
+            vf = expression.constant([self.colours.LED_KANO_ORANGE] * num_leds)
             duration = update_rate
             cycles = duration / 2
 
             # Run the animation loop
             while not self.interrupted:
+                # Do not poll the processes while another animation is shown.
+                self.wait_while_preempted()
+                if self.interrupted:
+                    break
+
                 led_speeds = self._get_cpu_led_speeds(0.1, num_leds)
 
-                vf2 = self.pulse_each(vf, led_speeds)
+                vf2 = expression.pulse_each(vf, led_speeds)
                 successful = self.animate(vf2, duration, cycles)
 
                 if not successful:
@@ -115,7 +124,7 @@ class CpuMonitor(BaseAnimation):
         """
         Stop the animation loop and terminate process.
         """
-        super(CpuMonitor, CpuMonitor).stop('cpu-monitor')
+        super(CpuMonitor, CpuMonitor).stop(CpuMonitor.NAME)
 
     def _get_cpu_monitor_setting(self):
         return get_setting('LED-Speaker-anim')
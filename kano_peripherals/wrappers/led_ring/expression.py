@@ -0,0 +1,392 @@
+# expression.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Expression graphs describing LED ring animations.
+#
+# An animation such as pulse(rotate(colour_wheel())) is built once as a tree of
+# Expression nodes. The tree serialises to JSON, so it can be sent over D-Bus and
+# used as a cache key, and compiles to a single vectorised frame function (see
+# the primitives module) for either side of the bus.
+#
+# Compiling flattens the mixes into a weighted sum of sources:
+#
+#     frame(phase) = sum of weight_i(phase) * source_i(phase)
+#
+# where the weights are products of the pulse factors and the sources are either
+# constant frames or rotating colour wheels. The terms are then optimised:
+#
+#   - sources which are all zero, e.g. the default black of pulse, are dropped
+#   - constants with the same weight are folded together, and so are
+#     c * m + c * (1 - m) = c
+#   - each term is only evaluated on the colour channels it can light up
+
+
+import json
+import collections
+
+import numpy as np
+
+from kano_peripherals.wrappers.led_ring import primitives
+
+
+class Expression(object):
+    """
+    A node of an animation expression graph. Use the builder functions of this
+    module rather than creating these directly.
+    """
+
+    def __init__(self, op, args=None, **params):
+        """
+        Constructor for the Expression.
+
+        Args:
+            op     - str name of the operation, one of OPERATIONS
+            args   - list of Expression child nodes
+            params - JSON serialisable parameters of the operation
+        """
+        super(Expression, self).__init__()
+
+        if op not in OPERATIONS:
+            raise ValueError('Unknown animation expression operation {}'.format(op))
+
+        self.op = op
+        self.args = list(args or [])
+        self.params = params
+
+    def to_dict(self):
+        """
+        Get the expression as nested dicts of builtin types.
+        """
+        data = {'op': self.op}
+        data.update(self.params)
+
+        if self.args:
+            data['args'] = [arg.to_dict() for arg in self.args]
+
+        return data
+
+    def to_json(self):
+        """
+        Get the canonical JSON string of the expression, suitable as a key.
+        """
+        return json.dumps(self.to_dict(), sort_keys=True, separators=(',', ':'))
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build an expression from the output of to_dict().
+
+        Raises:
+            ValueError - if the data does not describe a valid expression
+        """
+        try:
+            data = dict(data)
+            op = str(data.pop('op'))
+            args = [cls.from_dict(arg) for arg in data.pop('args', [])]
+            params = dict((str(key), value) for key, value in data.iteritems())
+        except (TypeError, KeyError, AttributeError) as e:
+            raise ValueError('Invalid animation expression - [{}]'.format(e))
+
+        return cls(op, args, **params)
+
+    @classmethod
+    def from_json(cls, json_str):
+        """
+        Build an expression from the output of to_json().
+
+        Raises:
+            ValueError - if the string does not describe a valid expression
+        """
+        return cls.from_dict(json.loads(json_str))
+
+    def __eq__(self, other):
+        return isinstance(other, Expression) and self.to_json() == other.to_json()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.to_json())
+
+    def __repr__(self):
+        return 'Expression({})'.format(self.to_json())
+
+
+OPERATIONS = ['constant', 'colour_wheel', 'rotate', 'pulse', 'pulse_each']
+
+
+# --- Builders ----------------------------------------------------------------------
+
+
+def constant(values):
+    """
+    Expression of a frame which does not change.
+
+    Args:
+        values - list of N (r, g, b) tuples
+    """
+    return Expression(
+        'constant', values=[[float(channel) for channel in rgb] for rgb in values]
+    )
+
+
+def colour_wheel(saturation=1.0, value=1.0):
+    """
+    Expression of the HSV colour wheel, to be spun with rotate().
+    """
+    return Expression('colour_wheel', saturation=float(saturation), value=float(value))
+
+
+def rotate(colour, phase_scale=1.0):
+    """
+    Expression spreading a colour_wheel() around the ring and spinning it.
+    """
+    return Expression('rotate', [colour], phase_scale=float(phase_scale))
+
+
+def pulse(frame, frame2=None):
+    """
+    Expression fading from frame2, all LEDs off if None, into frame and back.
+    """
+    args = [frame] if frame2 is None else [frame, frame2]
+    return Expression('pulse', args)
+
+
+def pulse_each(frame, led_speeds, frame2=None):
+    """
+    Expression pulsing each LED at its own speed between frame2, all LEDs off
+    if None, and frame.
+    """
+    args = [frame] if frame2 is None else [frame, frame2]
+    return Expression(
+        'pulse_each', args, led_speeds=[float(speed) for speed in led_speeds]
+    )
+
+
+# --- Compilation -------------------------------------------------------------------
+
+
+# The weight factors, ('pulse',) for m, ('pulse_inv',) for 1 - m, and
+# ('each', led_speeds) and ('each_inv', led_speeds) for pulse_each. A weight is a
+# sorted tuple of factors which multiply.
+_INVERSE_FACTORS = {'pulse': 'pulse_inv', 'pulse_inv': 'pulse',
+                    'each': 'each_inv', 'each_inv': 'each'}
+
+ALL_CHANNELS = (0, 1, 2)
+
+
+Term = collections.namedtuple('Term', ['weight', 'source', 'channels'])
+
+
+class CompiledExpression(object):
+    """
+    Vectorised frame function of an expression, see the primitives module.
+    """
+
+    vectorised = True
+
+    def __init__(self, terms, num_leds):
+        super(CompiledExpression, self).__init__()
+
+        self.terms = terms
+        self.num_leds = num_leds
+        self.offsets = np.arange(num_leds, dtype=float) / num_leds
+
+        # The constants are sliced to their channels once.
+        self.plan = list()
+        for term in terms:
+            channels = _channel_index(term.channels)
+            source = term.source
+            if source[0] == 'constant':
+                source = ('constant', source[1][..., channels])
+            self.plan.append((channels, source, term.weight))
+
+    def __call__(self, phase):
+        phase = np.asarray(phase, dtype=float)
+
+        if len(self.terms) == 1 and not self.terms[0].weight and \
+           self.terms[0].source[0] == 'constant':
+            frame = self.terms[0].source[1]
+            return np.broadcast_to(frame, phase.shape + frame.shape)
+
+        frames = np.zeros(phase.shape + (self.num_leds, 3))
+        factors = dict()
+
+        for channels, source, weight in self.plan:
+            values = self._evaluate_source(source, phase, channels)
+
+            for factor in weight:
+                if factor not in factors:
+                    factors[factor] = self._evaluate_factor(factor, phase)
+                values = values * factors[factor]
+
+            frames[..., channels] += values
+
+        return frames
+
+    def _evaluate_source(self, source, phase, channels):
+        if source[0] == 'constant':
+            return source[1]
+
+        dummy, saturation, value, phase_scale = source
+        led_phases = np.modf(phase[..., np.newaxis] * phase_scale + self.offsets)[0]
+        return primitives.colour_wheel(led_phases, saturation, value)[..., channels]
+
+    @staticmethod
+    def _evaluate_factor(factor, phase):
+        """
+        Get a weight factor with a shape broadcasting against (..., N, 3).
+        """
+        if factor[0] in ('pulse', 'pulse_inv'):
+            t = 2.0 * phase - 1
+            m = 1.0 - t * t
+            m = m[..., np.newaxis, np.newaxis]
+        else:
+            phase_each = (phase[..., np.newaxis] * np.asarray(factor[1])) % 1
+            t = 2.0 * phase_each - 1
+            m = (1.0 - t * t)[..., np.newaxis]
+
+        return m if factor[0] in ('pulse', 'each') else 1.0 - m
+
+
+def compile_expression(expression, num_leds):
+    """
+    Compile an expression to a vectorised frame function.
+
+    Args:
+        expression - Expression object
+        num_leds   - int N number of LEDs on the ring
+
+    Returns:
+        frame_func - CompiledExpression mapping a phase, or an array of K phases,
+                     to an (N, 3), or a (K, N, 3), float array
+
+    Raises:
+        ValueError - if the expression is not valid for the ring
+    """
+    terms = _flatten(expression, num_leds)
+    terms = _fold_constants(terms)
+
+    return CompiledExpression(
+        [Term(weight, source, _get_channels(source)) for weight, source in terms],
+        num_leds
+    )
+
+
+def _flatten(expression, num_leds):
+    """
+    Get the (weight, source) terms of the weighted sum an expression computes.
+    """
+    op = expression.op
+    params = expression.params
+
+    if op == 'constant':
+        values = np.asarray(params['values'], dtype=float)
+        if values.shape != (num_leds, 3):
+            raise ValueError('Constant must have {} (r, g, b) values'.format(num_leds))
+        return [((), ('constant', values))]
+
+    if op == 'rotate':
+        colour = expression.args[0] if expression.args else None
+        if colour is None or colour.op != 'colour_wheel':
+            raise ValueError('rotate only spins a colour_wheel')
+        return [((), (
+            'colour_wheel', colour.params.get('saturation', 1.0),
+            colour.params.get('value', 1.0), params.get('phase_scale', 1.0)
+        ))]
+
+    if op in ('pulse', 'pulse_each'):
+        if op == 'pulse':
+            factor = ('pulse',)
+        else:
+            led_speeds = tuple(params['led_speeds'])
+            if len(led_speeds) != num_leds:
+                raise ValueError('pulse_each needs {} LED speeds'.format(num_leds))
+            factor = ('each', led_speeds)
+
+        inverse = (_INVERSE_FACTORS[factor[0]],) + factor[1:]
+
+        terms = [
+            (tuple(sorted(weight + (factor,))), source)
+            for weight, source in _flatten(expression.args[0], num_leds)
+        ]
+
+        # The default second frame is all LEDs off, it contributes nothing.
+        if len(expression.args) > 1:
+            terms += [
+                (tuple(sorted(weight + (inverse,))), source)
+                for weight, source in _flatten(expression.args[1], num_leds)
+            ]
+
+        return terms
+
+    raise ValueError('{} is not a frame expression'.format(op))
+
+
+def _fold_constants(terms):
+    """
+    Drop zero constants, sum the constants with the same weight, and fold
+    c * m + c * (1 - m) into c.
+    """
+    constants = collections.OrderedDict()
+    others = list()
+
+    for weight, source in terms:
+        if source[0] != 'constant':
+            others.append((weight, source))
+        elif weight in constants:
+            constants[weight] = constants[weight] + source[1]
+        else:
+            constants[weight] = source[1]
+
+    folded = True
+    while folded:
+        folded = False
+
+        for weight in constants.keys():
+            for factor in weight:
+                inverse = (_INVERSE_FACTORS[factor[0]],) + factor[1:]
+                rest = list(weight)
+                rest.remove(factor)
+                pair = tuple(sorted(rest + [inverse]))
+
+                if pair in constants and np.array_equal(constants[pair], constants[weight]):
+                    values = constants.pop(weight)
+                    del constants[pair]
+                    rest = tuple(rest)
+                    constants[rest] = constants[rest] + values if rest in constants else values
+                    folded = True
+                    break
+
+            if folded:
+                break
+
+    return [
+        (weight, ('constant', folded_values))
+        for weight, folded_values in constants.iteritems() if np.any(folded_values)
+    ] + others
+
+
+def _get_channels(source):
+    """
+    Get the colour channels a source can light up.
+    """
+    if source[0] != 'constant':
+        return ALL_CHANNELS
+
+    return tuple(int(channel) for channel in np.flatnonzero(np.any(source[1], axis=0)))
+
+
+def _channel_index(channels):
+    """
+    Get the cheapest index selecting a tuple of channels.
+    """
+    if channels == ALL_CHANNELS:
+        return slice(None)
+
+    if len(channels) == 1:
+        return slice(channels[0], channels[0] + 1)
+
+    return list(channels)
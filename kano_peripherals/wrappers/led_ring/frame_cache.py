@@ -0,0 +1,159 @@
+# frame_cache.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Pre-rendered frame tables for periodic LED ring animations.
+#
+# The value functions given to BaseAnimation.animate are periodic in the phase of
+# the cycle. Rather than evaluating them on every frame, one cycle is rendered at
+# the playback resolution with a single call of the vectorised primitives and the
+# frames are looked up by phase. The tables of the last few animation specs are
+# kept in an LRU cache.
+
+
+import collections
+
+import numpy as np
+
+from kano_peripherals.wrappers.led_ring import primitives
+
+
+class FrameTable(object):
+    """
+    One cycle of an animation pre-rendered to a compact float32 array.
+    """
+
+    def __init__(self, frame_func, resolution, interpolate=False):
+        """
+        Constructor for the FrameTable.
+
+        Args:
+            frame_func  - frame function, see the primitives module
+            resolution  - int number of frames rendered for the cycle
+            interpolate - bool whether to blend the two frames around a phase
+                          rather than taking the nearest one
+        """
+        super(FrameTable, self).__init__()
+
+        frame_func = primitives.as_frame_function(frame_func)
+        phases = np.arange(resolution, dtype=float) / resolution
+
+        self.frames = np.ascontiguousarray(frame_func(phases), dtype=np.float32)
+        self.resolution = resolution
+        self.interpolate = interpolate
+
+    def __call__(self, phase):
+        """
+        Get the frame for a phase, as a frame function would.
+
+        Args:
+            phase - float phase in the cycle, wrapping around
+
+        Returns:
+            frame - (N, 3) float32 array
+        """
+        position = (phase % 1.0) * self.resolution
+
+        if not self.interpolate:
+            # The phases of animate() are accumulated from the frame deadlines and
+            # land a rounding error either side of the grid, take the nearest frame.
+            return self.frames[int(position + 0.5) % self.resolution]
+
+        index = int(position) % self.resolution
+
+        weight = position - int(position)
+        next_index = (index + 1) % self.resolution
+
+        return self.frames[index] * (1 - weight) + self.frames[next_index] * weight
+
+    def get_size(self):
+        """
+        Get the memory used by the frames.
+
+        Returns:
+            size - int number of bytes
+        """
+        return self.frames.nbytes
+
+
+class FrameCache(object):
+    """
+    LRU cache of FrameTables keyed by animation spec.
+    """
+
+    MAX_ENTRIES = 8
+
+    # Cycles with more frames than this are rendered at this resolution and
+    # interpolated during playback.
+    MAX_RESOLUTION = 1024
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        """
+        Constructor for the FrameCache.
+
+        Args:
+            max_entries - int number of tables kept
+        """
+        super(FrameCache, self).__init__()
+
+        self.max_entries = max_entries
+        self.tables = collections.OrderedDict()
+
+    def get_table(self, key, frame_func, frames_per_cycle):
+        """
+        Get the table for an animation spec, rendering it if it is not cached.
+
+        Args:
+            key              - hashable spec of the animation, e.g. a tuple of its
+                               name and parameters, which fully determines the
+                               frames of frame_func
+            frame_func       - frame function to render on a miss
+            frames_per_cycle - float number of frames played per cycle
+
+        Returns:
+            table - FrameTable object
+        """
+        # E.g. 8.3 s at 30 fps is 249.00000000000003 frames, which must not give 250.
+        resolution = max(1, int(np.ceil(round(frames_per_cycle, 6))))
+        key = (key, resolution)
+
+        table = self.tables.pop(key, None)
+
+        if table is None:
+            table = FrameTable(
+                frame_func,
+                min(resolution, self.MAX_RESOLUTION),
+                interpolate=resolution > self.MAX_RESOLUTION
+            )
+
+        self.tables[key] = table
+
+        while len(self.tables) > self.max_entries:
+            self.tables.popitem(last=False)
+
+        return table
+
+    def clear(self):
+        """
+        Drop all the tables.
+        """
+        self.tables.clear()
+
+
+_frame_cache = None
+
+
+def get_frame_cache():
+    """
+    Get the FrameCache shared by all the animations in the process.
+
+    Returns:
+        cache - FrameCache object
+    """
+    global _frame_cache
+
+    if _frame_cache is None:
+        _frame_cache = FrameCache()
+
+    return _frame_cache
@@ -0,0 +1,171 @@
+# frame_rate_governor.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Load adaptive frame rate for LED ring animations.
+#
+# The ring is decoration and should not take CPU time from the foreground app,
+# on a single core Pi in particular. The governor looks at the run queue of the
+# system and at how late the animation timer wakes up, which is the scheduler
+# delay the loop itself sees. Under pressure, the frame rate is divided down one
+# step at a time, and it is raised again one step at a time once the system has
+# been idle for a few checks.
+
+
+import multiprocessing
+
+from kano_peripherals.clock import monotonic
+
+
+LOADAVG_PATH = '/proc/loadavg'
+
+
+def get_run_queue():
+    """
+    Get the number of tasks currently runnable on the system, not counting the
+    caller itself, from the fourth field of /proc/loadavg, e.g. '2/181'.
+
+    Returns:
+        tasks - int, None if it is not available
+    """
+    try:
+        with open(LOADAVG_PATH, 'r') as loadavg_file:
+            running = loadavg_file.read().split()[3].split('/')[0]
+        return max(0, int(running) - 1)
+    except (IOError, IndexError, ValueError):
+        return None
+
+
+def _get_cpu_count():
+    """
+    Get the number of cores, 1 if it is not known.
+    """
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+class FrameRateGovernor(object):
+    """
+    Picks the divisor of the target frame rate from the load of the system.
+    """
+
+    # The divisors of the target frame rate stepped through, e.g. 25 fps is
+    # lowered to 12.5, 8.3, 6.25 and 4.2 fps.
+    RATE_DIVISORS = (1, 2, 3, 4, 6)
+
+    # The time between two load checks.
+    CHECK_INTERVAL = 1.0  # seconds
+
+    # The runnable tasks per core above which the system is under pressure and
+    # below which it is idle, smoothed over the checks.
+    HIGH_LOAD = 1.0
+    LOW_LOAD = 0.5
+
+    # The mean timer lateness, as a fraction of the frame period, above which
+    # the loop is considered starved of CPU time.
+    LATE_FRACTION = 0.25
+
+    # The number of idle checks in a row before the frame rate is raised.
+    STEP_UP_CHECKS = 3
+
+    # The weight of the latest run queue sample in the smoothed load.
+    LOAD_SMOOTHING = 0.5
+
+    def __init__(self, clock=monotonic, run_queue=get_run_queue, cpu_count=None):
+        """
+        Constructor for the FrameRateGovernor.
+
+        Args:
+            clock     - callable returning the current time in seconds
+            run_queue - callable as get_run_queue
+            cpu_count - int number of cores, detected by default
+        """
+        super(FrameRateGovernor, self).__init__()
+
+        self.clock = clock
+        self.run_queue = run_queue
+        self.cpu_count = cpu_count or _get_cpu_count()
+
+        self.step = 0
+        self.load = 0.0
+        self.idle_checks = 0
+        self.next_check = None
+        self.late_time = 0.0
+        self.samples = 0
+
+    def reset(self):
+        """
+        Start over from the target frame rate.
+        """
+        self.step = 0
+        self.load = 0.0
+        self.idle_checks = 0
+        self.next_check = self.clock() + self.CHECK_INTERVAL
+        self.late_time = 0.0
+        self.samples = 0
+
+    def get_divisor(self):
+        """
+        Get the current divisor of the target frame rate.
+
+        Returns:
+            divisor - int from RATE_DIVISORS
+        """
+        return self.RATE_DIVISORS[self.step]
+
+    def sample(self, lateness, period, missed=0):
+        """
+        Record how late the timer woke up for a frame and step the frame rate
+        once per CHECK_INTERVAL.
+
+        Args:
+            lateness - float seconds the frame was started after it was due
+            period   - float seconds between frames at the current rate
+            missed   - int number of frames skipped because they were late,
+                       counted as a whole period of lateness each
+
+        Returns:
+            divisor - int divisor of the target frame rate to run at
+        """
+        self.late_time += lateness + missed * period
+        self.samples += 1 + missed
+
+        now = self.clock()
+        if self.next_check is None:
+            self.next_check = now + self.CHECK_INTERVAL
+        if now < self.next_check:
+            return self.get_divisor()
+
+        self.next_check = now + self.CHECK_INTERVAL
+        self._check(self.late_time / self.samples / period)
+        self.late_time = 0.0
+        self.samples = 0
+
+        return self.get_divisor()
+
+    def _check(self, late_fraction):
+        """
+        Step the frame rate down under pressure, or up after enough idle checks.
+        """
+        tasks = self.run_queue()
+        if tasks is not None:
+            self.load += self.LOAD_SMOOTHING * (
+                float(tasks) / self.cpu_count - self.load
+            )
+
+        if self.load > self.HIGH_LOAD or late_fraction > self.LATE_FRACTION:
+            self.idle_checks = 0
+            self.step = min(self.step + 1, len(self.RATE_DIVISORS) - 1)
+            return
+
+        if self.load > self.LOW_LOAD:
+            self.idle_checks = 0
+            return
+
+        self.idle_checks += 1
+        if self.idle_checks >= self.STEP_UP_CHECKS:
+            self.idle_checks = 0
+            self.step = max(self.step - 1, 0)
@@ -0,0 +1,152 @@
+# frame_scheduler.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Deadline based frame pacing for LED ring animations.
+#
+# Frames are due at absolute times on the monotonic clock, start + n * period,
+# so the time spent rendering and sending a frame does not add up into drift.
+# When the loop falls behind by a whole period or more, the frames which are
+# already late are skipped rather than slowing the animation down.
+#
+# With a FrameRateGovernor, the period is stretched while the system is busy,
+# see the frame_rate_governor module.
+
+
+import time
+import collections
+
+from kano_peripherals.clock import monotonic
+
+
+class FrameScheduler(object):
+    """
+    Paces a render loop to absolute deadlines and records how well it kept up.
+    """
+
+    # The number of latest lateness samples kept for the jitter percentiles.
+    JITTER_SAMPLES = 4096
+
+    def __init__(self, period, clock=monotonic, sleep=time.sleep, governor=None):
+        """
+        Constructor for the FrameScheduler.
+
+        Args:
+            period   - float seconds between frames at the target frame rate
+            clock    - callable returning the current time in seconds
+            sleep    - callable as time.sleep
+            governor - FrameRateGovernor to lower the frame rate under load, the
+                       target frame rate is kept if None
+        """
+        super(FrameScheduler, self).__init__()
+
+        self.base_period = float(period)
+        self.period = self.base_period
+        self.clock = clock
+        self.sleep = sleep
+        self.governor = governor
+
+        self.start_time = None
+        self.deadline = None
+        self.frames = 0
+        self.skipped = 0
+        self.paused_time = 0.0
+        self.lateness = collections.deque(maxlen=self.JITTER_SAMPLES)
+
+    def start(self):
+        """
+        Start pacing, the first frame is due straight away.
+
+        Returns:
+            now - float time of the first frame
+        """
+        self.start_time = self.clock()
+        self.deadline = self.start_time
+        self.period = self.base_period
+        self.frames = 0
+        self.skipped = 0
+        self.paused_time = 0.0
+        self.lateness.clear()
+
+        if self.governor is not None:
+            self.governor.reset()
+
+        return self.deadline
+
+    def wait_next(self):
+        """
+        Block until the next frame is due, skipping the frames already missed.
+
+        Returns:
+            deadline - float time the frame was due, to render it for
+        """
+        self.frames += 1
+        self.deadline += self.period
+
+        now = self.clock()
+        missed = int((now - self.deadline) / self.period)
+
+        if missed > 0:
+            self.skipped += missed
+            self.deadline += missed * self.period
+
+        if now < self.deadline:
+            self.sleep(self.deadline - now)
+            now = self.clock()
+
+        lateness = max(0.0, now - self.deadline)
+        self.lateness.append(lateness)
+
+        if self.governor is not None:
+            divisor = self.governor.sample(lateness, self.period, max(0, missed))
+            self.period = self.base_period * divisor
+
+        return self.deadline
+
+    def resync(self):
+        """
+        Restart the deadlines from now, e.g. after the loop was paused on
+        purpose, without counting the time paused as skipped frames.
+
+        Returns:
+            now - float time of the next frame
+        """
+        now = self.clock()
+        self.paused_time += max(0.0, now - self.deadline)
+        self.deadline = now
+
+        return self.deadline
+
+    def get_stats(self):
+        """
+        Get how well the loop kept to its deadlines.
+
+        Returns:
+            stats - dict with the keys `fps` (achieved frames per second, not
+                    counting the time paused), `target_fps`, `effective_fps`
+                    (the rate currently paced to), `frames` and
+                    `skipped` (counts), and `jitter_p50`, `jitter_p95` and
+                    `jitter_p99` (lateness percentiles in milliseconds)
+        """
+        elapsed = 0
+        if self.start_time is not None:
+            elapsed = self.clock() - self.start_time - self.paused_time
+        samples = sorted(self.lateness)
+
+        def percentile(fraction):
+            if not samples:
+                return 0.0
+            index = min(len(samples) - 1, int(fraction * len(samples)))
+            return 1000 * samples[index]
+
+        return {
+            'fps': self.frames / elapsed if elapsed > 0 else 0.0,
+            'target_fps': 1 / self.base_period,
+            'effective_fps': 1 / self.period,
+            'frames': self.frames,
+            'skipped': self.skipped,
+            'jitter_p50': percentile(0.50),
+            'jitter_p95': percentile(0.95),
+            'jitter_p99': percentile(0.99)
+        }
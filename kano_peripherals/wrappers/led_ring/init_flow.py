@@ -20,6 +20,7 @@ class InitFlow(BaseAnimation):
     This is a wrapper over Pi Hat and LED Speaker.
     """
 
+    NAME = 'init-flow'
     LOCK_PRIORITY = 2
 
     def __init__(self):
@@ -37,21 +38,23 @@ class InitFlow(BaseAnimation):
             rc - int value with return code or None if no errors occured
         """
 
+        # Lazy import to avoid loading numpy when only stopping the animation.
+        from kano_peripherals.wrappers.led_ring import expression
+
         # Connect to the DBus interface of a board with an LED ring.
         if not self.connect():
             logger.error('LED Ring: InitFlow: Could not aquire dbus interface!')
             return RC_FAILED_ANIM_GET_DBUS
 
         # Lock the API so anything below doesn't override our calls.
-        locked = self.iface.lock(self.LOCK_PRIORITY)
+        locked = self.lock(self.LOCK_PRIORITY)
         if not locked:
             logger.error('LED Ring: InitFlow: Could not lock dbus interface!')
             return RC_FAILED_LOCKING_API
 
         # Setup the animation parameters and run the loop.
-        vf = self.rotate(self.colour_wheel, cycles)
-        vf2 = self.pulse(vf)
-        self.animate(vf2, duration, 1.0, update_rate=0.005)
+        vf = expression.pulse(expression.rotate(expression.colour_wheel(), cycles))
+        self.animate(vf, duration, 1.0, update_rate=0.005)
 
         # Make sure to turn off the LEDs at the end and unlock the API.
         self.iface.set_leds_off()
@@ -65,4 +68,4 @@ class InitFlow(BaseAnimation):
         """
         Stop the animation loop and terminate process.
         """
-        super(InitFlow, InitFlow).stop('init-flow')
+        super(InitFlow, InitFlow).stop(InitFlow.NAME)
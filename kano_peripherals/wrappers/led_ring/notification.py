@@ -24,6 +24,7 @@ class Notification(BaseAnimation):
     This is a wrapper over Pi Hat and LED Speaker.
     """
 
+    NAME = 'notification'
     LOCK_PRIORITY = 3
 
     def __init__(self):
@@ -40,20 +41,23 @@ class Notification(BaseAnimation):
             rc - int value with return code or None if no errors occured
         """
 
+        # Lazy import to avoid loading numpy when only stopping the animation.
+        from kano_peripherals.wrappers.led_ring import expression
+
         # Connect to the DBus interface of a board with an LED ring.
         if not self.connect():
             logger.error('LED Ring: Notification: Could not aquire dbus interface!')
             return RC_FAILED_ANIM_GET_DBUS
 
         # Lock the API so anything below doesn't override our calls.
-        locked = self.iface.lock(self.LOCK_PRIORITY)
+        locked = self.lock(self.LOCK_PRIORITY)
         if not locked:
             logger.error('LED Ring: Notification: Could not lock dbus interface!')
             return RC_FAILED_LOCKING_API
 
         # Setup the animation parameters and run the loop.
         colours1, colours2 = self._get_notification_colours(spec, self.iface.get_num_leds())
-        vf = self.pulse(self.constant(colours1), self.constant(colours2))
+        vf = expression.pulse(expression.constant(colours1), expression.constant(colours2))
         self.animate(vf, 60 * 60, 60 * 60 / 2, update_rate=0.005)
 
         # Make sure to turn off the LEDs at the end and unlock the API.
@@ -68,7 +72,7 @@ class Notification(BaseAnimation):
         """
         Stop the animation loop and terminate process.
         """
-        super(Notification, Notification).stop('notification')
+        super(Notification, Notification).stop(Notification.NAME)
 
     def _get_notification_colours(self, spec, num_leds):
         """ """
@@ -0,0 +1,278 @@
+# primitives.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Array-backed building blocks for LED ring animations.
+#
+# There are two kinds of functions built here:
+#
+#   colour functions - map an array of phases of any shape to an array of the
+#                      same shape plus a last axis of 3 (r, g, b), e.g. colour_wheel
+#   frame functions  - map a phase, or an array of K phases, to an (N, 3), or a
+#                      (K, N, 3), float array of LED values for N LEDs
+#
+# Every primitive is a single vectorised expression over all the LEDs, and over
+# all the phases when given several, so that whole cycles can be computed at once.
+# The closure based API of BaseAnimation is an adapter over these.
+
+
+import numpy as np
+
+from kano_peripherals.led_frame import MAX_LEVEL
+
+
+def vectorised(fn):
+    """
+    Mark a colour or frame function as taking and returning arrays.
+
+    Args:
+        fn - callable to mark
+
+    Returns:
+        fn - the same callable
+    """
+    fn.vectorised = True
+    return fn
+
+
+def is_vectorised(fn):
+    """
+    Check whether a function was marked with vectorised().
+    """
+    return getattr(fn, 'vectorised', False)
+
+
+def as_colour_function(colour_func):
+    """
+    Adapt a colour function working on a single phase and returning an (r, g, b)
+    tuple, e.g. from users of the older API, to work on arrays.
+
+    Args:
+        colour_func - callable mapping a float phase to an (r, g, b) tuple
+
+    Returns:
+        colour_func - vectorised colour function
+    """
+    if is_vectorised(colour_func):
+        return colour_func
+
+    @vectorised
+    def array_colour_func(phases):
+        phases = np.asarray(phases, dtype=float)
+        colours = np.array([colour_func(phase) for phase in phases.ravel()], dtype=float)
+        return colours.reshape(phases.shape + (3,))
+
+    return array_colour_func
+
+
+def as_frame_function(frame_func):
+    """
+    Adapt a frame function working on a single phase and returning a list of
+    (r, g, b) tuples, e.g. from users of the older API, to work on arrays.
+
+    Args:
+        frame_func - callable mapping a float phase to a list of (r, g, b) tuples
+
+    Returns:
+        frame_func - vectorised frame function
+    """
+    if is_vectorised(frame_func):
+        return frame_func
+
+    @vectorised
+    def array_frame_func(phase):
+        phase = np.asarray(phase, dtype=float)
+        if not phase.ndim:
+            return np.asarray(frame_func(float(phase)), dtype=float)
+
+        return np.array([frame_func(value) for value in phase], dtype=float)
+
+    return array_frame_func
+
+
+def to_leds(frame):
+    """
+    Convert a single frame to the list of (r, g, b) tuples expected by the
+    board services over D-Bus.
+
+    Args:
+        frame - (N, 3) array or list of (r, g, b) tuples
+
+    Returns:
+        leds - list of (r, g, b) tuples of floats
+    """
+    if isinstance(frame, np.ndarray):
+        return [tuple(led) for led in frame.tolist()]
+
+    return frame
+
+
+def quantise(frame, levels):
+    """
+    Quantise a frame to the output levels of a board, so that frames which would
+    look the same compare equal.
+
+    Args:
+        frame  - (..., N, 3) array or list of (r, g, b) tuples
+        levels - int number of output levels of each colour channel
+
+    Returns:
+        frame - array of the same shape of int levels from 0 to levels - 1
+    """
+    frame = np.clip(np.asarray(frame, dtype=float), 0.0, 1.0)
+    return np.rint(frame * (levels - 1)).astype(np.int32)
+
+
+def to_packed(frame, levels):
+    """
+    Convert a quantised frame to the packed form of a Frame, taken by the
+    set_all_leds_packed methods of the board services, see the led_frame module.
+
+    Args:
+        frame  - (N, 3) array of int levels from 0 to levels - 1, see quantise()
+        levels - int number of output levels the frame was quantised to
+
+    Returns:
+        data - str of little endian 16 bit levels from 0 to MAX_LEVEL
+    """
+    scale = float(MAX_LEVEL) / (levels - 1)
+    return np.rint(np.asarray(frame) * scale).astype('<u2').tostring()
+
+
+@vectorised
+def colour_wheel(hue, saturation=1.0, value=1.0):
+    """
+    HSV colour wheel.
+
+    Args:
+        hue        - float or array of floats, the hue in [0, 1), wrapping around
+        saturation - float between 0.0 and 1.0
+        value      - float between 0.0 and 1.0
+
+    Returns:
+        colours - array with the shape of hue plus a last axis of (r, g, b)
+    """
+    hue6 = np.asarray(hue, dtype=float) * 6
+    sector = np.floor(hue6)
+    frac = hue6 - sector
+    sector = sector.astype(int) % 6
+
+    v = np.full_like(frac, value)
+    p = np.full_like(frac, value * (1 - saturation))
+    q = value * (1 - saturation * frac)
+    t = value * (1 - saturation * (1 - frac))
+
+    return np.stack([
+        np.choose(sector, [v, q, p, p, t, v]),
+        np.choose(sector, [t, v, v, q, p, p]),
+        np.choose(sector, [p, p, t, v, v, q])
+    ], axis=-1)
+
+
+def constant(values):
+    """
+    Frame function always returning the same LED values.
+
+    Args:
+        values - list of N (r, g, b) tuples
+
+    Returns:
+        frame_func - vectorised frame function
+    """
+    frame = np.asarray(values, dtype=float)
+
+    @vectorised
+    def frame_func(phase):
+        return np.broadcast_to(frame, np.shape(phase) + frame.shape)
+
+    return frame_func
+
+
+def rotate(colour_func, num_leds, phase_scale=1.0):
+    """
+    Frame function spreading a colour function around the ring and spinning it.
+
+    Args:
+        colour_func - colour function, e.g. colour_wheel
+        num_leds    - int N number of LEDs on the ring
+        phase_scale - float number of turns per cycle
+
+    Returns:
+        frame_func - vectorised frame function
+    """
+    colour_func = as_colour_function(colour_func)
+    offsets = np.arange(num_leds, dtype=float) / num_leds
+
+    @vectorised
+    def frame_func(phase):
+        phase = np.asarray(phase, dtype=float)[..., np.newaxis] * phase_scale
+        return colour_func(np.modf(phase + offsets)[0])
+
+    return frame_func
+
+
+def pulse(frame_func, frame_func2=None, num_leds=None):
+    """
+    Frame function fading from the second frame function into the first one
+    and back over a cycle.
+
+    Args:
+        frame_func  - frame function shown in the middle of the cycle
+        frame_func2 - frame function shown at the ends of the cycle, all LEDs
+                      off if None
+        num_leds    - int N number of LEDs, required if frame_func2 is None
+
+    Returns:
+        frame_func - vectorised frame function
+    """
+    frame_func = as_frame_function(frame_func)
+
+    if frame_func2 is None:
+        frame_func2 = constant([(0, 0, 0)] * num_leds)
+    frame_func2 = as_frame_function(frame_func2)
+
+    @vectorised
+    def pulse_func(phase):
+        phase = np.asarray(phase, dtype=float)
+
+        t = 2.0 * phase - 1   # in interval (-1, 1)
+        m = 1.0 - t * t       # concave between 0 and 1, 1 in the middle
+        m = m[..., np.newaxis, np.newaxis]
+
+        return frame_func(phase) * m + frame_func2(phase) * (1.0 - m)
+
+    return pulse_func
+
+
+def pulse_each(frame_func, led_speeds, frame_func2=None):
+    """
+    Frame function pulsing each LED at its own speed.
+
+    Args:
+        frame_func  - frame function shown in the middle of each LED cycle
+        led_speeds  - list of N numbers of cycles per cycle for each LED
+        frame_func2 - frame function shown at the ends of each LED cycle, all
+                      LEDs off if None
+
+    Returns:
+        frame_func - vectorised frame function
+    """
+    frame_func = as_frame_function(frame_func)
+    led_speeds = np.asarray(led_speeds, dtype=float)
+
+    if frame_func2 is None:
+        frame_func2 = constant([(0, 0, 0)] * len(led_speeds))
+    frame_func2 = as_frame_function(frame_func2)
+
+    @vectorised
+    def pulse_func(phase):
+        phase = np.asarray(phase, dtype=float)
+        phase_each = (phase[..., np.newaxis] * led_speeds) % 1
+
+        t = 2.0 * phase_each - 1
+        m = (1.0 - t * t)[..., np.newaxis]
+
+        return frame_func(phase) * m + frame_func2(phase) * (1.0 - m)
+
+    return pulse_func
@@ -0,0 +1,354 @@
+# timeline.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Keyframe timelines for LED ring animations, loaded from files.
+#
+# A timeline describes an effect as data rather than as a BaseAnimation subclass.
+# It is written as JSON with keyframes for groups of LEDs:
+#
+#     {
+#         "fps": 25,
+#         "duration": 2.0,
+#         "loops": 0,
+#         "leds": 10,
+#         "tracks": [
+#             {
+#                 "leds": "all",
+#                 "keyframes": [
+#                     {"time": 0.0, "colour": [0.0, 0.0, 0.0]},
+#                     {"time": 1.0, "colour": "#ff8000", "easing": "ease-in-out"},
+#                     {"time": 2.0, "colour": [0.0, 0.0, 0.0], "easing": "ease-in"}
+#                 ]
+#             },
+#             {
+#                 "leds": [0, 5],
+#                 "keyframes": [{"time": 0.0, "colour": [1.0, 1.0, 1.0]}]
+#             }
+#         ]
+#     }
+#
+#   fps      - frames per second the timeline is sampled and played at
+#   duration - seconds of a single loop
+#   loops    - number of times the timeline is played, 0 to loop forever
+#   leds     - number of LEDs on the ring
+#   tracks   - keyframes for the LEDs listed, or "all" of them. Later tracks are
+#              drawn over earlier ones and LEDs without a track are off.
+#
+# The easing of a keyframe shapes the transition from the previous one into it,
+# one of EASINGS. Colours are held before the first and after the last keyframe.
+#
+# The JSON is parsed once and sampled into a compact array of uint16 frames.
+# Timelines saved with save_timeline() are in a binary form which is memory
+# mapped by load_timeline(), so long ones are paged in as they are played
+# rather than read whole.
+#
+# Timelines are loaded by the root daemon on behalf of its clients, so only
+# regular files are read, JSON ones up to MAX_JSON_SIZE, and timelines are
+# limited to MAX_FRAMES.
+
+
+import os
+import json
+import stat
+import struct
+
+import numpy as np
+
+
+MAGIC = 'KLT1'
+VERSION = 1
+
+# magic, version, num_leds, num_frames, fps, loops
+HEADER = struct.Struct('<4sHHIfI')
+HEADER_SIZE = 32
+
+# The frames are stored as little endian uint16, 0 to MAX_VALUE for 0.0 to 1.0.
+FRAME_DTYPE = np.dtype('<u2')
+MAX_VALUE = 0xFFFF
+
+# The largest JSON description read and the most frames in a timeline, 10
+# minutes at 25 fps.
+MAX_JSON_SIZE = 1024 * 1024  # bytes
+MAX_FRAMES = 25 * 60 * 10
+
+
+def _ease_in(t):
+    return t * t
+
+
+def _ease_out(t):
+    return 1 - (1 - t) * (1 - t)
+
+
+def _ease_in_out(t):
+    return t * t * (3 - 2 * t)
+
+
+EASINGS = {
+    'linear': lambda t: t,
+    'step': np.floor,
+    'ease-in': _ease_in,
+    'ease-out': _ease_out,
+    'ease-in-out': _ease_in_out
+}
+
+
+class Timeline(object):
+    """
+    A sampled timeline, also a vectorised frame function over a single loop, see
+    the primitives module.
+    """
+
+    vectorised = True
+
+    def __init__(self, frames, fps, loops=1):
+        """
+        Constructor for the Timeline.
+
+        Args:
+            frames - (F, N, 3) uint16 array or memmap of F frames for N LEDs
+            fps    - float frames per second
+            loops  - int number of times the timeline is played, 0 for forever
+        """
+        super(Timeline, self).__init__()
+
+        self.frames = frames
+        self.fps = float(fps)
+        self.loops = int(loops)
+        self.num_frames, self.num_leds = frames.shape[:2]
+
+    def get_duration(self):
+        """
+        Get the length of a single loop.
+
+        Returns:
+            duration - float seconds
+        """
+        return self.num_frames / self.fps
+
+    def get_frame(self, index):
+        """
+        Get a frame by its index, wrapping around the loop.
+
+        Returns:
+            frame - (N, 3) float array
+        """
+        return self.frames[index % self.num_frames] * (1.0 / MAX_VALUE)
+
+    def __call__(self, phase):
+        phase = np.asarray(phase, dtype=float)
+        index = (np.modf(phase)[0] * self.num_frames).astype(int) % self.num_frames
+
+        return self.frames[index] * (1.0 / MAX_VALUE)
+
+
+def parse_timeline(data, num_leds=None):
+    """
+    Sample a timeline from its JSON description.
+
+    Args:
+        data     - dict as loaded from the JSON
+        num_leds - int number of LEDs to check the timeline against, if given
+
+    Returns:
+        timeline - Timeline object
+
+    Raises:
+        ValueError - if the data does not describe a valid timeline
+    """
+    try:
+        fps = float(data.get('fps', 25))
+        duration = float(data['duration'])
+        loops = int(data.get('loops', 1))
+        leds = int(data.get('leds', num_leds or 10))
+        tracks = list(data['tracks'])
+    except (TypeError, KeyError, AttributeError, ValueError) as e:
+        raise ValueError('Invalid LED timeline - [{}]'.format(e))
+
+    if fps <= 0 or duration <= 0 or loops < 0 or leds <= 0:
+        raise ValueError('Invalid LED timeline - fps, duration and leds must be positive')
+
+    if num_leds is not None and leds != num_leds:
+        raise ValueError('LED timeline is for {} LEDs, not {}'.format(leds, num_leds))
+
+    num_frames = max(1, int(round(duration * fps)))
+    if num_frames > MAX_FRAMES:
+        raise ValueError(
+            'LED timeline has {} frames, more than {}'.format(num_frames, MAX_FRAMES)
+        )
+
+    times = np.arange(num_frames, dtype=float) / fps
+    frames = np.zeros((num_frames, leds, 3))
+
+    for track in tracks:
+        if not isinstance(track, dict):
+            raise ValueError('Invalid LED timeline track - {}'.format(track))
+
+        indices = track.get('leds', 'all')
+        if indices == 'all':
+            indices = slice(None)
+        elif not isinstance(indices, list):
+            raise ValueError('LED timeline track leds must be a list - {}'.format(indices))
+        else:
+            try:
+                indices = [int(idx) for idx in indices]
+            except (TypeError, ValueError) as e:
+                raise ValueError('Invalid LED timeline track leds - [{}]'.format(e))
+
+            if any(not 0 <= idx < leds for idx in indices):
+                raise ValueError('LED timeline track out of range - {}'.format(indices))
+
+        frames[:, indices, :] = _sample_track(track.get('keyframes', []), times)[:, np.newaxis]
+
+    frames = np.rint(np.clip(frames, 0.0, 1.0) * MAX_VALUE).astype(FRAME_DTYPE)
+
+    return Timeline(frames, fps, loops)
+
+
+def _sample_track(keyframes, times):
+    """
+    Get the colours of a track at the given times.
+
+    Returns:
+        colours - (len(times), 3) float array
+    """
+    if not keyframes:
+        raise ValueError('LED timeline track has no keyframes')
+
+    try:
+        key_times = np.array([float(keyframe['time']) for keyframe in keyframes])
+        colours = np.array([_parse_colour(keyframe['colour']) for keyframe in keyframes])
+        easings = [EASINGS[keyframe.get('easing', 'linear')] for keyframe in keyframes]
+    except (TypeError, KeyError, AttributeError, ValueError) as e:
+        raise ValueError('Invalid LED timeline keyframe - [{}]'.format(e))
+
+    if np.any(np.diff(key_times) <= 0):
+        raise ValueError('LED timeline keyframes must be in increasing time order')
+
+    # The keyframe each time is heading to, 0 before the first one and
+    # len(keyframes) after the last one.
+    segment = np.searchsorted(key_times, times, side='right')
+
+    samples = np.empty((len(times), 3))
+    samples[segment == 0] = colours[0]
+    samples[segment == len(keyframes)] = colours[-1]
+
+    for idx in xrange(1, len(keyframes)):
+        selected = segment == idx
+        if not np.any(selected):
+            continue
+
+        span = key_times[idx] - key_times[idx - 1]
+        t = easings[idx]((times[selected] - key_times[idx - 1]) / span)
+
+        samples[selected] = colours[idx - 1] + (colours[idx] - colours[idx - 1]) * t[:, np.newaxis]
+
+    return samples
+
+
+def _parse_colour(colour):
+    """
+    Get an (r, g, b) tuple of floats from a list of floats or a '#rrggbb' str.
+    """
+    if isinstance(colour, basestring):
+        colour = colour.lstrip('#')
+        if len(colour) != 6:
+            raise ValueError('Colour {} is not #rrggbb'.format(colour))
+        return tuple(int(colour[idx:idx + 2], 16) / 255.0 for idx in (0, 2, 4))
+
+    red, green, blue = colour
+    return (float(red), float(green), float(blue))
+
+
+def save_timeline(timeline, path):
+    """
+    Write a sampled timeline in the binary form memory mapped by load_timeline().
+
+    Args:
+        timeline - Timeline object
+        path     - str path to the file to write
+    """
+    header = HEADER.pack(
+        MAGIC, VERSION, timeline.num_leds, timeline.num_frames, timeline.fps,
+        timeline.loops
+    )
+
+    with open(path, 'wb') as timeline_file:
+        timeline_file.write(header.ljust(HEADER_SIZE, '\0'))
+        np.ascontiguousarray(timeline.frames, dtype=FRAME_DTYPE).tofile(timeline_file)
+
+
+def load_timeline(path, num_leds=None):
+    """
+    Load a timeline from a JSON description, which is sampled, or from the binary
+    form written by save_timeline(), which is memory mapped. The path must be a
+    regular file, e.g. not a FIFO or a device.
+
+    Args:
+        path     - str path to the timeline file
+        num_leds - int number of LEDs to check the timeline against, if given
+
+    Returns:
+        timeline - Timeline object
+
+    Raises:
+        IOError    - if the file could not be read
+        ValueError - if the file does not describe a valid timeline
+    """
+    # Do not block on opening a FIFO, it is refused once open.
+    try:
+        fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    except OSError as e:
+        raise IOError(e.errno, e.strerror, path)
+
+    with os.fdopen(fd, 'rb') as timeline_file:
+        file_stat = os.fstat(fd)
+
+        if not stat.S_ISREG(file_stat.st_mode):
+            raise ValueError('LED timeline {} is not a regular file'.format(path))
+
+        header = timeline_file.read(HEADER_SIZE)
+
+        if not header.startswith(MAGIC):
+            if file_stat.st_size > MAX_JSON_SIZE:
+                raise ValueError(
+                    'LED timeline {} is larger than {} bytes'.format(path, MAX_JSON_SIZE)
+                )
+
+            timeline_file.seek(0)
+            return parse_timeline(json.loads(timeline_file.read(MAX_JSON_SIZE)), num_leds)
+
+        if len(header) < HEADER.size:
+            raise ValueError('LED timeline {} is truncated'.format(path))
+
+        magic, version, leds, num_frames, fps, loops = HEADER.unpack_from(header)
+
+        if version != VERSION:
+            raise ValueError('LED timeline version {} is not supported'.format(version))
+
+        # Also rejects a NaN frame rate.
+        if not fps > 0 or num_frames <= 0 or leds <= 0:
+            raise ValueError(
+                'Invalid LED timeline - fps, frames and leds must be positive'
+            )
+
+        if num_frames > MAX_FRAMES:
+            raise ValueError(
+                'LED timeline has {} frames, more than {}'.format(num_frames, MAX_FRAMES)
+            )
+
+        if file_stat.st_size < HEADER_SIZE + num_frames * leds * 3 * FRAME_DTYPE.itemsize:
+            raise ValueError('LED timeline {} is truncated'.format(path))
+
+        if num_leds is not None and leds != num_leds:
+            raise ValueError('LED timeline is for {} LEDs, not {}'.format(leds, num_leds))
+
+        # Map the file already opened, the path may have been replaced since.
+        frames = np.memmap(
+            timeline_file, dtype=FRAME_DTYPE, mode='r', offset=HEADER_SIZE,
+            shape=(num_frames, leds, 3)
+        )
+
+    return Timeline(frames, fps, loops)
@@ -0,0 +1,193 @@
+# timeline_animation.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Keyframe timeline animation that runs on either the Pi Hat or the LED Speaker.
+# The effect is given by a timeline file, see the timeline module.
+
+
+import os
+import dbus
+import dbus.exceptions
+
+from kano.logging import logger
+
+from kano_peripherals.wrappers.led_ring.base_animation import BaseAnimation
+from kano_peripherals.paths import BUS_NAME
+from kano_peripherals.return_codes import RC_FAILED_UNLOCKING_API, \
+    RC_FAILED_ANIM_GET_DBUS, RC_FAILED_LOCKING_API, RC_FAILED_LOADING_TIMELINE
+
+
+class TimelineAnimation(BaseAnimation):
+    """
+    Plays a timeline file on an LED ring board.
+    This is a wrapper over Pi Hat and LED Speaker.
+
+    By default the timeline is handed over to the board service and played in
+    the daemon, this process only holds the lock until it is done. It is streamed
+    through animate() when asked to or when the daemon does not play it.
+    """
+
+    NAME = 'timeline'
+    LOCK_PRIORITY = 2
+
+    # Used as the duration of timelines which loop forever.
+    FOREVER = 365 * 24 * 60 * 60  # seconds
+
+    def __init__(self):
+        super(TimelineAnimation, self).__init__()
+
+        self.is_finished = False
+
+    def start(self, path, local=False):
+        """
+        Start the animation loop.
+
+        Args:
+            path  - str path to the timeline file
+            local - bool whether to stream the frames rather than letting the
+                    daemon play them
+
+        Returns:
+            rc - int value with return code or None if no errors occured
+        """
+        path = os.path.abspath(path)
+
+        # Connect to the DBus interface of a board with an LED ring.
+        if not self.connect():
+            logger.error('LED Ring: TimelineAnimation: Could not aquire dbus interface!')
+            return RC_FAILED_ANIM_GET_DBUS
+
+        # Lock the API so anything below doesn't override our calls.
+        locked = self.lock(self.LOCK_PRIORITY)
+        if not locked:
+            logger.error('LED Ring: TimelineAnimation: Could not lock dbus interface!')
+            return RC_FAILED_LOCKING_API
+
+        if local or not self._play_in_daemon(path):
+            rc = self._play_locally(path)
+            if rc:
+                self.iface.unlock()
+                return rc
+
+        # Make sure to turn off the LEDs at the end and unlock the API.
+        self.iface.set_leds_off()
+        successful = self.iface.unlock()
+        if not successful:
+            logger.error('LED Ring: TimelineAnimation: Could not unlock dbus interface!')
+            return RC_FAILED_UNLOCKING_API
+
+    @staticmethod
+    def stop():
+        """
+        Stop the animation loop and terminate process.
+        """
+        super(TimelineAnimation, TimelineAnimation).stop(TimelineAnimation.NAME)
+
+    def _play_in_daemon(self, path):
+        """
+        Let the board service play the timeline and block until it is done or
+        the animation was interrupted. The daemon stopping it, e.g. when the lock
+        is lost or the daemon exits, is also waited for.
+
+        Returns:
+            True or False if the daemon played the timeline.
+        """
+        # Lazy import to avoid issue of importing from this module externally.
+        from gi.repository import GLib
+
+        bus = dbus.SystemBus()
+        matches = list()
+        owner_watch = None
+
+        try:
+            matches.append(self.iface.connect_to_signal(
+                'timeline_finished', self._on_timeline_finished
+            ))
+            matches.append(self.iface.connect_to_signal(
+                'lock_changed', self._on_timeline_lock_changed
+            ))
+
+            daemon_owner = bus.get_name_owner(BUS_NAME)
+            owner_watch = bus.watch_name_owner(
+                BUS_NAME, lambda owner: self._on_daemon_owner_changed(daemon_owner, owner)
+            )
+
+            playing = self.iface.play_timeline(path)
+        except dbus.exceptions.DBusException as e:
+            logger.warn(
+                'LED Ring: TimelineAnimation: Daemon cannot play timelines - [{}]'.format(e)
+            )
+            playing = False
+
+        if playing:
+            # Wake up periodically to be able to act on SIGINT.
+            context = GLib.MainContext.default()
+            wake_id = GLib.timeout_add(self.PREEMPTED_WAKE_RATE, lambda: True)
+
+            try:
+                while not self.is_finished and not self.interrupted:
+                    context.iteration(True)
+            finally:
+                GLib.source_remove(wake_id)
+
+        for match in matches:
+            match.remove()
+        if owner_watch is not None:
+            owner_watch.cancel()
+
+        return playing
+
+    def _play_locally(self, path):
+        """
+        Stream the frames of the timeline through animate().
+
+        Returns:
+            rc - int value with return code or None if no errors occured
+        """
+        # Lazy import to avoid loading numpy when only stopping the animation.
+        from kano_peripherals.wrappers.led_ring.timeline import load_timeline
+
+        try:
+            timeline = load_timeline(path, num_leds=self.iface.get_num_leds())
+        except (IOError, ValueError) as e:
+            logger.error(
+                'LED Ring: TimelineAnimation: Could not load {} - [{}]'.format(path, e)
+            )
+            return RC_FAILED_LOADING_TIMELINE
+
+        if timeline.loops:
+            duration = timeline.loops * timeline.get_duration()
+            cycles = timeline.loops
+        else:
+            duration = self.FOREVER
+            cycles = self.FOREVER / timeline.get_duration()
+
+        # The timeline is already sampled, it is not pre-rendered again.
+        self.animate(timeline, duration, cycles, update_rate=(1.0 / timeline.fps))
+
+    def _on_timeline_finished(self, owner):
+        """
+        Signal handler for the board service timeline_finished signal.
+        """
+        if owner == dbus.SystemBus().get_unique_name():
+            self.is_finished = True
+
+    def _on_timeline_lock_changed(self, top_priority, owner):
+        """
+        Signal handler for the board service lock_changed signal while the daemon
+        plays the timeline. It is stopped by the daemon when the lock is lost.
+        """
+        try:
+            self.is_finished = not self.iface.get_timeline_fps()
+        except dbus.exceptions.DBusException:
+            self.is_finished = True
+
+    def _on_daemon_owner_changed(self, daemon_owner, owner):
+        """
+        Callback for the name owner watch of the daemon, the timeline is gone
+        once the daemon playing it left the bus.
+        """
+        if owner != daemon_owner:
+            self.is_finished = True
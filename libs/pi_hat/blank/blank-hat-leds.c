@@ -0,0 +1,260 @@
+/**
+ *
+ * blank-hat-leds
+ *
+ * Copyright (C) 2018 Kano Computing Ltd.
+ * License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+ *
+ * Tool used as early in boot as possible to turn off the LEDs on the PiHat
+ * and LED Speaker due to manufacturing issues.
+ *
+ * Both boards are probed concurrently. The LED Speaker LEDs are active-low, the
+ * PCA9685 chips are blanked by holding all their outputs high with the all-LEDs
+ * full-ON bit, as SpeakerLed turns an LED off. The PiHat neopixel ring is blanked
+ * with a single frame of black when built with the ws2811 library, otherwise by
+ * running the Python turn-off-hat-leds for the PiHat only, when one is plugged in.
+ * The time taken is printed for the journal.
+ *
+ * Exit code is always 0, issues are only logged.
+ *
+ */
+
+#include <stdio.h>
+#include <stdint.h>
+#include <stdbool.h>
+#include <string.h>
+#include <unistd.h>
+#include <fcntl.h>
+#include <time.h>
+#include <spawn.h>
+#include <pthread.h>
+#include <sys/wait.h>
+#include <sys/ioctl.h>
+#include <linux/i2c.h>
+#include <linux/i2c-dev.h>
+
+#ifdef HAVE_WS2811
+#include <ws2811.h>
+#endif  // HAVE_WS2811
+
+#include <setup.h>
+#include <err.h>
+#include <ck2_lite_hat/ck2_lite_hat.h>
+
+
+#define I2C_BUS_PATH "/dev/i2c-1"  // Everything except early 256MB pi
+
+// LED Speaker Hardware Spec - Addresses of PCA9685 on bus
+#define SPEAKER_CHIP0_ADDR 0x40
+#define SPEAKER_NUM_CHIPS 2
+
+// PCA9685 registers of all outputs, bit 4 is full-ON and full-OFF respectively.
+// Full-OFF takes precedence so it is cleared, the outputs are then held high
+// which turns the active-low LEDs off.
+#define PCA9685_ALL_LED_ON_H 0xFB
+#define PCA9685_ALL_LED_OFF_H 0xFD
+#define PCA9685_FULL_ON 0x10
+
+// PiHat neopixel ring, as in kano_pi_hat.kano_hat_leds
+#define PI_HAT_LED_COUNT 10
+#define PI_HAT_LED_PIN 18
+#define PI_HAT_LED_DMA 10
+
+#ifndef HAVE_WS2811
+// Turns off the PiHat LEDs through the neopixel Python library instead
+#define PI_HAT_FALLBACK_PATH "/usr/bin/turn-off-hat-leds"
+extern char **environ;
+#endif  // HAVE_WS2811
+
+
+struct blank_result {
+    const char *name;
+    bool connected;
+    bool blanked;
+};
+
+
+static int i2c_write_quick(int fd)
+{
+    struct i2c_smbus_ioctl_data args = {
+        .read_write = I2C_SMBUS_WRITE,
+        .command = 0,
+        .size = I2C_SMBUS_QUICK,
+        .data = NULL
+    };
+
+    return ioctl(fd, I2C_SMBUS, &args);
+}
+
+
+/**
+ * There is no defined way to detect what is on the i2c bus, so like the
+ * SpeakerLed driver, the board is assumed present if both chips answer a
+ * quick write, which leaves them in the same state.
+ */
+static void *blank_speaker_leds(void *arg)
+{
+    struct blank_result *result = arg;
+    const uint8_t clear_full_off[] = {PCA9685_ALL_LED_OFF_H, 0};
+    const uint8_t full_on[] = {PCA9685_ALL_LED_ON_H, PCA9685_FULL_ON};
+    int chip;
+
+    const int fd = open(I2C_BUS_PATH, O_RDWR | O_CLOEXEC);
+    if (fd < 0) {
+        perror("blank-hat-leds: Could not open the i2c bus");
+        return NULL;
+    }
+
+    for (chip = 0; chip < SPEAKER_NUM_CHIPS; chip++) {
+        if (ioctl(fd, I2C_SLAVE, SPEAKER_CHIP0_ADDR + chip) < 0
+                || i2c_write_quick(fd) < 0) {
+            close(fd);
+            return NULL;
+        }
+    }
+
+    result->connected = true;
+    result->blanked = true;
+
+    for (chip = 0; chip < SPEAKER_NUM_CHIPS; chip++) {
+        if (ioctl(fd, I2C_SLAVE, SPEAKER_CHIP0_ADDR + chip) < 0
+                || write(fd, clear_full_off, sizeof(clear_full_off))
+                    != sizeof(clear_full_off)
+                || write(fd, full_on, sizeof(full_on)) != sizeof(full_on)) {
+            perror("blank-hat-leds: Could not turn off the LED Speaker");
+            result->blanked = false;
+        }
+    }
+
+    close(fd);
+    return NULL;
+}
+
+
+static bool draw_pi_hat_black(void)
+{
+#ifdef HAVE_WS2811
+    ws2811_t leds = {
+        .freq = WS2811_TARGET_FREQ,
+        .dmanum = PI_HAT_LED_DMA,
+        .channel = {
+            [0] = {
+                .gpionum = PI_HAT_LED_PIN,
+                .count = PI_HAT_LED_COUNT,
+                .invert = 0,
+                .brightness = 255,
+                .strip_type = WS2811_STRIP_GRB
+            },
+            [1] = {
+                .gpionum = 0,
+                .count = 0,
+                .invert = 0,
+                .brightness = 0
+            }
+        }
+    };
+
+    if (ws2811_init(&leds) != WS2811_SUCCESS) {
+        fprintf(stderr, "blank-hat-leds: Could not initialise the neopixels\n");
+        return false;
+    }
+
+    memset(leds.channel[0].leds, 0, PI_HAT_LED_COUNT * sizeof(ws2811_led_t));
+    const bool successful = ws2811_render(&leds) == WS2811_SUCCESS;
+
+    ws2811_fini(&leds);
+    return successful;
+#else
+    char *const args[] = {PI_HAT_FALLBACK_PATH, "--pi-hat", NULL};
+    pid_t pid;
+    int status;
+
+    if (posix_spawn(&pid, PI_HAT_FALLBACK_PATH, NULL, NULL, args, environ) != 0) {
+        fprintf(stderr, "blank-hat-leds: Built without ws2811 and could not run "
+                PI_HAT_FALLBACK_PATH ", PiHat LEDs left on\n");
+        return false;
+    }
+
+    if (waitpid(pid, &status, 0) != pid) {
+        return false;
+    }
+
+    return WIFEXITED(status) && WEXITSTATUS(status) == 0;
+#endif  // HAVE_WS2811
+}
+
+
+static void *blank_pi_hat(void *arg)
+{
+    struct blank_result *result = arg;
+
+    if (initialise() != SUCCESS) {
+        return NULL;
+    }
+
+    result->connected = is_ck2_lite_connected();
+    clean_up();
+
+    if (result->connected) {
+        result->blanked = draw_pi_hat_black();
+    }
+
+    return NULL;
+}
+
+
+static double elapsed_ms(const struct timespec *start)
+{
+    struct timespec now;
+
+    clock_gettime(CLOCK_MONOTONIC, &now);
+    return (now.tv_sec - start->tv_sec) * 1000.0
+        + (now.tv_nsec - start->tv_nsec) / 1000000.0;
+}
+
+
+int main(int argc, char **argv)
+{
+    struct timespec start;
+    struct blank_result results[] = {
+        {.name = "PiHat", .connected = false, .blanked = false},
+        {.name = "LED Speaker", .connected = false, .blanked = false}
+    };
+    void *(*routines[])(void *) = {blank_pi_hat, blank_speaker_leds};
+    pthread_t threads[2];
+    bool started[2] = {false, false};
+    int i;
+
+    if (argc > 1 && !strcmp(argv[1], "-h")) {
+        printf("blank-hat-leds turns off the LEDs of the PiHat and LED Speaker\n");
+        return 0;
+    }
+
+    clock_gettime(CLOCK_MONOTONIC, &start);
+
+    for (i = 0; i < 2; i++) {
+        started[i] = pthread_create(&threads[i], NULL, routines[i], &results[i]) == 0;
+
+        // Still blank the board, just not concurrently.
+        if (!started[i]) {
+            routines[i](&results[i]);
+        }
+    }
+
+    for (i = 0; i < 2; i++) {
+        if (started[i]) {
+            pthread_join(threads[i], NULL);
+        }
+    }
+
+    for (i = 0; i < 2; i++) {
+        if (results[i].connected) {
+            printf("blank-hat-leds: %s %s\n", results[i].name,
+                   results[i].blanked ? "LEDs turned off" : "LEDs could not be turned off");
+        }
+    }
+
+    printf("blank-hat-leds: Done in %.1f ms\n", elapsed_ms(&start));
+
+    return 0;
+}
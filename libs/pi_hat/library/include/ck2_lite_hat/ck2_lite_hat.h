@@ -22,6 +22,7 @@
 int initialise_ck2_lite(void);
 void clean_up_ck2_lite(void);
 bool is_ck2_lite_connected(void);
+int probe_ck2_lite(void);
 
 
 #endif  // __KANO_HAT_H__
@@ -23,6 +23,7 @@
 int initialise_ck2_pro(void);
 void clean_up_ck2_pro(void);
 bool is_ck2_pro_connected(void);
+int probe_ck2_pro(void);
 
 
 #endif  // __CK2_PRO_HAT_H__
@@ -59,6 +59,7 @@ static const struct detection_pins DETECTION_PINS = {
 int initialise_detection();
 int clean_up_detection();
 int is_hat_connected(union detection_pin_state *signature);
+int get_detection_event_fd(void);
 
 
 #endif  // __DETECTION_H__
@@ -25,6 +25,8 @@
 
 int initialise(void);
 int clean_up(void);
+int begin_probe(void);
+int end_probe(void);
 
 
 #endif  // __SETUP_H__
@@ -23,8 +23,12 @@ class KanoHat(object):
         self.callbacks = list()
         self.libkano_hat = None
 
+    def load(self):
+        if self.libkano_hat is None:
+            self.libkano_hat = load_libkano_hat()
+
     def initialise(self):
-        self.libkano_hat = load_libkano_hat()
+        self.load()
         return self.libkano_hat.initialise_ck2_lite()
 
     def clean_up(self):
@@ -34,6 +38,13 @@ class KanoHat(object):
     def is_connected(self):
         return self.libkano_hat.is_ck2_lite_connected() == 1
 
+    def probe(self):
+        self.load()
+        return self.libkano_hat.probe_ck2_lite()
+
+    def get_detection_event_fd(self):
+        return self.libkano_hat.get_detection_event_fd()
+
     def register_power_off_cb(self, power_off_fn):
         c_power_off_fn = ctypes.CFUNCTYPE(restype=None)(power_off_fn)
         self.callbacks.append(c_power_off_fn)
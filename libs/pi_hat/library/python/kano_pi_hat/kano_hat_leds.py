@@ -15,7 +15,21 @@ class KanoHatLeds(KanoHat):
     LED_COUNT = 10
     LED_PIN = 18
 
-    def __init__(self, brightness=150):
+    # The number of entries of the per-channel lookup tables from intensity values
+    # to the 8 bit values sent to the neopixels.
+    LUT_SIZE = 1024
+
+    # The top level of the 16 bit intensity levels taken by quantise_levels.
+    MAX_LEVEL = 0xFFFF
+
+    def __init__(self, brightness=150, calibration=None):
+        """
+        Args:
+            brightness  - int from 0 to 255 scaling all the LED values
+            calibration - dict with the 'red', 'green' and 'blue' correction
+                          factors and 'gamma' of the colour calibration profile
+                          of the board, as kano_peripherals.led_calibration
+        """
         # Pip install rpi_ws281x
         #
         # NB: Do this import inside the constructor so that only tests which
@@ -31,6 +45,11 @@ class KanoHatLeds(KanoHat):
             dma=10
         )
 
+        self.calibration = dict()
+        self._luts = None
+        self._word_luts = None
+
+        self.set_calibration(calibration)
         self.set_brightness(brightness)
         self._leds.begin()
 
@@ -39,7 +58,7 @@ class KanoHatLeds(KanoHat):
             # TODO: Should we do something else?
             return False
 
-        red, green, blue = (int(channel * self.brightness) for channel in rgb)
+        red, green, blue = self.quantise(rgb)
         self._leds.setPixelColorRGB(num, red, green, blue)
 
         if show:
@@ -56,9 +75,95 @@ class KanoHatLeds(KanoHat):
 
         return True
 
+    def set_all_words(self, words, show=True):
+        """
+        Set all LEDs from their packed neopixel colours, see quantise_levels.
+        """
+        for idx, word in enumerate(words[:KanoHatLeds.LED_COUNT]):
+            self._leds.setPixelColor(idx, word)
+
+        if show:
+            self.draw()
+
+        return True
+
+    def quantise_levels(self, levels, words):
+        """
+        Get the packed neopixel colours for LED values given as flat 16 bit levels,
+        e.g. the array('H') of a kano_peripherals Frame, in place.
+
+        Args:
+            levels - sequence of int red, green, blue levels of each LED from 0
+                     to MAX_LEVEL
+            words  - mutable sequence, e.g. array('I'), of at least one int per
+                     LED which is set to the 24 bit colour of the LED
+
+        Returns:
+            words - the sequence given
+        """
+        last = self.LUT_SIZE - 1
+        half = self.MAX_LEVEL / 2
+        red, green, blue = self._word_luts
+
+        for idx in xrange(min(len(words), len(levels) / 3)):
+            base = idx * 3
+            r = red[(levels[base] * last + half) / self.MAX_LEVEL]
+            g = green[(levels[base + 1] * last + half) / self.MAX_LEVEL]
+            b = blue[(levels[base + 2] * last + half) / self.MAX_LEVEL]
+            words[idx] = r | g | b
+
+        return words
+
+    def quantise(self, rgb):
+        """
+        Get the 8 bit values sent to the neopixels for an LED value. Values giving
+        the same output look the same.
+        """
+        last = self.LUT_SIZE - 1
+
+        return tuple(
+            lut[int(min(max(channel, 0.0), 1.0) * last + 0.5)]
+            for lut, channel in zip(self._luts, rgb)
+        )
+
     def draw(self):
         self._leds.show()
 
     def set_brightness(self, brightness):
         self.brightness = brightness
-        self._leds.setBrightness(brightness)
+        self._build_luts()
+
+    def set_calibration(self, calibration=None):
+        self.calibration = {'red': 1.0, 'green': 1.0, 'blue': 1.0, 'gamma': 1.0}
+        self.calibration.update(calibration or dict())
+
+        if self._luts is not None:
+            self._build_luts()
+
+    def _build_luts(self):
+        # The brightness scales the values and is then applied again by the
+        # neopixel library. Both are folded into the tables, as the library would
+        # scale them, and the library brightness is left at full.
+        gamma = self.calibration['gamma']
+        last = float(self.LUT_SIZE - 1)
+        scale = self.brightness + 1
+
+        self._luts = [
+            [
+                (int(min(max(idx / last * factor, 0.0), 1.0) ** gamma * self.brightness) * scale) >> 8
+                for idx in xrange(self.LUT_SIZE)
+            ]
+            for factor in (
+                self.calibration['red'],
+                self.calibration['green'],
+                self.calibration['blue']
+            )
+        ]
+
+        # The same tables, shifted into place in the 24 bit colours.
+        self._word_luts = [
+            [value << shift for value in lut]
+            for lut, shift in zip(self._luts, (16, 8, 0))
+        ]
+
+        self._leds.setBrightness(255)
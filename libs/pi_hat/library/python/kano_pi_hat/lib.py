@@ -13,6 +13,10 @@ import ctypes
 
 HAT_LIB = 'libkano_hat.so'
 
+# Return codes from the library, see err.h
+SUCCESS = 0
+E_HAT_NOT_ATTACHED = 2
+
 
 def load_libkano_hat():
     try:
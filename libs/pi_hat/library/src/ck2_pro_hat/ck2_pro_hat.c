@@ -49,3 +49,25 @@ bool is_ck2_pro_connected(void)
 {
     return is_hat_connected(&CK2_PRO_DETECTION_SIGNATURE);
 }
+
+
+/**
+ * Checks whether the hat is plugged in with the library lock held only for the
+ * duration of the check, see begin_probe.
+ *
+ * Returns SUCCESS if the hat is attached, E_HAT_NOT_ATTACHED if not or
+ * E_LIBRARY_INITIALISED_ELSEWHERE if another process holds the lock.
+ */
+int probe_ck2_pro(void)
+{
+    const int rc = begin_probe();
+    if (rc != SUCCESS) {
+        return rc;
+    }
+
+    const bool is_connected = is_ck2_pro_connected();
+
+    end_probe();
+
+    return is_connected ? SUCCESS : E_HAT_NOT_ATTACHED;
+}
@@ -11,6 +11,9 @@
 
 
 #include <stdbool.h>
+#include <stdio.h>
+#include <fcntl.h>
+#include <unistd.h>
 #include <wiringPi.h>
 
 #include "callbacks.h"
@@ -22,6 +25,24 @@
 
 // TODO: Create an initialisation flag for this "module"
 
+/**
+ * Pipe written to from the detection pin interrupts. WiringPi cannot unregister
+ * an ISR, so once set up it is kept for the lifetime of the process.
+ */
+static int detection_event_pipe[2] = {-1, -1};
+
+/**
+ * Whether the detection pin interrupts were set up. A failure is final so that
+ * callers keep polling rather than relying on interrupts for some pins only.
+ */
+enum detection_events_state {
+    DETECTION_EVENTS_NOT_SET_UP,
+    DETECTION_EVENTS_READY,
+    DETECTION_EVENTS_FAILED
+};
+
+static enum detection_events_state detection_events = DETECTION_EVENTS_NOT_SET_UP;
+
 /**
  * Sets up the detection system.
  *
@@ -65,3 +86,123 @@ int is_hat_connected(union detection_pin_state *signature)
 {
     return read_detection_pins().value == signature->value;
 }
+
+
+/**
+ * ISR for the detection pins, runs on the WiringPi interrupt thread.
+ *
+ * Only a byte is written to the pipe so that the reader can check the
+ * detection from its own thread. The write end is non-blocking, a full pipe
+ * means an event is already pending.
+ */
+static void detection_pins_changed(void)
+{
+    const char event = 1;
+
+    if (write(detection_event_pipe[1], &event, sizeof(event)) == -1) {
+        return;
+    }
+}
+
+
+/**
+ * Exports a BCM pin through sysfs and sets it to trigger on both edges.
+ *
+ * WiringPi reports errors in wiringPiISR through wiringPiFailure(WPI_FATAL),
+ * which exits the process. Setting the edges here and checking the value file
+ * opens, as wiringPiISR does, lets a failure be returned instead.
+ *
+ * Returns true if wiringPiISR can be called with INT_EDGE_SETUP for the pin.
+ */
+static bool set_up_pin_edges(int pin)
+{
+    char path[64];
+    int fd;
+
+    // Fails with EBUSY when the pin is already exported, which is fine.
+    fd = open("/sys/class/gpio/export", O_WRONLY | O_CLOEXEC);
+    if (fd >= 0) {
+        dprintf(fd, "%d", pin);
+        close(fd);
+    }
+
+    snprintf(path, sizeof(path), "/sys/class/gpio/gpio%d/edge", pin);
+    fd = open(path, O_WRONLY | O_CLOEXEC);
+    if (fd < 0) {
+        return false;
+    }
+
+    const bool written = write(fd, "both", 4) == 4;
+    close(fd);
+
+    if (!written) {
+        return false;
+    }
+
+    snprintf(path, sizeof(path), "/sys/class/gpio/gpio%d/value", pin);
+    fd = open(path, O_RDWR | O_CLOEXEC);
+    if (fd < 0) {
+        return false;
+    }
+
+    close(fd);
+    return true;
+}
+
+
+/**
+ * Gets a file descriptor which becomes readable when any detection pin
+ * changes, e.g. when a hat is plugged in or unplugged. The reader should read
+ * all pending bytes and then check the detection. Must be called after the
+ * library was initialised.
+ *
+ * Returns the read end of the event pipe or -1 on failure, in which case every
+ * later call fails too and the detection should be polled.
+ */
+int get_detection_event_fd(void)
+{
+    if (detection_events == DETECTION_EVENTS_READY) {
+        return detection_event_pipe[0];
+    }
+
+    if (detection_events == DETECTION_EVENTS_FAILED) {
+        return -1;
+    }
+
+    const unsigned char pins[] = {
+        DETECTION_PINS.pin_1,
+        DETECTION_PINS.pin_2,
+        DETECTION_PINS.pin_3,
+        DETECTION_PINS.pin_4,
+        DETECTION_PINS.pin_5
+    };
+
+    // Check all the pins before any interrupt is set up, those cannot be undone.
+    for (int i = 0; i < sizeof(pins) / sizeof(pins[0]); i++) {
+        if (!set_up_pin_edges(pins[i])) {
+            detection_events = DETECTION_EVENTS_FAILED;
+            return -1;
+        }
+    }
+
+    if (pipe(detection_event_pipe) == -1) {
+        detection_events = DETECTION_EVENTS_FAILED;
+        return -1;
+    }
+
+    for (int i = 0; i < 2; i++) {
+        fcntl(detection_event_pipe[i], F_SETFL, O_NONBLOCK);
+        fcntl(detection_event_pipe[i], F_SETFD, FD_CLOEXEC);
+    }
+
+    for (int i = 0; i < sizeof(pins) / sizeof(pins[0]); i++) {
+        if (wiringPiISR(pins[i], INT_EDGE_SETUP, &detection_pins_changed) < 0) {
+            // Pins set up so far keep writing into the pipe, keep it open.
+            detection_events = DETECTION_EVENTS_FAILED;
+            return -1;
+        }
+    }
+
+    detection_events = DETECTION_EVENTS_READY;
+    return detection_event_pipe[0];
+}
@@ -11,12 +11,14 @@
 
 
 #include <stdbool.h>
+#include <pthread.h>
 #include <unistd.h>
 #include <stdio.h>
 
 #include <wiringPi.h>
 
 #include "setup.h"
+#include "detection.h"
 #include "err.h"
 #include "lock.h"
 #include "power_button.h"
@@ -24,17 +26,34 @@
 
 // TODO: Create an initialisation flag for this "module"
 
-int initialise(void)
-{
-    switch (get_lock()) {
-    case E_COULD_NOT_GET_LOCK:
-        perror("Library is already in use");
-        return E_LIBRARY_INITIALISED_ELSEWHERE;
-    case E_ALREADY_INITIALISED:
-        printf("Don't need to init, already done\n");
-        return SUCCESS;
-    }
+/**
+ * Guards the counters below and the lock, pin and detection set up. The hat
+ * services initialise the library on the main thread while the device
+ * discovery probes it from a worker thread.
+ */
+static pthread_mutex_t setup_mutex = PTHREAD_MUTEX_INITIALIZER;
+
+/**
+ * The number of initialise calls not yet matched by clean_up in this process.
+ * Initialising again only counts the user, e.g. a second hat service, and the
+ * library is only cleaned up by the last user.
+ */
+static int users = 0;
+
+/**
+ * The number of probes in progress in this process. The lock is held while
+ * there is any user or probe and released by the last of them.
+ */
+static int probes = 0;
+
 
+/**
+ * Sets up WiringPi once for the lifetime of the process.
+ *
+ * Must be called with the setup_mutex held.
+ */
+static void set_up_wiring_pi(void)
+{
     static bool is_setup = false;
 
     if (!is_setup) {
@@ -45,17 +64,120 @@ int initialise(void)
 #endif
         is_setup = true;
     }
+}
+
+
+int initialise(void)
+{
+    pthread_mutex_lock(&setup_mutex);
+
+    if (users > 0) {
+        users++;
+        pthread_mutex_unlock(&setup_mutex);
+        return SUCCESS;
+    }
+
+    // A probe in progress already holds the lock.
+    if (probes == 0) {
+        switch (get_lock()) {
+        case E_COULD_NOT_GET_LOCK:
+            perror("Library is already in use");
+            pthread_mutex_unlock(&setup_mutex);
+            return E_LIBRARY_INITIALISED_ELSEWHERE;
+        case E_ALREADY_INITIALISED:
+            printf("Don't need to init, already done\n");
+            pthread_mutex_unlock(&setup_mutex);
+            return SUCCESS;
+        }
+    }
+
+    set_up_wiring_pi();
 
     initialise_detection();
     initialise_power_button();
 
+    users = 1;
+
+    pthread_mutex_unlock(&setup_mutex);
+
     return SUCCESS;
 }
 
 
 int clean_up(void)
 {
+    pthread_mutex_lock(&setup_mutex);
+
+    if (users > 1) {
+        users--;
+        pthread_mutex_unlock(&setup_mutex);
+        return SUCCESS;
+    }
+
+    users = 0;
+
     clean_up_detection();
     clean_up_power_button();
-    release_lock();
+
+    if (probes == 0) {
+        release_lock();
+    }
+
+    pthread_mutex_unlock(&setup_mutex);
+
+    return SUCCESS;
+}
+
+
+/**
+ * Takes the library lock for a probe of the detection pins.
+ *
+ * Unlike initialise, the pins are only set up on the first probe and the power
+ * button is left alone, so a probe can be repeated cheaply. Every successful
+ * call must be matched by end_probe, which releases the lock unless the
+ * library is still in use.
+ *
+ * Fails with E_LIBRARY_INITIALISED_ELSEWHERE if another process holds the lock.
+ */
+int begin_probe(void)
+{
+    static bool is_detection_setup = false;
+
+    pthread_mutex_lock(&setup_mutex);
+
+    if (users == 0 && probes == 0 && get_lock() == E_COULD_NOT_GET_LOCK) {
+        pthread_mutex_unlock(&setup_mutex);
+        return E_LIBRARY_INITIALISED_ELSEWHERE;
+    }
+
+    set_up_wiring_pi();
+
+    if (!is_detection_setup) {
+        initialise_detection();
+        is_detection_setup = true;
+    }
+
+    probes++;
+
+    pthread_mutex_unlock(&setup_mutex);
+
+    return SUCCESS;
+}
+
+
+int end_probe(void)
+{
+    pthread_mutex_lock(&setup_mutex);
+
+    if (probes > 0) {
+        probes--;
+    }
+
+    if (users == 0 && probes == 0) {
+        release_lock();
+    }
+
+    pthread_mutex_unlock(&setup_mutex);
+
+    return SUCCESS;
 }
@@ -0,0 +1,143 @@
+#
+# test_animation_frame_cost.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Per frame CPU cost of the LED ring animation primitives.
+#
+# The chains are the ones used by InitFlow (rotate then pulse) and CpuMonitor
+# (pulse_each over a constant), evaluated one frame at a time as in animate()
+# and for a whole cycle at once, and the frames they send to the daemon.
+#
+
+import time
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from kano_peripherals.wrappers.led_ring import primitives
+
+
+NUM_LEDS = 10
+FRAMES = 2000
+
+# CPU time budget in microseconds per frame, animations run at up to 200 fps.
+FRAME_BUDGET = 250
+
+
+def init_flow_chain():
+    return primitives.pulse(
+        primitives.rotate(primitives.colour_wheel, NUM_LEDS, 4.0), num_leds=NUM_LEDS
+    )
+
+
+def cpu_monitor_chain():
+    led_speeds = [0.1 * (idx % 4) for idx in xrange(NUM_LEDS)]
+    return primitives.pulse_each(
+        primitives.constant([(1.0, 0.4, 0.0)] * NUM_LEDS), led_speeds
+    )
+
+
+def cpu_per_frame(routine, frames=FRAMES):
+    start = time.clock()
+    routine()
+    return 1e6 * (time.clock() - start) / frames
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('make_chain', [init_flow_chain, cpu_monitor_chain])
+def test_frame_cost_is_within_budget(make_chain):
+    frame_func = make_chain()
+    phases = np.arange(FRAMES, dtype=float) / FRAMES
+
+    def single_frames():
+        for phase in phases:
+            primitives.to_leds(frame_func(phase))
+
+    single = cpu_per_frame(single_frames)
+    batch = cpu_per_frame(lambda: frame_func(phases))
+
+    print '{}: {:.1f} us per frame, {:.2f} us per frame for a whole cycle'.format(
+        make_chain.__name__, single, batch
+    )
+
+    assert single <= FRAME_BUDGET
+    assert batch < single
+    assert frame_func(phases).shape == (FRAMES, NUM_LEDS, 3)
+
+
+@pytest.mark.benchmark
+def test_notification_render_cpu_per_hour_with_frame_cache():
+    from kano_peripherals.wrappers.led_ring.frame_cache import FrameCache
+
+    # Notification plays 60 * 60 / 2 cycles over an hour at 200 fps.
+    duration, cycles, update_rate = 60 * 60, 60 * 60 / 2, 0.005
+    frames_per_hour = int(duration / update_rate)
+    frames_per_cycle = duration / float(cycles) / update_rate
+    sampled_frames = 20000
+
+    colours1 = [(1.0, 0.0, 0.0)] * NUM_LEDS
+    colours2 = [(0.0, 0.0, 0.0)] * NUM_LEDS
+    phases = [
+        (frame * cycles / float(frames_per_hour)) % 1.0
+        for frame in xrange(sampled_frames)
+    ]
+
+    def play(use_cache):
+        frame_func = primitives.pulse(
+            primitives.constant(colours1), primitives.constant(colours2)
+        )
+        if use_cache:
+            frame_func = FrameCache().get_table(
+                ('notification', tuple(colours1), tuple(colours2)),
+                frame_func, frames_per_cycle
+            )
+
+        for phase in phases:
+            primitives.to_leds(frame_func(phase))
+
+    scale = float(frames_per_hour) / sampled_frames
+    uncached = cpu_per_frame(lambda: play(False), 1) * scale / 1e6
+    cached = cpu_per_frame(lambda: play(True), 1) * scale / 1e6
+
+    print 'notification: {:.1f} s CPU per hour uncached, {:.1f} s cached'.format(
+        uncached, cached
+    )
+
+    assert cached < uncached
+
+
+
+
+@pytest.mark.benchmark
+def test_quantised_frames_save_daemon_calls():
+    # A call of animate() by Notification, 1 cycle at 200 fps, and by CpuMonitor
+    # on an idle system, 2.5 cycles at 25 fps with one process at 0.1% CPU, on
+    # the 8 bit PiHat.
+    levels = 256
+    notification = primitives.pulse(
+        primitives.constant([(1.0, 0.0, 0.0)] * NUM_LEDS), num_leds=NUM_LEDS
+    )
+    cpu_monitor = primitives.pulse_each(
+        primitives.constant([(1.0, 0.4, 0.0)] * NUM_LEDS),
+        [0.01] + [0.0] * (NUM_LEDS - 1)
+    )
+    dropped = dict()
+
+    for name, frame_func, frames, cycles in [
+            ('notification', notification, 400, 1.0),
+            ('cpu_monitor', cpu_monitor, 125, 2.5)]:
+        phases = np.modf(np.arange(frames, dtype=float) * cycles / frames)[0]
+        quantised = primitives.quantise(frame_func(phases), levels)
+
+        changed = np.any(quantised[1:] != quantised[:-1], axis=(1, 2))
+        dropped[name] = frames - 1 - np.count_nonzero(changed)
+
+        print '{} at {} levels: {} of {} frames dropped'.format(
+            name, levels, dropped[name], frames
+        )
+
+    assert dropped['notification'] > 0
+    assert dropped['cpu_monitor'] > 0
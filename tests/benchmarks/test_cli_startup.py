@@ -0,0 +1,102 @@
+#
+# test_cli_startup.py
+#
+# Copyright (C) 2018 Kano Computing Ltd.
+# License: http://www.gnu.org/licenses/gpl-2.0.txt GNU GPL v2
+#
+# Cold start budgets for the subcommands of kano-speakerleds.
+#
+# Every measurement runs in a fresh interpreter which loads the script and then
+# imports what the subcommand needs, without talking to the daemon.
+#
+
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+
+# The Kano runtime and D-Bus are only installed on a Kano OS image, without them
+# the subcommands cannot be imported at all. Any other import failure is a bug.
+for runtime_module in ['kano', 'kano_settings', 'dbus', 'docopt', 'numpy']:
+    pytest.importorskip(runtime_module)
+
+
+REPO_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+SCRIPT_PATH = os.path.join(REPO_PATH, 'bin', 'kano-speakerleds')
+
+RUNS = 5
+
+# Modules imported by each subcommand and its budget in milliseconds.
+SUBCOMMANDS = {
+    'detect': (['kano_peripherals.wrappers.detection'], 150),
+    'off': (['kano_peripherals.wrappers.led_ring.base_animation'], 300),
+    'cpu-monitor': (['kano_peripherals.wrappers.led_ring.cpu_monitor'], 400),
+    'init-flow': (['kano_peripherals.wrappers.led_ring.init_flow'], 400),
+    'notification': (['kano_peripherals.wrappers.led_ring.notification'], 400),
+    'timeline': (['kano_peripherals.wrappers.led_ring.timeline_animation'], 400),
+}
+
+# Modules which the script should not pull in before a subcommand runs, nor
+# should detect which only needs the daemon.
+HEAVY_MODULES = ['kano_settings', 'kano_peripherals.wrappers.led_ring.base_animation']
+
+STARTUP_SCRIPT = """
+import sys
+import imp
+import json
+import time
+import importlib
+
+start = time.time()
+imp.load_source('kano_speakerleds', {script!r})
+script_loaded = [name for name in {heavy!r} if name in sys.modules]
+for module in {modules!r}:
+    importlib.import_module(module)
+elapsed = time.time() - start
+loaded = [name for name in {heavy!r} if name in sys.modules]
+
+sys.stdout.write(json.dumps({{
+    'time': elapsed, 'script_loaded': script_loaded, 'loaded': loaded
+}}))
+"""
+
+
+def measure_startup(modules):
+    script = STARTUP_SCRIPT.format(
+        script=SCRIPT_PATH, heavy=HEAVY_MODULES, modules=modules
+    )
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [REPO_PATH] + [path for path in sys.path if path]
+    )
+
+    process = subprocess.Popen(
+        [sys.executable, '-c', script], env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    output, error = process.communicate()
+
+    assert process.returncode == 0, 'Could not import {}:\n{}'.format(
+        ', '.join(modules), error.strip()
+    )
+
+    return json.loads(output)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('subcommand', sorted(SUBCOMMANDS))
+def test_subcommand_cold_start_budget(subcommand):
+    modules, budget = SUBCOMMANDS[subcommand]
+
+    results = [measure_startup(modules) for dummy in xrange(RUNS)]
+    best = 1000 * min(result['time'] for result in results)
+
+    assert not results[0]['script_loaded']
+    if subcommand == 'detect':
+        assert not results[0]['loaded']
+    assert best <= budget, '{} took {:.1f} ms, budget is {} ms'.format(
+        subcommand, best, budget
+    )
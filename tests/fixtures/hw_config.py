@@ -3,6 +3,7 @@ import pytest
 
 from kano_peripherals.wrappers.detection import CKL_V_1_0_0, CKC_V_1_0_0, \
     CKC_V_1_1_0, CKT_V_1_0_0
+from kano_peripherals.paths import PI_HAT_OBJECT_PATH, CK2_PRO_HAT_OBJECT_PATH
 
 
 class HWConfig(object):
@@ -30,8 +31,8 @@ def hardware_config(request, monkeypatch, fs):
     '''
     Simulates the hardware configuration by mocking the
     `kano_settings.system.display.get_edid_name()`
-    function and overriding the `is_power_hat_plugged()` and
-    `is_pi_hat_plugged()` functions from `kano_peripherals.wrappers.detection`.
+    function and overriding the hat detection behind `is_power_hat_plugged()` and
+    `is_pi_hat_plugged()` in `kano_peripherals.wrappers.detection`.
 
     Returns:
         HWConfig: The hardware configuration simulated
@@ -48,16 +49,14 @@ def hardware_config(request, monkeypatch, fs):
 
     # Reimport to allow the get_edid_name patch to permeate for each parameter
     imp.reload(kano_peripherals.wrappers.detection)
+    plugged_hats = {
+        PI_HAT_OBJECT_PATH: hw.kit == HWConfig.CKL,
+        CK2_PRO_HAT_OBJECT_PATH: hw.kit == HWConfig.CKC or hw.kit == HWConfig.CKT
+    }
     monkeypatch.setattr(
         kano_peripherals.wrappers.detection,
-        'is_pi_hat_plugged',
-        lambda with_dbus, retry_count: hw.kit == HWConfig.CKL
-    )
-    monkeypatch.setattr(
-        kano_peripherals.wrappers.detection,
-        'is_power_hat_plugged',
-        lambda with_dbus, retry_count: \
-            hw.kit == HWConfig.CKC or hw.kit == HWConfig.CKT
+        '_detect_hat',
+        lambda object_path, with_dbus, retry_count: plugged_hats[object_path]
     )
 
     return hw
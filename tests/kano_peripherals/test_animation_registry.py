@@ -0,0 +1,47 @@
+import errno
+import signal
+
+from kano_peripherals.animation_registry import AnimationRegistry
+
+
+class FakeWatch(object):
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+def test_stop_signals_only_the_named_animation():
+    signalled = list()
+    registry = AnimationRegistry(kill=lambda pid, signum: signalled.append((pid, signum)))
+    registry.register(':1.10', 'cpu-monitor', 100)
+    registry.register(':1.11', 'notification', 101)
+
+    assert registry.stop('notification') == 1
+    assert signalled == [(101, signal.SIGINT)]
+
+    assert registry.stop('') == 2
+
+
+def test_registering_again_replaces_and_cancels_the_watch():
+    registry = AnimationRegistry(kill=lambda pid, signum: None)
+    watch = FakeWatch()
+    registry.register(':1.10', 'init-flow', 100, watch)
+    registry.register(':1.10', 'cpu-monitor', 100, FakeWatch())
+
+    assert watch.cancelled
+    assert registry.get_animations() == [('cpu-monitor', 100)]
+
+
+def test_dead_process_is_pruned_on_stop():
+    def kill(pid, signum):
+        raise OSError(errno.ESRCH, 'No such process')
+
+    registry = AnimationRegistry(kill=kill)
+    watch = FakeWatch()
+    registry.register(':1.10', 'cpu-monitor', 100, watch)
+
+    assert registry.stop('cpu-monitor') == 0
+    assert not registry.get_animations()
+    assert watch.cancelled
@@ -0,0 +1,6 @@
+from kano_peripherals.clock import monotonic
+
+
+def test_monotonic_clock_moves_forward():
+    first = monotonic()
+    assert monotonic() >= first
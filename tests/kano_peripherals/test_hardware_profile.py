@@ -0,0 +1,98 @@
+import os
+import pytest
+
+from kano_peripherals import hardware_profile
+from kano_peripherals.paths import HARDWARE_PROFILE_PATH
+
+
+def set_boot_id(boot_id):
+    boot_id_dir = os.path.dirname(hardware_profile.BOOT_ID_PATH)
+    if not os.path.isdir(boot_id_dir):
+        os.makedirs(boot_id_dir)
+
+    with open(hardware_profile.BOOT_ID_PATH, 'w') as boot_id_file:
+        boot_id_file.write(boot_id + '\n')
+
+
+@pytest.fixture
+def boot(fs):
+    hardware_profile.invalidate_profile()
+    set_boot_id('boot-1')
+    os.makedirs(os.path.dirname(HARDWARE_PROFILE_PATH))
+
+    yield fs
+
+    hardware_profile.invalidate_profile()
+
+
+class Counter(object):
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+def test_value_is_computed_once_per_process(boot):
+    edid = Counter('HCK-HDMI')
+
+    assert hardware_profile.get_value('edid', edid) == 'HCK-HDMI'
+    assert hardware_profile.get_value('edid', edid) == 'HCK-HDMI'
+    assert edid.calls == 1
+
+    # Only the daemon writes the profile.
+    assert not os.path.exists(HARDWARE_PROFILE_PATH)
+
+
+def test_saved_profile_is_read_by_other_processes(boot):
+    edid = Counter('HCK-HDMI')
+    hardware_profile.save_profile({'edid': 'CKT-HDMI'})
+
+    # Another process reading the stored profile.
+    hardware_profile._profile = None
+    assert hardware_profile.get_value('edid', edid) == 'CKT-HDMI'
+    assert edid.calls == 0
+    assert os.stat(HARDWARE_PROFILE_PATH).st_mode & 0777 == 0644
+
+
+def test_invalidated_profile_is_recomputed(boot):
+    pi_hat = Counter(True)
+
+    hardware_profile.save_profile({'pi_hat': False})
+    hardware_profile.get_value('pi_hat', pi_hat)
+    hardware_profile.invalidate_profile()
+    hardware_profile.get_value('pi_hat', pi_hat)
+
+    assert pi_hat.calls == 1
+
+
+def test_unknown_value_is_not_cached(boot):
+    pi_hat = Counter(None)
+
+    assert hardware_profile.get_value('pi_hat', pi_hat) is None
+    assert hardware_profile.get_value('pi_hat', pi_hat) is None
+    assert pi_hat.calls == 2
+
+
+def test_profile_from_another_boot_is_ignored(boot):
+    pi_hat = Counter(True)
+    hardware_profile.save_profile({'pi_hat': False})
+
+    set_boot_id('boot-2')
+    hardware_profile._profile = None
+
+    assert hardware_profile.get_value('pi_hat', pi_hat) is True
+    assert pi_hat.calls == 1
+
+
+def test_nothing_is_cached_without_boot_id(fs):
+    hardware_profile.invalidate_profile()
+    pi_hat = Counter(False)
+
+    hardware_profile.get_value('pi_hat', pi_hat)
+    hardware_profile.get_value('pi_hat', pi_hat)
+
+    assert pi_hat.calls == 2
+    assert not os.path.exists(HARDWARE_PROFILE_PATH)
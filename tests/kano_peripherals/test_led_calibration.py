@@ -0,0 +1,29 @@
+import json
+
+from kano_peripherals.led_calibration import load_calibration, save_calibration, \
+    get_factors, calibrate, DEFAULT_CALIBRATION
+
+
+def test_missing_profile_gives_no_correction(tmpdir):
+    calibration = load_calibration(str(tmpdir.join('missing.json')))
+
+    assert calibration == DEFAULT_CALIBRATION
+    assert calibrate(0.5, *get_factors(calibration)[:1]) == 0.5
+
+
+def test_invalid_values_fall_back_to_the_defaults(tmpdir):
+    path = tmpdir.join('pi-hat.json')
+    path.write(json.dumps({'red': 'bright', 'green': 1.7, 'blue': 0.5, 'gamma': -1}))
+
+    calibration = load_calibration(str(path))
+
+    assert get_factors(calibration) == (1.0, 1.0, 0.5)
+    assert calibration['gamma'] == 1.0
+
+
+def test_saved_profile_is_loaded_back(tmpdir):
+    path = str(tmpdir.join('led-calibration', 'speaker-leds.json'))
+    calibration = dict(DEFAULT_CALIBRATION, green=0.8, gamma=2.2)
+
+    assert save_calibration(path, calibration)
+    assert load_calibration(path) == calibration
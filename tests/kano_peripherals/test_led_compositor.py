@@ -0,0 +1,117 @@
+from kano_peripherals.led_compositor import LEDCompositor
+from kano_peripherals.led_frame import Frame
+from kano_peripherals.priority_lock import PriorityLock
+
+
+RED = (1.0, 0.0, 0.0)
+BLUE = (0.0, 0.0, 1.0)
+OFF = (0.0, 0.0, 0.0)
+
+NUM_LEDS = 4
+
+
+class FrameSink(object):
+    def __init__(self):
+        self.frames = list()
+
+    def __call__(self, levels):
+        # The levels belong to the compositor, which reuses them.
+        self.frames.append(Frame(NUM_LEDS, levels[:]).to_values())
+        return True
+
+
+def test_top_layer_is_committed():
+    sink = FrameSink()
+    compositor = LEDCompositor(NUM_LEDS, sink)
+
+    compositor.set_frame(1, [RED] * NUM_LEDS)
+    assert compositor.commit(1)
+
+    compositor.set_frame(3, [BLUE] * NUM_LEDS)
+    assert compositor.commit(3)
+    assert sink.frames[-1] == [BLUE] * NUM_LEDS
+
+    # The lower layer is kept but not written while it is covered.
+    compositor.set_frame(1, [OFF] * NUM_LEDS)
+    assert not compositor.commit(1)
+    assert len(sink.frames) == 2
+
+
+def test_released_layer_shows_the_one_below():
+    sink = FrameSink()
+    compositor = LEDCompositor(NUM_LEDS, sink)
+    locks = PriorityLock()
+
+    locks.put(1, {'led_mask': None})
+    compositor.set_frame(1, [RED] * NUM_LEDS)
+    locks.put(3, {'led_mask': None})
+    compositor.set_frame(3, [BLUE] * NUM_LEDS)
+
+    locks.remove_priority(3)
+    assert compositor.sync_locks(locks)
+    assert compositor.compose() == Frame.from_values([RED] * NUM_LEDS)
+    assert compositor.get_top_layer() == 1
+
+
+def test_alpha_blending():
+    sink = FrameSink()
+    compositor = LEDCompositor(NUM_LEDS, sink)
+
+    compositor.set_frame(1, [RED] * NUM_LEDS)
+    compositor.set_frame(2, [BLUE] * NUM_LEDS)
+    compositor.set_alpha(2, 0.25)
+
+    assert compositor.is_visible(1)
+    assert compositor.compose() == Frame.from_values([(0.75, 0.0, 0.25)] * NUM_LEDS)
+
+
+def test_empty_compositor_turns_leds_off():
+    sink = FrameSink()
+    compositor = LEDCompositor(NUM_LEDS, sink)
+
+    assert compositor.compose() is None
+    assert compositor.commit()
+    assert sink.frames[-1] == [OFF] * NUM_LEDS
+
+
+def test_regions_are_merged():
+    sink = FrameSink()
+    compositor = LEDCompositor(NUM_LEDS, sink)
+
+    compositor.set_frame(1, [RED] * NUM_LEDS)
+    compositor.set_mask(2, 0b0011)
+    compositor.set_frame(2, [BLUE] * NUM_LEDS)
+
+    assert compositor.is_visible(1)
+    assert compositor.compose() == Frame.from_values([BLUE, BLUE, RED, RED])
+
+    compositor.set_mask(3, 0b1100)
+    compositor.set_frame(3, [OFF] * NUM_LEDS)
+
+    assert not compositor.is_visible(1)
+    assert compositor.compose() == Frame.from_values([BLUE, BLUE, OFF, OFF])
+
+
+def test_failed_deferred_commit_is_reported():
+    failures = list()
+    compositor = LEDCompositor(
+        NUM_LEDS, lambda levels: False, on_commit_failed=lambda: failures.append(1)
+    )
+
+    compositor.set_frame(1, [RED] * NUM_LEDS)
+    compositor._deferred_commit()
+
+    assert failures == [1]
+    assert compositor.is_commit_failing
+
+
+def test_packed_frame_is_copied_into_the_layer():
+    sink = FrameSink()
+    compositor = LEDCompositor(NUM_LEDS, sink)
+    frame = Frame.from_values([RED, BLUE, RED, BLUE])
+
+    compositor.set_frame(1, frame)
+    frame.set_values([OFF] * NUM_LEDS)
+
+    assert compositor.commit(1)
+    assert sink.frames[-1] == [RED, BLUE, RED, BLUE]
@@ -0,0 +1,44 @@
+from array import array
+
+import pytest
+
+from kano_peripherals.led_frame import Frame, MAX_LEVEL, to_lut_index
+
+
+RED = (1.0, 0.0, 0.0)
+HALF_BLUE = (0.0, 0.0, 0.5)
+
+
+def test_frame_is_updated_in_place():
+    frame = Frame.from_values([RED, HALF_BLUE])
+    levels = frame.levels
+
+    frame.set_values([HALF_BLUE, RED])
+    frame[0] = (2.0, -1.0, 0.0)
+
+    assert frame.levels is levels
+    assert isinstance(levels, array)
+    assert list(levels) == [MAX_LEVEL, 0, 0, MAX_LEVEL, 0, 0]
+    assert frame.to_values()[1] == RED
+
+
+def test_packed_frame_round_trips():
+    frame = Frame.from_values([RED, HALF_BLUE, RED])
+    data = frame.to_bytes()
+
+    assert len(data) == 3 * 3 * 2
+    assert Frame.from_bytes(data, num_leds=3) == frame
+    assert abs(Frame.from_bytes(bytearray(data))[1][2] - 0.5) < 1.0 / MAX_LEVEL
+
+    with pytest.raises(ValueError):
+        Frame.from_bytes(data[:-2])
+    with pytest.raises(ValueError):
+        Frame.from_bytes(data, num_leds=10)
+
+
+def test_levels_index_lookup_tables_as_intensities_do():
+    lut_size = 1024
+
+    for value in [0.0, 0.1, 0.5, 0.9, 1.0]:
+        level = int(value * MAX_LEVEL + 0.5)
+        assert to_lut_index(level, lut_size) == int(value * (lut_size - 1) + 0.5)
@@ -0,0 +1,24 @@
+from kano_peripherals.led_resampler import resample_frame, resample_mask
+
+
+RED = (1.0, 0.0, 0.0)
+BLUE = (0.0, 0.0, 1.0)
+
+
+def test_frame_is_interpolated_around_the_ring():
+    frame = resample_frame([RED, BLUE], 4)
+
+    assert frame == [RED, (0.5, 0.0, 0.5), BLUE, (0.5, 0.0, 0.5)]
+    assert resample_frame(frame, 2) == [RED, BLUE]
+
+
+def test_same_sized_frame_is_not_copied():
+    frame = [RED] * 10
+
+    assert resample_frame(frame, 10) is frame
+
+
+def test_mask_keeps_the_closest_board_leds():
+    assert resample_mask(0b0001, 4, 8) == 0b10000001
+    assert resample_mask(0b0100, 4, 2) == 0b10
+    assert resample_mask(0, 4, 8) == 0
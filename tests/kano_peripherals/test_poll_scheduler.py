@@ -0,0 +1,60 @@
+from kano_peripherals.poll_scheduler import PollScheduler
+
+
+class FakeLoop(object):
+    def __init__(self):
+        self.sources = dict()
+        self.next_id = 1
+
+    def timeout_add(self, delay, fn, *args):
+        source_id = self.next_id
+        self.next_id += 1
+        self.sources[source_id] = (delay, fn, args)
+        return source_id
+
+    def source_remove(self, source_id):
+        del self.sources[source_id]
+
+    def run_next(self):
+        source_id = min(self.sources, key=lambda key: self.sources[key][0])
+        delay, fn, args = self.sources.pop(source_id)
+        fn(*args)
+        return delay
+
+
+def make_scheduler():
+    loop = FakeLoop()
+    return loop, PollScheduler(loop.timeout_add, loop.source_remove)
+
+
+def test_interval_backs_off_to_the_ceiling():
+    loop, scheduler = make_scheduler()
+    scheduler.register('discovery', lambda: True, 5000, 20000)
+
+    delays = [loop.run_next() for dummy in xrange(4)]
+
+    assert delays == [5000, 10000, 20000, 20000]
+    assert scheduler.get_intervals() == {'discovery': 20000}
+
+
+def test_burst_runs_straight_away_at_the_fastest_rate():
+    loop, scheduler = make_scheduler()
+    scheduler.register('discovery', lambda: True, 5000, 60000)
+    for dummy in xrange(3):
+        loop.run_next()
+
+    scheduler.trigger_burst(['discovery'])
+    delays = [loop.run_next() for dummy in xrange(1 + PollScheduler.BURST_RUNS)]
+
+    assert delays == [0, 5000, 5000, 5000]
+    assert scheduler.get_intervals() == {'discovery': 10000}
+
+
+def test_routine_returning_false_is_unregistered():
+    loop, scheduler = make_scheduler()
+    scheduler.register('detect', lambda: False, 5000)
+
+    loop.run_next()
+
+    assert not scheduler.is_registered('detect')
+    assert not loop.sources
@@ -0,0 +1,96 @@
+import threading
+from Queue import Queue
+
+from kano_peripherals.probe_pool import ProbePool
+
+
+class MainLoop(object):
+    def __init__(self):
+        self.pending = Queue()
+
+    def __call__(self, fn, *args):
+        self.pending.put((fn, args))
+
+    def run_one(self):
+        fn, args = self.pending.get(timeout=5)
+        fn(*args)
+
+
+def test_result_is_posted_to_the_main_loop():
+    loop = MainLoop()
+    pool = ProbePool(post=loop)
+    results = list()
+
+    assert pool.submit('hat', 'lib', lambda: True, lambda *args: results.append(args))
+    assert not pool.is_available('hat')
+
+    loop.run_one()
+    assert results == [('hat', True)]
+    assert pool.is_available('hat')
+
+    pool.stop()
+
+
+def test_failing_probe_is_quarantined_with_backoff():
+    loop = MainLoop()
+    pool = ProbePool(post=loop)
+    results = list()
+
+    def fail():
+        raise IOError('no bus')
+
+    pool.submit('speaker', 'i2c', fail, lambda *args: results.append(args))
+    loop.run_one()
+
+    assert results == [('speaker', None)]
+    assert not pool.is_available('speaker')
+    assert pool.backoff['speaker'] == ProbePool.MIN_BACKOFF
+
+    pool.quarantine['speaker'] = 0
+    pool.submit('speaker', 'i2c', fail, lambda *args: results.append(args))
+    loop.run_one()
+
+    assert pool.backoff['speaker'] == 2 * ProbePool.MIN_BACKOFF
+
+    pool.stop()
+
+
+def test_hung_probe_times_out():
+    loop = MainLoop()
+    pool = ProbePool(post=loop)
+    pool.PROBE_TIMEOUT = 0
+    release = threading.Event()
+    results = list()
+
+    pool.submit('hat', 'lib', release.wait, lambda *args: results.append(args))
+    while not pool.start_times:
+        release.wait(0.01)
+
+    assert pool.check_timeouts() == ['hat']
+    assert not pool.is_available('hat')
+    assert results == [('hat', None)]
+
+    # The late result is dropped.
+    release.set()
+    loop.run_one()
+    assert results == [('hat', None)]
+
+    pool.stop()
+
+
+def test_quarantine_expires_on_the_pool_clock():
+    loop = MainLoop()
+    now = [1000.0]
+    pool = ProbePool(post=loop, clock=lambda: now[0])
+
+    def fail():
+        raise IOError('no bus')
+
+    pool.submit('speaker', 'i2c', fail, lambda *args: None)
+    loop.run_one()
+    assert not pool.is_available('speaker')
+
+    now[0] += ProbePool.MIN_BACKOFF
+    assert pool.is_available('speaker')
+
+    pool.stop()
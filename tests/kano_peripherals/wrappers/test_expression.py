@@ -0,0 +1,50 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from kano_peripherals.wrappers.led_ring import primitives, expression
+
+
+NUM_LEDS = 10
+RED = [(1.0, 0.0, 0.0)] * NUM_LEDS
+BLACK = [(0.0, 0.0, 0.0)] * NUM_LEDS
+
+
+def test_compiled_expression_matches_the_primitives():
+    phases = np.linspace(0, 1, 64, endpoint=False)
+    expr = expression.pulse(
+        expression.rotate(expression.colour_wheel(), 4.0), expression.constant(RED)
+    )
+    frame_func = primitives.pulse(
+        primitives.rotate(primitives.colour_wheel, NUM_LEDS, 4.0),
+        primitives.constant(RED)
+    )
+
+    compiled = expression.compile_expression(expr, NUM_LEDS)
+
+    assert np.allclose(compiled(phases), frame_func(phases))
+    assert np.allclose(compiled(0.3), frame_func(0.3))
+
+
+def test_constants_are_folded_and_channels_pruned():
+    black_pulse = expression.compile_expression(
+        expression.pulse(expression.constant(RED), expression.constant(BLACK)), NUM_LEDS
+    )
+    same_pulse = expression.compile_expression(
+        expression.pulse(expression.constant(RED), expression.constant(RED)), NUM_LEDS
+    )
+
+    assert [term.channels for term in black_pulse.terms] == [(0,)]
+    assert [term.weight for term in same_pulse.terms] == [()]
+    assert np.allclose(same_pulse(0.5), RED)
+
+
+def test_round_trip_through_json():
+    expr = expression.pulse_each(expression.constant(RED), [0.5] * NUM_LEDS)
+
+    assert expression.Expression.from_json(expr.to_json()) == expr
+
+    with pytest.raises(ValueError):
+        expression.Expression.from_json('{"op": "explode"}')
+    with pytest.raises(ValueError):
+        expression.compile_expression(expr, NUM_LEDS + 1)
@@ -0,0 +1,54 @@
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from kano_peripherals.wrappers.led_ring import primitives
+from kano_peripherals.wrappers.led_ring.frame_cache import FrameCache, FrameTable
+
+
+def make_frame_func():
+    return primitives.rotate(primitives.colour_wheel, 10)
+
+
+def test_table_matches_the_frame_function_on_its_grid():
+    frame_func = make_frame_func()
+    table = FrameTable(frame_func, 50)
+
+    for index in [0, 7, 49]:
+        phase = index / 50.0
+        assert np.allclose(table(phase), frame_func(phase), atol=1e-6)
+        assert np.allclose(table(phase + 1), frame_func(phase), atol=1e-6)
+
+
+def test_table_plays_every_frame_at_the_animate_phases():
+    # Phases as animate() computes them from the accumulated frame deadlines.
+    duration, cycles, period = 4.0, 1, 1 / 30.0
+    start = deadline = 12345.678
+    table = FrameCache().get_table('spec', make_frame_func(), duration / cycles / period)
+    assert table.resolution == 120
+
+    for frame in xrange(3 * table.resolution):
+        phase = math.modf((deadline - start) * cycles / duration)[0]
+        assert np.array_equal(table(phase), table.frames[frame % table.resolution])
+        deadline += period
+
+
+def test_interpolated_table_blends_neighbouring_frames():
+    table = FrameTable(lambda phase: [(phase, 0, 0)], 4, interpolate=True)
+
+    assert np.allclose(table(0.125), [(0.125, 0, 0)])
+    assert np.allclose(table(0.875), [(0.375, 0, 0)])
+
+
+def test_least_recently_used_table_is_evicted():
+    cache = FrameCache(max_entries=2)
+    first = cache.get_table('first', make_frame_func(), 10)
+    cache.get_table('second', make_frame_func(), 10)
+
+    assert cache.get_table('first', None, 10) is first
+    cache.get_table('third', make_frame_func(), 10)
+
+    assert ('first', 10) in cache.tables
+    assert ('second', 10) not in cache.tables
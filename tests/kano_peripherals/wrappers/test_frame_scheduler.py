@@ -0,0 +1,73 @@
+from kano_peripherals.wrappers.led_ring.frame_scheduler import FrameScheduler
+from kano_peripherals.wrappers.led_ring.frame_rate_governor import FrameRateGovernor
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.time = 100.0
+
+    def __call__(self):
+        return self.time
+
+    def sleep(self, seconds):
+        self.time += seconds
+
+
+def test_deadlines_do_not_drift_with_render_time():
+    clock = FakeClock()
+    scheduler = FrameScheduler(0.1, clock=clock, sleep=clock.sleep)
+    start = scheduler.start()
+
+    for frame in xrange(1, 6):
+        clock.time += 0.03  # render and send
+        assert abs(scheduler.wait_next() - (start + 0.1 * frame)) < 1e-9
+
+    assert scheduler.get_stats()['skipped'] == 0
+
+
+def test_late_frames_are_skipped():
+    clock = FakeClock()
+    scheduler = FrameScheduler(0.1, clock=clock, sleep=clock.sleep)
+    start = scheduler.start()
+
+    clock.time += 0.35
+    deadline = scheduler.wait_next()
+
+    assert abs(deadline - (start + 0.3)) < 1e-9
+    stats = scheduler.get_stats()
+    assert stats['skipped'] == 2
+    assert stats['frames'] == 1
+
+
+def test_frame_rate_is_lowered_under_load_and_raised_when_idle():
+    clock = FakeClock()
+    run_queue = [3]
+    governor = FrameRateGovernor(clock=clock, run_queue=lambda: run_queue[0], cpu_count=1)
+    scheduler = FrameScheduler(0.04, clock=clock, sleep=clock.sleep, governor=governor)
+    scheduler.start()
+
+    for frame in xrange(100):
+        scheduler.wait_next()
+    assert scheduler.get_stats()['effective_fps'] < 25.0
+
+    run_queue[0] = 0
+    for frame in xrange(500):
+        scheduler.wait_next()
+    stats = scheduler.get_stats()
+    assert stats['effective_fps'] == stats['target_fps'] == 25.0
+
+
+def test_late_timer_lowers_the_frame_rate():
+    clock = FakeClock()
+    governor = FrameRateGovernor(clock=clock, run_queue=lambda: None, cpu_count=1)
+
+    def late_sleep(seconds):
+        clock.sleep(seconds + 0.02)  # woken up late by the scheduler
+
+    scheduler = FrameScheduler(0.04, clock=clock, sleep=late_sleep, governor=governor)
+    scheduler.start()
+
+    for frame in xrange(50):
+        scheduler.wait_next()
+
+    assert scheduler.get_stats()['effective_fps'] < 25.0
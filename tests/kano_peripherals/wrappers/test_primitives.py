@@ -0,0 +1,40 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from kano_peripherals.wrappers.led_ring import primitives
+
+
+def test_colour_wheel_primaries():
+    hues = np.array([0.0, 1.0 / 3, 2.0 / 3, 1.0])
+
+    assert np.allclose(
+        primitives.colour_wheel(hues),
+        [(1, 0, 0), (0, 1, 0), (0, 0, 1), (1, 0, 0)]
+    )
+    assert np.allclose(primitives.colour_wheel(0.5, value=0.5), (0, 0.5, 0.5))
+
+
+def test_whole_cycle_matches_single_frames():
+    frame_func = primitives.pulse(
+        primitives.rotate(primitives.colour_wheel, 10, 2.0), num_leds=10
+    )
+    phases = np.linspace(0, 1, 16, endpoint=False)
+
+    frames = frame_func(phases)
+
+    assert frames.shape == (16, 10, 3)
+    for phase, frame in zip(phases, frames):
+        assert np.allclose(frame_func(phase), frame)
+
+
+def test_list_based_value_functions_are_adapted():
+    frame_func = primitives.pulse_each(
+        lambda phase: [(1.0, 0.0, 0.0)] * 3, [1, 2, 4]
+    )
+
+    leds = primitives.to_leds(frame_func(0.25))
+
+    assert len(leds) == 3
+    assert all(isinstance(led, tuple) and len(led) == 3 for led in leds)
+    assert np.allclose(leds, [(0.75, 0, 0), (1, 0, 0), (0, 0, 0)])
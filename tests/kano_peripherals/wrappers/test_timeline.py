@@ -0,0 +1,104 @@
+import os
+import json
+import struct
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from kano_peripherals.wrappers.led_ring.timeline import parse_timeline, \
+    load_timeline, save_timeline, MAX_VALUE, MAX_FRAMES
+
+
+def make_timeline_data():
+    return {
+        'fps': 10,
+        'duration': 1.0,
+        'loops': 3,
+        'leds': 4,
+        'tracks': [
+            {
+                'leds': 'all',
+                'keyframes': [
+                    {'time': 0.0, 'colour': [0, 0, 0]},
+                    {'time': 1.0, 'colour': [1, 0, 0]}
+                ]
+            },
+            {
+                'leds': [2],
+                'keyframes': [
+                    {'time': 0.0, 'colour': '#0000ff'},
+                    {'time': 0.5, 'colour': '#00ff00', 'easing': 'step'}
+                ]
+            }
+        ]
+    }
+
+
+def test_keyframes_are_eased_and_later_tracks_drawn_over():
+    timeline = parse_timeline(make_timeline_data())
+
+    assert timeline.num_frames == 10
+    assert timeline.loops == 3
+    assert np.allclose(timeline.get_frame(5)[0], (0.5, 0, 0), atol=1.0 / MAX_VALUE)
+    assert np.allclose(timeline.get_frame(4)[2], (0, 0, 1))
+    assert np.allclose(timeline.get_frame(5)[2], (0, 1, 0))
+    assert np.allclose(timeline(0.5), timeline.get_frame(15))
+
+
+def test_invalid_timelines_are_refused():
+    data = make_timeline_data()
+    data['tracks'][0]['keyframes'].reverse()
+
+    with pytest.raises(ValueError):
+        parse_timeline(data)
+
+    with pytest.raises(ValueError):
+        parse_timeline(make_timeline_data(), num_leds=10)
+
+    for track in ([1, 2], {'leds': 5, 'keyframes': []}, {'leds': [None]}):
+        data = make_timeline_data()
+        data['tracks'].append(track)
+
+        with pytest.raises(ValueError):
+            parse_timeline(data)
+
+
+def test_binary_timeline_is_memory_mapped(tmpdir):
+    json_path = tmpdir.join('timeline.json')
+    json_path.write(json.dumps(make_timeline_data()))
+    binary_path = str(tmpdir.join('timeline.klt'))
+
+    timeline = load_timeline(str(json_path))
+    save_timeline(timeline, binary_path)
+    mapped = load_timeline(binary_path, num_leds=4)
+
+    assert isinstance(mapped.frames, np.memmap)
+    assert (mapped.fps, mapped.loops) == (timeline.fps, timeline.loops)
+    assert np.array_equal(mapped.frames, timeline.frames)
+
+
+def test_binary_timeline_without_frames_is_refused(tmpdir):
+    binary_path = str(tmpdir.join('timeline.klt'))
+    save_timeline(parse_timeline(make_timeline_data()), binary_path)
+
+    with open(binary_path, 'r+b') as timeline_file:
+        timeline_file.seek(12)
+        timeline_file.write(struct.pack('<f', 0.0))
+
+    with pytest.raises(ValueError):
+        load_timeline(binary_path)
+
+
+def test_only_bounded_regular_files_are_loaded(tmpdir):
+    fifo_path = str(tmpdir.join('timeline.fifo'))
+    os.mkfifo(fifo_path)
+
+    with pytest.raises(ValueError):
+        load_timeline(fifo_path)
+
+    data = make_timeline_data()
+    data['duration'] = float(MAX_FRAMES)
+
+    with pytest.raises(ValueError):
+        parse_timeline(data)